@@ -0,0 +1,59 @@
+# Fleet-wide config backup with ConfigBackup: the getConfig&name=All dumps
+# parsed in the fetching threads (processes=0) against a pool of 1, 2, ...
+# worker processes. The mock devices serve from forked processes so they do
+# not compete with the client for the GIL; run on a machine with more cores
+# than servers to see the parse pool scale.
+#
+# Usage: python benchmarks/bench_backup.py [devices] [channels] [max_processes] [servers]
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mock_device import MockDevice  # noqa: E402
+from pyintelbras import IntelbrasAPI  # noqa: E402
+from pyintelbras.backup import ConfigBackup  # noqa: E402
+
+DEVICES = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+CHANNELS = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+MAX_PROCESSES = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count() or 1
+SERVERS = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+
+
+def sweep() -> list:
+    # 0, 1, 2, 4, ... up to MAX_PROCESSES
+    counts = [0]
+    n = 1
+    while n < MAX_PROCESSES:
+        counts.append(n)
+        n *= 2
+    return counts + [MAX_PROCESSES]
+
+
+if __name__ == '__main__':
+    servers = [MockDevice(channels=CHANNELS).start(process=True) for _ in range(SERVERS)]
+    print(f'devices={DEVICES} channels={CHANNELS} servers={SERVERS} cpus={os.cpu_count()}')
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            base = None
+            for processes in sweep():
+                devices = [IntelbrasAPI(servers[i % SERVERS].url, 'admin', 'admin')
+                           for i in range(DEVICES)]
+                backup = ConfigBackup(devices, os.path.join(tmp, f'{processes}.jsonl'),
+                                      processes=processes)
+                start = time.perf_counter()
+                for result in backup.run():
+                    assert result.ok, result.error
+                elapsed = time.perf_counter() - start
+                base = base or elapsed
+                print(f'processes={processes:<3} {DEVICES / elapsed:>7.1f} devices/s '
+                      f'{backup.stats["bytes"] / 2 ** 20 / elapsed:>6.1f}MiB/s '
+                      f'x{base / elapsed:.2f}')
+                for device in devices:
+                    device.close()
+    finally:
+        for server in servers:
+            server.stop()
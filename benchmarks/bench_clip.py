@@ -0,0 +1,62 @@
+# Export of a 15 minute incident across two recording files: finding and
+# downloading the whole intersecting files one by one, against
+# download_clip stitching them with and without prefetch, and download_clip
+# on a device answering loadfile.cgi by time.
+#
+# Usage: python benchmarks/bench_clip.py [latency_ms] [kib_per_second] [file_minutes]
+
+import io
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import samples  # noqa: E402
+from mock_device import MockDevice  # noqa: E402
+from pyintelbras import IntelbrasAPI  # noqa: E402
+from pyintelbras.exporter import recording_query  # noqa: E402
+
+LATENCY = (int(sys.argv[1]) if len(sys.argv) > 1 else 100) / 1000
+RATE = (int(sys.argv[2]) if len(sys.argv) > 2 else 64) * 1024
+MINUTES = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+START = datetime(2024, 8, 1, 10, 25)
+END = START + timedelta(minutes=15)
+
+
+def whole_files(api: IntelbrasAPI) -> int:
+    # What callers did so far
+    items = api.find_media_files(recording_query(1, START, END))['items']
+    done = 0
+    for item in sorted(items, key=lambda i: i['StartTime']):
+        buffer = io.BytesIO()
+        done += api.download_media_file(item['FilePath'], buffer)
+    return done
+
+
+def measure(name: str, func) -> None:
+    start = time.perf_counter()
+    size = func()
+    print(f'{name:<28} {size / 2 ** 20:>7.1f}MiB {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    recordings = samples.recordings(channels=1, days=1, minutes=MINUTES)
+    for item in recordings:
+        item['Length'] = MINUTES * 60 * RATE
+    files = {item['FilePath']: item['Length'] for item in recordings}
+    print(f'latency={LATENCY * 1000:.0f}ms clip={END - START}')
+
+    with MockDevice(recordings=recordings, files=files, latency=LATENCY) as device, \
+            IntelbrasAPI(device.url, 'admin', 'admin') as api:
+        measure('whole files', lambda: whole_files(api))
+        for prefetch in (0, 2):
+            measure(f'download_clip prefetch={prefetch}', lambda: api.download_clip(
+                1, START, END, io.BytesIO(), prefetch=prefetch))
+
+    with MockDevice(recordings=recordings, files=files, latency=LATENCY,
+                    byte_rate=RATE) as device, \
+            IntelbrasAPI(device.url, 'admin', 'admin') as api:
+        measure('download_clip by time', lambda: api.download_clip(
+            1, START, END, io.BytesIO()))
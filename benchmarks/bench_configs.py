@@ -0,0 +1,50 @@
+# Configuration backup of one device: one getConfig per name (the current
+# job) against get_configs, with and without getConfig&name=All support.
+#
+# Usage: python benchmarks/bench_configs.py [latency_ms] [rounds]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mock_device import MockDevice  # noqa: E402
+from pyintelbras import IntelbrasAPI  # noqa: E402
+from pyintelbras.helpers import parse_response  # noqa: E402
+
+LATENCY = (int(sys.argv[1]) if len(sys.argv) > 1 else 30) / 1000
+ROUNDS = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+NAMES = ['ChannelTitle', 'Encode', 'Record', 'RecordMode', 'Network']
+
+
+def one_by_one(api: IntelbrasAPI) -> dict:
+    configs = {}
+    for name in NAMES:
+        r = api.configManager(action='getConfig', name=name)
+        configs[name] = parse_response(r.text)['table'][name]
+    return configs
+
+
+def measure(name: str, device: MockDevice, func) -> dict:
+    with IntelbrasAPI(device.url, 'admin', 'admin') as api:
+        func(api)
+        device.stats.reset()
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            configs = func(api)
+        elapsed = (time.perf_counter() - start) / ROUNDS
+    print(f"{name:<28} {elapsed * 1000:7.1f}ms/backup "
+          f"requests={device.stats.get('requests') / ROUNDS:.0f}")
+    return configs
+
+
+if __name__ == '__main__':
+    with MockDevice(latency=LATENCY, channels=32) as device, \
+            MockDevice(latency=LATENCY, channels=32, config_all=False) as no_all:
+        print(f"names={len(NAMES)} latency={LATENCY * 1000:.0f}ms")
+        expected = measure('one getConfig per name', device, one_by_one)
+        assert measure('get_configs (name=All)', device,
+                       lambda api: api.get_configs(NAMES)) == expected
+        assert measure('get_configs (no All)', no_all,
+                       lambda api: api.get_configs(NAMES)) == expected
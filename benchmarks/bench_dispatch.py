@@ -0,0 +1,54 @@
+# Method-chain dispatch and URL building overhead, with the network stubbed
+# out: the session returns a canned response without any I/O.
+#
+# Usage: python benchmarks/bench_dispatch.py [calls]
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pyintelbras import IntelbrasAPI  # noqa: E402
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+
+class StubResponse:
+    status_code = 200
+    reason = 'OK'
+
+
+class StubSession:
+    response = StubResponse()
+
+    def request(self, **kwargs):
+        return self.response
+
+    def close(self):
+        pass
+
+
+def rate(func) -> float:
+    return CALLS / min(timeit.repeat(func, number=CALLS, repeat=3))
+
+
+if __name__ == '__main__':
+    api = IntelbrasAPI('http://nvr.example.com:8080/proxy', 'user', 'pass')
+    api.session = StubSession()
+
+    cases = {
+        'api.configManager(...)': lambda: api.configManager(
+            action='getConfig', name='ChannelTitle'),
+        'api.a.b.c.post(...)': lambda: api.api.LogicDeviceManager
+        .getCameraState.post(body={'uniqueChannels': [-1]}),
+        'mediaFileFind + extra_path': lambda: api.RPC_Loadfile(
+            extra_path='/mnt/dvr/2024-08-28/0/dav/02/0/2/371211/file.dav'),
+    }
+    if hasattr(IntelbrasAPI, 'endpoint'):
+        config_manager = api.endpoint('configManager')
+        cases['api.endpoint(...)(...)'] = lambda: config_manager(
+            action='getConfig', name='ChannelTitle')
+
+    for name, func in cases.items():
+        print(f"{name:<28} {rate(func):10.0f} calls/s")
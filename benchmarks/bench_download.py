@@ -0,0 +1,78 @@
+# Peak Python memory while downloading a recording: r.content (the documented
+# example) against the streaming download_media_file. Then a device capped
+# per connection (wan_mbps, as a remote site uplink) with one stream against
+# segmented downloads.
+#
+# Usage: python benchmarks/bench_download.py [size_mb] [wan_mbps]
+
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mock_device import MockDevice, file_content  # noqa: E402
+from pyintelbras import IntelbrasAPI  # noqa: E402
+
+SIZE = int(sys.argv[1] if len(sys.argv) > 1 else 64) * 1024 * 1024
+WAN = int(sys.argv[2] if len(sys.argv) > 2 else 40) * 1000 * 1000 // 8
+FILE = '/mnt/dvr/2024-08-28/0/dav/02/0/2/371211/02.40.49-02.41.00[R][0@0][0].dav'
+
+
+def measure(name: str, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    written = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<24} bytes={written} peak={peak / 2 ** 20:.1f}MiB "
+          f"throughput={written / elapsed / 2 ** 20:.0f}MiB/s")
+
+
+def content_download(api: IntelbrasAPI, dest: str) -> int:
+    r = api.RPC_Loadfile(extra_path=FILE)
+    with open(dest, 'wb') as bf:
+        return bf.write(r.content)
+
+
+if __name__ == '__main__':
+    with MockDevice(files={FILE: SIZE}) as device, \
+            IntelbrasAPI(device.url, 'admin', 'admin') as api, \
+            tempfile.TemporaryDirectory() as tmp:
+        dest = os.path.join(tmp, 'video.dav')
+        measure('r.content', lambda: content_download(api, dest))
+        os.remove(dest)
+        measure('download_media_file',
+                lambda: api.download_media_file(FILE, dest))
+
+        # Resume an interrupted transfer from the middle of the file
+        with open(dest, 'r+b') as f:
+            f.truncate(SIZE // 2)
+        measure('download (resume 50%)',
+                lambda: api.download_media_file(FILE, dest))
+        with open(dest, 'rb') as f:
+            assert f.read(1024) == file_content(0, 1024)
+            f.seek(SIZE // 2)
+            assert f.read(1024) == file_content(SIZE // 2, 1024)
+        assert os.path.getsize(dest) == SIZE
+
+        buffer = io.BytesIO()
+        api.download_media_file(FILE, buffer)
+        assert buffer.tell() == SIZE
+
+    with MockDevice(files={FILE: SIZE}, bandwidth=WAN) as device, \
+            IntelbrasAPI(device.url, 'admin', 'admin') as api, \
+            tempfile.TemporaryDirectory() as tmp:
+        dest = os.path.join(tmp, 'video.dav')
+        for segments in (1, 4, 8):
+            measure(f'WAN segments={segments}', lambda: api.download_media_file(
+                FILE, dest, resume=False, segments=segments))
+        measure('WAN segments=8 mmap', lambda: api.download_media_file(
+            FILE, dest, resume=False, segments=8, memory_map=True))
+        with open(dest, 'rb') as f:
+            f.seek(SIZE - 1024)
+            assert f.read() == file_content(SIZE - 1024, 1024)
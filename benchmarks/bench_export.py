@@ -0,0 +1,68 @@
+# Nightly export of recordings from several mock devices: the example
+# script (search, then download one file after another) against
+# RecordingExporter, and a second run that skips what was exported.
+#
+# Usage: python benchmarks/bench_export.py [devices] [files] [size_mb] [latency_ms]
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mock_device import MockDevice  # noqa: E402
+from pyintelbras import IntelbrasAPI  # noqa: E402
+from pyintelbras.exporter import RecordingExporter  # noqa: E402
+
+DEVICES = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+FILES = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+SIZE = int(float(sys.argv[3] if len(sys.argv) > 3 else 4) * 1024 * 1024)
+LATENCY = (int(sys.argv[4]) if len(sys.argv) > 4 else 30) / 1000
+
+
+def serial(apis, dest: str) -> int:
+    total = 0
+    for api in apis:
+        for item in api.find_media_files({})['items']:
+            file = os.path.join(dest, str(id(api)), os.path.basename(item['FilePath']))
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            total += api.download_media_file(item['FilePath'], file)
+    return total
+
+
+if __name__ == '__main__':
+    files = {f'/mnt/dvr/2024-08-28/0/dav/{i // 60:02}/{i:04}.dav': SIZE
+             for i in range(FILES)}
+    devices = [MockDevice(files=files, latency=LATENCY).start()
+               for _ in range(DEVICES)]
+    apis = [IntelbrasAPI(d.url, 'admin', 'admin', pool_maxsize=4)
+            for d in devices]
+    total = DEVICES * FILES * SIZE
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            assert serial(apis, os.path.join(tmp, 'serial')) == total
+            serial_time = time.perf_counter() - start
+
+            exporter = RecordingExporter(apis, os.path.join(tmp, 'export'),
+                                         max_workers=16, per_device=2)
+            start = time.perf_counter()
+            results = list(exporter.export({}))
+            export_time = time.perf_counter() - start
+            assert all(r.ok for r in results), [r.error for r in results]
+            assert exporter.stats['bytes'] == total
+
+            start = time.perf_counter()
+            list(RecordingExporter(apis, os.path.join(tmp, 'export')).export({}))
+            skip_time = time.perf_counter() - start
+            print(f"devices={DEVICES} files={FILES} size={SIZE / 2 ** 20:.0f}MiB "
+                  f"latency={LATENCY * 1000:.0f}ms")
+            print(f"serial={serial_time:.2f}s ({total / serial_time / 2 ** 20:.0f}MiB/s) "
+                  f"exporter={export_time:.2f}s ({total / export_time / 2 ** 20:.0f}MiB/s) "
+                  f"rerun (all skipped)={skip_time:.2f}s")
+    finally:
+        for api in apis:
+            api.close()
+        for device in devices:
+            device.stop()
@@ -0,0 +1,45 @@
+# Inventory sweep (api_version + channels) over many mock devices: one
+# device after another against DeviceFleet.
+#
+# Usage: python benchmarks/bench_fleet.py [devices] [latency_ms]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mock_device import MockDevice  # noqa: E402
+from pyintelbras import IntelbrasAPI, DeviceFleet  # noqa: E402
+
+DEVICES = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+LATENCY = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+
+
+def inventory(api: IntelbrasAPI) -> dict:
+    return {'version': api.api_version, 'channels': len(api.channels)}
+
+
+if __name__ == '__main__':
+    devices = [MockDevice(latency=LATENCY).start() for _ in range(DEVICES)]
+    urls = [d.url for d in devices]
+    try:
+        start = time.perf_counter()
+        for url in urls:
+            with IntelbrasAPI(url, 'admin', 'admin') as api:
+                inventory(api)
+        serial = time.perf_counter() - start
+
+        with DeviceFleet(urls, user='admin', password='admin',
+                         max_workers=64, timeout=10) as fleet:
+            start = time.perf_counter()
+            results = list(fleet.map(inventory))
+            parallel = time.perf_counter() - start
+        assert all(r.ok for r in results), [r.error for r in results]
+
+        print(f"devices={DEVICES} latency={LATENCY * 1000:.0f}ms "
+              f"serial={serial:.2f}s fleet={parallel:.2f}s "
+              f"speedup={serial / parallel:.1f}x")
+    finally:
+        for device in devices:
+            device.stop()
@@ -0,0 +1,66 @@
+# "What exists on channel 5 last Tuesday?": the mediaFileFind steps on the
+# device against a RecordingIndex, plus the cost of the first and of an
+# incremental sync.
+#
+# Usage: python benchmarks/bench_index.py [channels] [days] [latency_ms]
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import samples  # noqa: E402
+from mock_device import MockDevice  # noqa: E402
+from pyintelbras import IntelbrasAPI  # noqa: E402
+from pyintelbras.exporter import recording_query  # noqa: E402
+from pyintelbras.index import RecordingIndex  # noqa: E402
+
+CHANNELS = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+DAYS = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+LATENCY = (int(sys.argv[3]) if len(sys.argv) > 3 else 30) / 1000
+START = datetime(2024, 8, 1)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    items = samples.recordings(CHANNELS, DAYS, minutes=30, start=START)
+    end = START + timedelta(days=DAYS)
+    tuesday = START + timedelta(days=DAYS - 7)
+    with MockDevice(channels=CHANNELS, latency=LATENCY, recordings=items) as device, \
+            IntelbrasAPI(device.url, 'admin', 'admin') as api, \
+            tempfile.TemporaryDirectory() as tmp:
+        print(f"files={len(items)} ({CHANNELS} channels x {DAYS} days) "
+              f"latency={LATENCY * 1000:.0f}ms")
+
+        device.stats.reset()
+        found, on_device = timed(lambda: api.find_media_files(
+            recording_query(5, tuesday, tuesday + timedelta(days=1)))['items'])
+        print(f"device query      {on_device * 1000:8.1f}ms "
+              f"requests={device.stats.get('requests')}")
+
+        index = RecordingIndex(os.path.join(tmp, 'index.db'),
+                               history=timedelta(days=DAYS))
+        device.stats.reset()
+        stored, first = timed(lambda: index.sync(api, until=end))
+        print(f"first sync        {first * 1000:8.1f}ms files={stored} "
+              f"requests={device.stats.get('requests')}")
+
+        device.stats.reset()
+        stored, incremental = timed(lambda: index.sync(api, until=end + timedelta(hours=1)))
+        print(f"incremental sync  {incremental * 1000:8.1f}ms files={stored} "
+              f"requests={device.stats.get('requests')}")
+
+        local, on_index = timed(lambda: index.query(
+            api.server, 5, tuesday, tuesday + timedelta(days=1)))
+        assert [f.path for f in local] == [i['FilePath'] for i in found]
+        print(f"index query       {on_index * 1000:8.1f}ms files={len(local)} "
+              f"speedup={on_device / on_index:.0f}x")
+        index.close()
@@ -0,0 +1,51 @@
+# Many threads hammering one recorder that answers 503 past max_concurrent
+# requests: retrying on 503 without throttling, against a shared
+# RateLimiter that learns the device limit. Both start above it.
+#
+# Usage: python benchmarks/bench_limits.py [threads] [calls] [max_concurrent] [latency_ms]
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mock_device import MockDevice  # noqa: E402
+from pyintelbras import IntelbrasAPI  # noqa: E402
+from pyintelbras.limits import RateLimiter  # noqa: E402
+
+THREADS = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+CALLS = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+MAX_CONCURRENT = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+LATENCY = (int(sys.argv[4]) if len(sys.argv) > 4 else 20) / 1000
+
+
+def run(name: str, device: MockDevice, limiter: RateLimiter = None):
+    api = IntelbrasAPI(device.url, 'admin', 'admin', pool_maxsize=THREADS,
+                       limiter=limiter)
+    api.configManager(action='getConfig', name='ChannelTitle').content
+
+    def call(_):
+        while api.configManager(
+                action='getConfig', name='ChannelTitle').status_code == 503:
+            pass
+
+    device.stats.reset()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as executor:
+        list(executor.map(call, range(CALLS)))
+    elapsed = time.perf_counter() - start
+    stats = device.stats
+    print(f"{name:<14} calls/s={CALLS / elapsed:.0f} "
+          f"http-requests={stats.get('requests')} "
+          f"503s={stats.get('overloads')} elapsed={elapsed:.2f}s")
+    api.close()
+
+
+if __name__ == '__main__':
+    with MockDevice(latency=LATENCY, max_concurrent=MAX_CONCURRENT) as device:
+        run('retry on 503', device)
+        limiter = RateLimiter(rate=50, max_rate=1000, max_in_flight=8)
+        run('RateLimiter', device, limiter)
+        print(f"learned: {limiter.stats(device.url.split('//')[1])}")
@@ -0,0 +1,85 @@
+# Memory and time to hold a large recording listing: the dicts built by
+# find_media_files against MediaFileTable, plus filtering and CSV export.
+#
+# Usage: python benchmarks/bench_media_table.py [channels] [files_per_channel]
+
+import io
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import samples  # noqa: E402
+from pyintelbras.helpers import parse_response  # noqa: E402
+from pyintelbras.media import MediaFileTable  # noqa: E402
+
+CHANNELS = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+FILES = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+BATCH = 100
+
+
+def batches() -> list:
+    # findNextFile bodies of BATCH items, as read from the device
+    bodies = []
+    for channel in range(CHANNELS):
+        listing = samples.media_files(FILES, channel).splitlines()[1:]
+        for start in range(0, FILES, BATCH):
+            count = min(BATCH, FILES - start)
+            lines = [f'found={count}']
+            for line in listing[start * 13:(start + count) * 13]:
+                key, _, rest = line.partition('].')
+                lines.append(f'items[{int(key[6:]) - start}].{rest}')
+            bodies.append('\r\n'.join(lines))
+    return bodies
+
+
+def measure(name: str, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = func()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<22} {elapsed:6.2f}s retained={current / 2 ** 20:7.1f}MiB")
+    return result
+
+
+if __name__ == '__main__':
+    bodies = batches()
+    total = CHANNELS * FILES
+    print(f"files={total} ({CHANNELS} channels x {FILES})")
+
+    def dicts():
+        items = []
+        for body in bodies:
+            items.extend(parse_response(body).get('items') or [])
+        return items
+
+    def table():
+        t = MediaFileTable()
+        for body in bodies:
+            t.extend_response(body)
+        return t
+
+    items = measure('find_media_files dicts', dicts)
+    t = measure('MediaFileTable', table)
+    assert len(items) == len(t) == total
+
+    since, until = datetime(2024, 8, 28, 6), datetime(2024, 8, 28, 18)
+    start = time.perf_counter()
+    expected = [i for i in items if i['EndTime'] > since and i['StartTime'] < until
+                and i['Channel'] in (1, 2)]
+    dict_filter = time.perf_counter() - start
+    start = time.perf_counter()
+    selected = t.filter(start=since, end=until, channels=[1, 2])
+    table_filter = time.perf_counter() - start
+    assert [f.path for f in selected] == [i['FilePath'] for i in expected]
+    print(f"filter: dicts={dict_filter * 1000:.0f}ms table={table_filter * 1000:.0f}ms")
+
+    start = time.perf_counter()
+    t.to_csv(io.StringIO())
+    print(f"to_csv: {time.perf_counter() - start:.2f}s")
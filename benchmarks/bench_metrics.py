@@ -0,0 +1,61 @@
+# Overhead of the request hooks, and what Metrics reports for a fleet with
+# one slow device: calls without hooks, with a Metrics hook, then the
+# summary rows of the slowest device/endpoint pairs.
+#
+# Usage: python benchmarks/bench_metrics.py [devices] [calls] [slow_latency_ms]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mock_device import MockDevice  # noqa: E402
+from pyintelbras import IntelbrasAPI, DeviceFleet  # noqa: E402
+from pyintelbras.metrics import Metrics  # noqa: E402
+
+DEVICES = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+CALLS = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+SLOW = (int(sys.argv[3]) if len(sys.argv) > 3 else 50) / 1000
+
+
+def calls_per_second(device: MockDevice, hooks: list) -> float:
+    with IntelbrasAPI(device.url, 'admin', 'admin', hooks=hooks) as api:
+        api.channels
+        start = time.perf_counter()
+        for _ in range(CALLS):
+            api.channels
+        return CALLS / (time.perf_counter() - start)
+
+
+def ms(value) -> str:
+    return '-' if value is None else f'{value * 1000:.1f}'
+
+
+if __name__ == '__main__':
+    devices = [MockDevice(latency=0.005).start() for _ in range(DEVICES - 1)]
+    devices.append(MockDevice(latency=SLOW).start())
+    try:
+        plain = calls_per_second(devices[0], [])
+        hooked = calls_per_second(devices[0], [Metrics()])
+        print(f"no hooks={plain:.0f} calls/s  Metrics hook={hooked:.0f} calls/s "
+              f"({(plain / hooked - 1) * 100:+.1f}% per call)")
+
+        metrics = Metrics()
+        # New connection per request, to see the connect phase
+        servers = [{'server': d.url, 'keep_alive': False} for d in devices]
+        with DeviceFleet(servers, user='admin', password='admin',
+                         hooks=[metrics]) as fleet:
+            for _ in range(20):
+                list(fleet.map(lambda api: api.channels))
+                list(fleet.map(lambda api: api.find_media_files({'condition.Channel': 1})))
+
+        print(f"{'host':<16} {'endpoint':<28} {'n':>4} {'p50':>6} {'p95':>6} "
+              f"{'connect':>7} {'ttfb':>6} {'xfer':>6} {'parse':>6}  (ms)")
+        for row in metrics.summary()[:6]:
+            print(f"{row['host']:<16} {row['endpoint']:<28} {row['requests']:>4} "
+                  f"{ms(row['p50']):>6} {ms(row['p95']):>6} {ms(row['connect']):>7} "
+                  f"{ms(row['ttfb']):>6} {ms(row['transfer']):>6} {ms(row['parse']):>6}")
+    finally:
+        for device in devices:
+            device.stop()
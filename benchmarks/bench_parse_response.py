@@ -0,0 +1,106 @@
+# parse_response throughput on large recorded-shape responses, against the
+# previous exception-driven implementation.
+#
+# Usage: python benchmarks/bench_parse_response.py [repeat]
+
+import os
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import legacy_parser  # noqa: E402
+import samples  # noqa: E402
+from pyintelbras.helpers import (  # noqa: E402
+    parse_response, parse_response_lines, iter_response_items)
+
+REPEAT = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+CASES = {
+    'getConfig All (32ch)': samples.config_dump(32),
+    'findNextFile (5000)': samples.media_files(5000),
+    'ChannelTitle (16ch)': samples.config_dump(16).split('table.Encode')[0],
+}
+
+
+MEDIA_SCHEMA = {
+    'Channel': int, 'Cluster': int, 'CutLength': int, 'Disk': int,
+    'Length': int, 'Partition': int, 'StartTime': datetime,
+    'EndTime': datetime, 'FilePath': str, 'Type': str, 'VideoStream': str,
+    'Events': str, 'Flags': str,
+}
+
+
+def best(func, text: str) -> float:
+    return min(timeit.repeat(lambda: func(text), number=1, repeat=REPEAT))
+
+
+def peak(func, text: str) -> float:
+    tracemalloc.start()
+    func(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def read_few(parsed) -> None:
+    # Typical caller: a handful of keys out of a big response
+    encode = parsed['table']['Encode'][0]['MainFormat'][0]['Video']
+    encode['BitRate'], encode['FPS'], encode['Compression']
+
+
+def network_lines(lines: list):
+    # Simulates Response.iter_lines(), lines are received (and can be
+    # released) one at a time
+    yield from lines
+
+
+def buffered(lines: list):
+    # What a non-streamed caller does: whole body, decoded, then parsed
+    body = b'\n'.join(network_lines(lines))
+    return parse_response(body.decode())
+
+
+def count_items(lines: list) -> int:
+    return sum(1 for path, _ in iter_response_items(network_lines(lines))
+               if path.endswith('.FilePath'))
+
+
+def modes():
+    config = CASES['getConfig All (32ch)']
+    media = CASES['findNextFile (5000)']
+    received = [line.encode() for line in media.splitlines()]
+    return {
+        'getConfig eager + read': (
+            lambda t: read_few(parse_response(t)), config),
+        'getConfig lazy + read': (
+            lambda t: read_few(parse_response(t, lazy=True)), config),
+        'findNextFile eager': (parse_response, media),
+        'findNextFile schema': (
+            lambda t: parse_response(t, schema=MEDIA_SCHEMA), media),
+        'findNextFile lazy': (
+            lambda t: parse_response(t, lazy=True), media),
+        'findNextFile buffered': (buffered, received),
+        'findNextFile streamed': (
+            lambda t: parse_response_lines(network_lines(t)), received),
+        'findNextFile events': (count_items, received),
+    }
+
+
+if __name__ == '__main__':
+    for name, text in CASES.items():
+        assert parse_response(text) == legacy_parser.parse_response(text)
+        lines = text.count('\n')
+        before = best(legacy_parser.parse_response, text)
+        after = best(parse_response, text)
+        print(f"{name:<22} lines={lines:<6} "
+              f"legacy={before * 1000:8.2f}ms "
+              f"current={after * 1000:8.2f}ms "
+              f"speedup={before / after:.1f}x")
+
+    print()
+    for name, (func, text) in modes().items():
+        print(f"{name:<26} time={best(func, text) * 1000:8.2f}ms "
+              f"peak={peak(func, text):6.1f}MiB")
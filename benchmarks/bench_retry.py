@@ -0,0 +1,54 @@
+# Rounds of one call over a fleet of healthy devices plus a hung one
+# (answers after hang seconds) and a dead one (connection refused):
+# without timeouts, with short timeouts, and with timeouts and a shared
+# CircuitBreaker that skips the bad devices after their first failure.
+#
+# Usage: python benchmarks/bench_retry.py [devices] [rounds] [hang_s]
+
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mock_device import MockDevice  # noqa: E402
+from pyintelbras import DeviceFleet  # noqa: E402
+from pyintelbras.retry import CircuitBreaker  # noqa: E402
+
+DEVICES = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+ROUNDS = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+HANG = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+
+def closed_port() -> str:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return f'http://127.0.0.1:{s.getsockname()[1]}'
+
+
+def run(name: str, servers: list, timeout, **kwargs):
+    devices = [{'server': server, 'timeout': timeout} for server in servers]
+    with DeviceFleet(devices, user='admin', password='admin', **kwargs) as fleet:
+        rounds = []
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            results = list(fleet.map(lambda device: device.channels))
+            rounds.append(time.perf_counter() - start)
+        ok = sum(r.ok for r in results)
+        print(f"{name:<22} rounds={' '.join(f'{r:.2f}s' for r in rounds)} "
+              f"ok={ok}/{len(results)}")
+
+
+if __name__ == '__main__':
+    healthy = [MockDevice(latency=0.01).start() for _ in range(DEVICES)]
+    hung = MockDevice(latency=HANG).start()
+    servers = [d.url for d in healthy] + [hung.url, closed_port()]
+    try:
+        run('no timeout', servers, timeout=None)
+        run('timeout=(1, 2)', servers, timeout=(1, 2))
+        run('timeout + breaker', servers, timeout=(1, 2),
+            breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    finally:
+        for device in healthy + [hung]:
+            device.stop()
@@ -0,0 +1,54 @@
+# Round-trips per CGI call: per-call requests.request (the previous
+# do_request behaviour) against the pooled IntelbrasAPI session.
+#
+# Usage: python benchmarks/bench_session.py [calls]
+
+import os
+import sys
+import time
+
+import requests
+from requests.auth import HTTPDigestAuth
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mock_device import MockDevice  # noqa: E402
+from pyintelbras import IntelbrasAPI  # noqa: E402
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+
+def report(name: str, device: MockDevice, elapsed: float):
+    stats = device.stats
+    print(
+        f"{name:<24} "
+        f"connections/call={stats.get('connections') / CALLS:.3f} "
+        f"http-requests/call={stats.get('requests') / CALLS:.3f} "
+        f"challenges={stats.get('challenges')} "
+        f"calls/s={CALLS / elapsed:.0f}")
+
+
+def bench_unpooled(device: MockDevice):
+    auth = HTTPDigestAuth('admin', 'admin')
+    url = f'{device.url}/cgi-bin/configManager.cgi'
+    params = {'action': 'getConfig', 'name': 'ChannelTitle'}
+    device.stats.reset()
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        requests.request('GET', url, params=params, auth=auth).content
+    report('requests.request', device, time.perf_counter() - start)
+
+
+def bench_pooled(device: MockDevice):
+    with IntelbrasAPI(device.url, 'admin', 'admin') as api:
+        device.stats.reset()
+        start = time.perf_counter()
+        for _ in range(CALLS):
+            api.configManager(action='getConfig', name='ChannelTitle').content
+        report('IntelbrasAPI session', device, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    with MockDevice() as device:
+        bench_unpooled(device)
+        bench_pooled(device)
@@ -0,0 +1,48 @@
+# One mosaic round (every channel of every device): serial snapshot calls
+# against SnapshotPipeline, and a second round where frames did not change.
+#
+# Usage: python benchmarks/bench_snapshots.py [devices] [channels] [latency_ms]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mock_device import MockDevice  # noqa: E402
+from pyintelbras import IntelbrasAPI  # noqa: E402
+from pyintelbras.snapshots import SnapshotPipeline, RingBufferSink  # noqa: E402
+
+DEVICES = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+CHANNELS = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+LATENCY = (int(sys.argv[3]) if len(sys.argv) > 3 else 30) / 1000
+
+
+if __name__ == '__main__':
+    devices = [MockDevice(channels=CHANNELS, latency=LATENCY).start()
+               for _ in range(DEVICES)]
+    apis = [IntelbrasAPI(d.url, 'admin', 'admin') for d in devices]
+    try:
+        start = time.perf_counter()
+        for api in apis:
+            for channel in range(1, CHANNELS + 1):
+                api.snapshot(channel=channel, type=0).content
+        serial = time.perf_counter() - start
+
+        sink = RingBufferSink(size=2)
+        pipeline = SnapshotPipeline(apis, sink, max_workers=64, per_device=8)
+        start = time.perf_counter()
+        pipeline.capture()
+        parallel = time.perf_counter() - start
+        pipeline.capture()
+        frames = DEVICES * CHANNELS
+        print(f"frames={frames} latency={LATENCY * 1000:.0f}ms "
+              f"serial={serial:.2f}s ({frames / serial:.0f} fps) "
+              f"pipeline={parallel:.2f}s ({frames / parallel:.0f} fps)")
+        print(f"second round: {pipeline.stats}")
+        pipeline.close()
+    finally:
+        for api in apis:
+            api.close()
+        for device in devices:
+            device.stop()
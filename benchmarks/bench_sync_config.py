@@ -0,0 +1,63 @@
+# Pushing a standard configuration (channel titles and encoding of every
+# channel) to a device: setConfig with every key against sync_config,
+# which reads the current config and writes only the keys that differ.
+#
+# Usage: python benchmarks/bench_sync_config.py [channels] [latency_ms]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mock_device import MockDevice  # noqa: E402
+from pyintelbras import IntelbrasAPI  # noqa: E402
+from pyintelbras.helpers import flatten_response, format_value, parse_response  # noqa: E402
+
+CHANNELS = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+LATENCY = (int(sys.argv[2]) if len(sys.argv) > 2 else 10) / 1000
+
+
+def device_config(device: MockDevice) -> dict:
+    return parse_response('\r\n'.join(
+        f'{key}={value}' for key, value in device.httpd.config.items()))['table']
+
+
+def standard_config(device: MockDevice) -> dict:
+    config = device_config(device)
+    desired = {name: config[name] for name in ('ChannelTitle', 'Encode')}
+    # The standard differs from the device in a few keys
+    desired['ChannelTitle'][0]['Name'] = 'Entrada'
+    desired['Encode'][1]['MainFormat'][0]['Video']['FPS'] = 30
+    return desired
+
+
+def every_key(api: IntelbrasAPI, desired: dict) -> int:
+    # One setConfig per key, as the job does today
+    for key, value in flatten_response(desired).items():
+        api.configManager(action='setConfig', **{key: format_value(value)})
+    return len(flatten_response(desired))
+
+
+def run(name: str, device: MockDevice, func) -> None:
+    with IntelbrasAPI(device.url, 'admin', 'admin') as api:
+        device.stats.reset()
+        start = time.perf_counter()
+        func(api)
+        elapsed = time.perf_counter() - start
+    print(f"{name:<30} {elapsed:6.2f}s requests={device.stats.get('requests'):<5} "
+          f"keys written={device.stats.get('config_writes')}")
+
+
+if __name__ == '__main__':
+    with MockDevice(channels=CHANNELS, latency=LATENCY) as a, \
+            MockDevice(channels=CHANNELS, latency=LATENCY) as b, \
+            MockDevice(channels=CHANNELS, latency=LATENCY) as c:
+        desired = standard_config(a)
+        print(f"channels={CHANNELS} keys={len(flatten_response(desired))} "
+              f"latency={LATENCY * 1000:.0f}ms")
+        run('setConfig every key', a, lambda api: every_key(api, desired))
+        run('set_config every key', c, lambda api: api.set_config(desired))
+        run('sync_config', b, lambda api: api.sync_config(desired))
+        run('sync_config (already synced)', b, lambda api: api.sync_config(desired))
+        assert device_config(a) == device_config(b) == device_config(c)
@@ -0,0 +1,78 @@
+# Coverage and gap queries over the recordings of many channels: scanning
+# the find_media_files items for each channel and query, against a
+# Timeline built once (and updated batch by batch).
+#
+# Usage: python benchmarks/bench_timeline.py [channels] [days] [queries]
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import samples  # noqa: E402
+from pyintelbras.media import MediaFileTable  # noqa: E402
+from pyintelbras.timeline import Timeline  # noqa: E402
+
+CHANNELS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+DAYS = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+QUERIES = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+START = datetime(2024, 8, 1)
+
+
+def scan_gaps(items: list, channel: int, start: datetime, end: datetime) -> list:
+    # The loops the timeline replaces: the channel files over the range,
+    # sorted and walked
+    files = sorted((i['StartTime'], i['EndTime']) for i in items
+                   if i['Channel'] == channel and i['EndTime'] > start
+                   and i['StartTime'] < end)
+    gaps = []
+    cursor = start
+    for file_start, file_end in files:
+        if (file_start - cursor).total_seconds() > 1:
+            gaps.append((cursor, file_start))
+        cursor = max(cursor, file_end)
+    if (end - cursor).total_seconds() > 1:
+        gaps.append((cursor, end))
+    return gaps
+
+
+if __name__ == '__main__':
+    rng = random.Random(1)
+    # 1% of the files missing
+    items = [i for i in samples.recordings(CHANNELS, DAYS, 30, START) if rng.random() > 0.01]
+    ranges = []
+    for _ in range(QUERIES):
+        start = START + timedelta(hours=rng.randrange(DAYS * 24 - 12))
+        ranges.append((start, start + timedelta(hours=12)))
+    print(f'channels={CHANNELS} files={len(items)} queries={QUERIES}')
+
+    start = time.perf_counter()
+    scanned = [{c: g for c in range(CHANNELS) if (g := scan_gaps(items, c, *r))}
+               for r in ranges]
+    print(f'{"scan items":<22} {time.perf_counter() - start:.2f}s')
+
+    start = time.perf_counter()
+    timeline = Timeline()
+    timeline.add_items(items, device='nvr')
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    found = [timeline.gaps(*r) for r in ranges]
+    queried = time.perf_counter() - start
+    print(f'{"timeline":<22} build={built:.2f}s queries={queried * 1000:.1f}ms')
+
+    for expected, gaps in zip(scanned, found):
+        assert len(expected) == len(gaps)
+        for (_, channel), channel_gaps in gaps.items():
+            assert [(g.start_time, g.end_time) for g in channel_gaps] == expected[channel]
+
+    # Incremental: listing batches of 100 files as they arrive
+    table = MediaFileTable.from_items(items)
+    timeline = Timeline()
+    start = time.perf_counter()
+    for i in range(0, len(table), 100):
+        timeline.add_table(table.take(range(i, min(i + 100, len(table)))), device='nvr')
+    print(f'{"timeline (batches)":<22} build={time.perf_counter() - start:.2f}s '
+          f'covered={len(timeline.covered(*ranges[0]))}/{CHANNELS} channels')
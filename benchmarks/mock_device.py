@@ -0,0 +1,521 @@
+# Local stand-in for an Intelbras device, used by the benchmark scripts.
+#
+# It speaks HTTP/1.1 with keep-alive and digest authentication, and counts
+# TCP connections, HTTP requests and digest challenges so round-trips can be
+# compared between client implementations. Responses recorded from a real
+# device (see record_device.py) are replayed before the built-in routes, and
+# latency, errors, dropped connections and slow transfers can be injected.
+
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl, unquote, urlencode
+
+from samples import config_dump
+
+REALM = 'Login to mock-device'
+
+# magicBox.cgi answers, shaped like the ones of an Intelbras NVR
+MAGIC_BOX = {
+    'getDeviceType': 'type=MHDX 3116',
+    'getHardwareVersion': 'version=1.00',
+    'getSerialNo': 'sn=ABCD1234567890',
+    'getMachineName': 'name=NVR',
+    'getVendor': 'vendor=Intelbras',
+    'getSoftwareVersion': 'version=4.000.00IB000.0,build:2023-05-10',
+    'getSystemInfo': 'deviceType=MHDX 3116\r\nprocessor=ST7108\r\n'
+                     'serialNumber=ABCD1234567890\r\nupdateSerial=MHDX 3116',
+    'getLanguageCaps': 'Languages=English,Portuguese,SimpChinese',
+}
+
+
+def _md5(s: str) -> str:
+    return hashlib.md5(s.encode()).hexdigest()
+
+
+def _parse_digest(header: str) -> dict:
+    _, _, params = header.partition(' ')
+    parsed = {}
+    for item in params.split(','):
+        key, _, value = item.strip().partition('=')
+        parsed[key] = value.strip('"')
+    return parsed
+
+
+class MockDeviceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.stats.incr('connections')
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        stats = self.server.stats
+        stats.incr('requests')
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        if not self._authorized():
+            stats.incr('challenges')
+            nonce = os.urandom(16).hex()
+            self.server.nonces.add(nonce)
+            self._reply(401, b'Unauthorized', headers={
+                'WWW-Authenticate': (
+                    f'Digest realm="{REALM}", qop="auth", nonce="{nonce}", '
+                    f'opaque="{os.urandom(8).hex()}"'),
+            })
+            return
+
+        server = self.server
+        if server.drop_rate and server.random.random() < server.drop_rate:
+            # Connection closed without an answer, as a rebooting device
+            stats.incr('drops')
+            self.close_connection = True
+            return
+        if server.error_rate and server.random.random() < server.error_rate:
+            stats.incr('errors')
+            self._reply(server.error_status, b'Error\r\nInternal Error!\r\n')
+            return
+
+        if server.max_concurrent:
+            with server.active_lock:
+                server.active += 1
+                overloaded = server.active > server.max_concurrent
+            if overloaded:
+                # Overloaded recorders answer 503 without doing the work
+                with server.active_lock:
+                    server.active -= 1
+                stats.incr('overloads')
+                self._reply(503, b'Service Unavailable')
+                return
+        try:
+            self._route()
+        finally:
+            if server.max_concurrent:
+                with server.active_lock:
+                    server.active -= 1
+
+    def _route(self):
+        server = self.server
+        if server.latency or server.jitter:
+            time.sleep(server.latency + server.random.uniform(0, server.jitter))
+
+        url = urlparse(self.path)
+        params = dict(parse_qsl(url.query))
+        if server.responses and self._replay(url.path, params):
+            return
+        route = server.routes.get(url.path)
+        if route is None:
+            for prefix, prefix_route in server.routes.items():
+                if prefix.endswith('/') and url.path.startswith(prefix):
+                    route = prefix_route
+                    break
+        if route is None:
+            self._reply(404, b'Error\r\nBad Request!\r\n')
+            return
+        route(self, params)
+
+    def _replay(self, path: str, params: dict) -> bool:
+        # Recorded response for the request, looked up with its parameters
+        # first, e.g. configManager.getConfig?name=ChannelTitle, then by
+        # endpoint only
+        label = response_key(path, params)
+        recorded = self.server.responses.get(label)
+        if recorded is None:
+            recorded = self.server.responses.get(label.partition('?')[0])
+        if recorded is None:
+            return False
+        self.server.stats.incr('replayed')
+        status, body = recorded
+        self._reply(status, body.encode())
+        return True
+
+    def _authorized(self) -> bool:
+        header = self.headers.get('Authorization', '')
+        if not header.lower().startswith('digest '):
+            return False
+        auth = _parse_digest(header)
+        if auth.get('nonce') not in self.server.nonces:
+            return False
+        ha1 = _md5(f"{self.server.user}:{REALM}:{self.server.password}")
+        ha2 = _md5(f"{self.command}:{auth.get('uri')}")
+        expected = _md5(
+            f"{ha1}:{auth.get('nonce')}:{auth.get('nc')}:"
+            f"{auth.get('cnonce')}:{auth.get('qop')}:{ha2}")
+        return expected == auth.get('response')
+
+    def _reply(self, status: int, body: bytes, headers: dict = None,
+               content_type: str = 'text/plain'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def get(self, name: str) -> int:
+        return self.counters.get(name, 0)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+
+
+def config_manager(handler: MockDeviceHandler, params: dict):
+    server = handler.server
+    action = params.pop('action', None)
+    if action == 'setConfig':
+        with server.config_lock:
+            for key, value in params.items():
+                server.config[f'table.{key}'] = value
+        server.stats.incr('config_writes', len(params))
+        handler._reply(200, b'OK\r\n')
+        return
+    if action != 'getConfig':
+        handler._reply(200, b'OK\r\n')
+        return
+    name = params.get('name')
+    if name == 'All' and not server.config_all:
+        handler._reply(400, b'Error\r\nBad Request!\r\n')
+        return
+    prefixes = tuple(f'table.{name}{c}' for c in '.[=') if name != 'All' else ''
+    with server.config_lock:
+        body = ''.join(f'{key}={value}\r\n' for key, value in server.config.items()
+                       if key.startswith(prefixes))
+    if not body:
+        handler._reply(400, b'Error\r\nBad Request!\r\n')
+        return
+    handler._reply(200, body.encode())
+
+
+def get_version(handler: MockDeviceHandler, params: dict):
+    handler._reply(200, b'version=2.84\r\n')
+
+
+def magic_box(handler: MockDeviceHandler, params: dict):
+    body = MAGIC_BOX.get(params.get('action'))
+    if body is None:
+        handler._reply(400, b'Error\r\nBad Request!\r\n')
+        return
+    handler._reply(200, f'{body}\r\n'.encode())
+
+
+def response_key(path: str, params: dict) -> str:
+    # e.g. configManager.getConfig?name=ChannelTitle for
+    # /cgi-bin/configManager.cgi?action=getConfig&name=ChannelTitle
+    name = path.rsplit('/', 1)[-1]
+    if name.endswith('.cgi'):
+        name = name[:-len('.cgi')]
+    rest = {k: v for k, v in params.items() if k != 'action'}
+    action = params.get('action')
+    label = f'{name}.{action}' if action else name
+    return f'{label}?{urlencode(sorted(rest.items()))}' if rest else label
+
+
+def load_responses(path: str) -> dict:
+    # Responses written by record_device.py, {key: [status, body]}
+    with open(path) as f:
+        return {key: (status, body) for key, (status, body) in json.load(f).items()}
+
+
+def file_content(offset: int, size: int) -> bytes:
+    # Deterministic content so downloads can be verified without storing it
+    block = bytes(range(251))
+    start = offset % 251
+    data = (block[start:] + block * (size // 251 + 1))[:size]
+    return data
+
+
+def load_file(handler: MockDeviceHandler, params: dict):
+    url = urlparse(handler.path)
+    file_path = unquote(url.path)[len('/cgi-bin/RPC_Loadfile'):]
+    if file_path.endswith('.cgi'):
+        file_path = file_path[:-len('.cgi')]
+    size = handler.server.files.get(file_path)
+    if size is None:
+        handler._reply(404, b'Error\r\nFile not found!\r\n')
+        return
+
+    start, end, status = 0, size - 1, 200
+    range_header = handler.headers.get('Range')
+    if range_header and range_header.startswith('bytes='):
+        first, _, last = range_header[len('bytes='):].partition('-')
+        start = int(first or 0)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size:
+            handler.send_response(416)
+            handler.send_header('Content-Range', f'bytes */{size}')
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return
+        status = 206
+
+    handler.send_response(status)
+    handler.send_header('Content-Type', 'application/octet-stream')
+    handler.send_header('Content-Length', str(end - start + 1))
+    handler.send_header('Accept-Ranges', 'bytes')
+    if status == 206:
+        handler.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+    handler.end_headers()
+
+    bandwidth = handler.server.bandwidth
+    chunk = 256 * 1024 if not bandwidth else min(64 * 1024, max(1024, bandwidth // 10))
+    position = start
+    while position <= end:
+        size_left = min(chunk, end - position + 1)
+        handler.wfile.write(file_content(position, size_left))
+        position += size_left
+        if bandwidth:
+            time.sleep(size_left / bandwidth)
+    handler.server.stats.incr('bytes_sent', end - start + 1)
+
+
+def media_file_find(handler: MockDeviceHandler, params: dict):
+    # mediaFileFind.cgi over the recordings, or the files served by
+    # RPC_Loadfile, one finder object per factory.create with its own
+    # cursor over the items matching its findFile conditions
+    server = handler.server
+    action = params.get('action')
+    with server.finders_lock:
+        if action == 'factory.create':
+            server.finder_count += 1
+            server.finders[server.finder_count] = []
+            handler._reply(200, f'result={server.finder_count}\r\n'.encode())
+            return
+        finder = int(params.get('object', 0))
+        if finder not in server.finders:
+            handler._reply(400, b'Error\r\nInvalid object!\r\n')
+            return
+        if action == 'findFile':
+            server.finders[finder] = _find_recordings(server, params)
+        if action == 'destroy':
+            del server.finders[finder]
+        if action != 'findNextFile':
+            handler._reply(200, b'OK\r\n')
+            return
+        pending = server.finders[finder]
+        count = int(params.get('count', 100))
+        items, server.finders[finder] = pending[:count], pending[count:]
+
+    lines = [f'found={len(items)}']
+    for i, item in enumerate(items):
+        for key, value in item.items():
+            if isinstance(value, datetime):
+                value = f'{value:%Y-%m-%d %H:%M:%S}'
+            lines.append(f'items[{i}].{key}={value}')
+    handler._reply(200, ('\r\n'.join(lines) + '\r\n').encode())
+
+
+def _find_recordings(server, params: dict) -> list:
+    if not server.recordings:
+        return [{'Channel': 0, 'FilePath': path, 'Length': size, 'Type': 'dav'}
+                for path, size in sorted(server.files.items())]
+    channel = params.get('condition.Channel')
+    start = params.get('condition.StartTime')
+    end = params.get('condition.EndTime')
+    start = start and datetime.strptime(start, '%Y-%m-%d %H:%M:%S')
+    end = end and datetime.strptime(end, '%Y-%m-%d %H:%M:%S')
+    return [item for item in server.recordings
+            if (channel is None or item['Channel'] == int(channel) - 1)
+            and (not start or item['EndTime'] > start)
+            and (not end or item['StartTime'] < end)]
+
+
+def load_by_time(handler: MockDeviceHandler, params: dict):
+    # loadfile.cgi?action=startLoad: byte_rate bytes per recorded second of
+    # the channel between startTime and endTime, 400 without byte_rate
+    server = handler.server
+    if not server.byte_rate or params.get('action') != 'startLoad':
+        handler._reply(400, b'Error\r\nBad Request!\r\n')
+        return
+    start = datetime.strptime(params['startTime'], '%Y-%m-%d %H:%M:%S')
+    end = datetime.strptime(params['endTime'], '%Y-%m-%d %H:%M:%S')
+    items = _find_recordings(server, {'condition.Channel': params.get('channel')})
+    seconds = sum((min(end, i['EndTime']) - max(start, i['StartTime'])).total_seconds()
+                  for i in items if i['EndTime'] > start and i['StartTime'] < end)
+    size = int(seconds * server.byte_rate)
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'Application/octet-stream')
+    handler.send_header('Content-Length', str(size))
+    handler.end_headers()
+    position = 0
+    while position < size:
+        length = min(256 * 1024, size - position)
+        handler.wfile.write(file_content(position, length))
+        position += length
+    server.stats.incr('bytes_sent', size)
+
+
+def snapshot(handler: MockDeviceHandler, params: dict):
+    # JPEG-sized payload that only changes every snapshot_period seconds,
+    # like a static scene
+    server = handler.server
+    frame = int(time.time() / server.snapshot_period) if server.snapshot_period else 0
+    channel = int(params.get('channel', 1))
+    header = f'JFIF channel={channel} frame={frame}'.encode()
+    body = header + file_content(channel, server.snapshot_size - len(header))
+    handler._reply(200, body, content_type='image/jpeg')
+
+
+def attach_events(handler: MockDeviceHandler, params: dict):
+    # eventManager.cgi?action=attach: multipart stream of events, closed
+    # after event_count events so clients exercise their reconnect path
+    server = handler.server
+    handler.close_connection = True
+    handler.send_response(200)
+    handler.send_header(
+        'Content-Type', 'multipart/x-mixed-replace; boundary=myboundary')
+    handler.send_header('Connection', 'close')
+    handler.end_headers()
+    try:
+        for i in range(server.event_count):
+            action = 'Start' if i % 2 == 0 else 'Stop'
+            body = (f'Code=VideoMotion;action={action};index={i % server.channels}'
+                    f'\r\n').encode()
+            handler.wfile.write(
+                b'--myboundary\r\nContent-Type: text/plain\r\n'
+                + f'Content-Length: {len(body)}\r\n\r\n'.encode()
+                + body + b'\r\n')
+            handler.wfile.flush()
+            server.stats.incr('events_sent')
+            if server.event_interval:
+                time.sleep(server.event_interval)
+    except OSError:
+        pass
+
+
+class MockDevice:
+    def __init__(self, user: str = 'admin', password: str = 'admin',
+                 host: str = '127.0.0.1', port: int = 0, channels: int = 16,
+                 files: dict = None, latency: float = 0,
+                 event_count: int = 10, event_interval: float = 0.01,
+                 snapshot_size: int = 64 * 1024, snapshot_period: float = 0,
+                 config_all: bool = True, recordings: list = None,
+                 max_concurrent: int = 0, responses: dict = None,
+                 jitter: float = 0, error_rate: float = 0,
+                 error_status: int = 500, drop_rate: float = 0,
+                 bandwidth: int = 0, seed: int = None, byte_rate: int = 0):
+        self.httpd = ThreadingHTTPServer((host, port), MockDeviceHandler)
+        self.httpd.daemon_threads = True
+        # Clients giving up on a slow answer are expected, not errors
+        self.httpd.handle_error = lambda request, client_address: None
+        self.httpd.user = user
+        self.httpd.password = password
+        self.httpd.channels = channels
+        self.httpd.config = dict(
+            line.split('=', 1) for line in config_dump(channels).splitlines())
+        self.httpd.config_lock = threading.Lock()
+        # Whether getConfig&name=All is supported
+        self.httpd.config_all = config_all
+        self.httpd.files = files or {}
+        # find_media_files items, see samples.recordings
+        self.httpd.recordings = recordings or []
+        self.httpd.snapshot_size = snapshot_size
+        self.httpd.snapshot_period = snapshot_period
+        self.httpd.event_count = event_count
+        self.httpd.event_interval = event_interval
+        # Replayed answers, {response_key: (status, body)}
+        self.httpd.responses = responses or {}
+        # Simulated device processing time per authorized request, plus a
+        # random 0 to jitter seconds
+        self.httpd.latency = latency
+        self.httpd.jitter = jitter
+        # Share of authorized requests answered with error_status, or whose
+        # connection is closed without an answer
+        self.httpd.error_rate = error_rate
+        self.httpd.error_status = error_status
+        self.httpd.drop_rate = drop_rate
+        # RPC_Loadfile bytes per second, 0 for no limit
+        self.httpd.bandwidth = bandwidth
+        # loadfile.cgi bytes per recorded second, 0 when not supported
+        self.httpd.byte_rate = byte_rate
+        self.httpd.random = random.Random(seed)
+        # Authorized requests handled at once before answering 503, 0 for
+        # no limit
+        self.httpd.max_concurrent = max_concurrent
+        self.httpd.active = 0
+        self.httpd.active_lock = threading.Lock()
+        self.httpd.nonces = set()
+        self.httpd.finders = {}
+        self.httpd.finder_count = 0
+        self.httpd.finders_lock = threading.Lock()
+        self.httpd.stats = Stats()
+        self.httpd.routes = {
+            '/cgi-bin/configManager.cgi': config_manager,
+            '/cgi-bin/IntervideoManager.cgi': get_version,
+            '/cgi-bin/magicBox.cgi': magic_box,
+            '/cgi-bin/RPC_Loadfile/': load_file,
+            '/cgi-bin/eventManager.cgi': attach_events,
+            '/cgi-bin/snapshot.cgi': snapshot,
+            '/cgi-bin/loadfile.cgi': load_by_time,
+            '/cgi-bin/mediaFileFind.cgi': media_file_find,
+        }
+        self.thread = None
+        self.process = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def stats(self) -> Stats:
+        return self.httpd.stats
+
+    def start(self, process: bool = False) -> "MockDevice":
+        # process serves from a forked child so the device does not compete
+        # with the client for the GIL; stats are then kept by the child
+        if process:
+            self.process = multiprocessing.get_context('fork').Process(
+                target=self.httpd.serve_forever, daemon=True)
+            self.process.start()
+            return self
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+        else:
+            self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "MockDevice":
+        if self.thread is None and self.process is None:
+            self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,46 @@
+# Records the answers of a real device to read-only requests, to be
+# replayed by MockDevice(responses=load_responses(path)):
+#
+#   python benchmarks/record_device.py http://192.168.1.108 admin senha nvr.json
+#   MockDevice(responses=load_responses('nvr.json'))
+#
+# Review the file before sharing it, it holds the device configuration
+# (serial number, network settings, ...).
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from mock_device import MAGIC_BOX, response_key  # noqa: E402
+from pyintelbras import IntelbrasAPI  # noqa: E402
+
+CONFIGS = ('ChannelTitle', 'Encode', 'Record', 'RecordMode', 'Network',
+           'General', 'NTP', 'VideoInOptions', 'MotionDetect', 'All')
+
+REQUESTS = (
+    [('IntervideoManager', {'action': 'getVersion', 'Name': 'CGI'})]
+    + [('magicBox', {'action': action}) for action in MAGIC_BOX]
+    + [('configManager', {'action': 'getConfig', 'name': name}) for name in CONFIGS]
+)
+
+
+def record(api: IntelbrasAPI) -> dict:
+    responses = {}
+    for path, params in REQUESTS:
+        response = getattr(api, path)(**params)
+        key = response_key(f'/cgi-bin/{path}.cgi', params)
+        responses[key] = [response.status_code, response.text]
+        print(f'{response.status_code} {key} ({len(response.content)} bytes)')
+    return responses
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 5:
+        sys.exit(f'Usage: {sys.argv[0]} server user password output.json')
+    server, user, password, output = sys.argv[1:]
+    with IntelbrasAPI(server, user, password) as api:
+        responses = record(api)
+    with open(output, 'w') as f:
+        json.dump(responses, f, indent=2, ensure_ascii=False)
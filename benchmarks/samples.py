@@ -0,0 +1,109 @@
+# Large responses shaped like the ones returned by real recorders, used by
+# the parsing benchmarks.
+
+from datetime import datetime, timedelta
+
+
+def config_dump(channels: int = 32) -> str:
+    # Shaped like configManager.cgi?action=getConfig&name=All
+    lines = []
+    for c in range(channels):
+        lines.append(f'table.ChannelTitle[{c}].Name=Canal{c + 1}')
+    for c in range(channels):
+        for stream, name in enumerate(('MainFormat', 'ExtraFormat')):
+            for f in range(4):
+                prefix = f'table.Encode[{c}].{name}[{f}]'
+                lines += [
+                    f'{prefix}.AudioEnable=false',
+                    f'{prefix}.Audio.Bitrate=64',
+                    f'{prefix}.Audio.Compression=G.711A',
+                    f'{prefix}.Audio.Depth=16',
+                    f'{prefix}.Audio.Frequency=8000',
+                    f'{prefix}.Audio.Mode=0',
+                    f'{prefix}.Audio.Pack=DHAV',
+                    f'{prefix}.Video.BitRate={4096 >> stream}',
+                    f'{prefix}.Video.BitRateControl=VBR',
+                    f'{prefix}.Video.Compression=H.265',
+                    f'{prefix}.Video.CustomResolutionName=1080P',
+                    f'{prefix}.Video.FPS=15.000000',
+                    f'{prefix}.Video.GOP=30',
+                    f'{prefix}.Video.Height=1080',
+                    f'{prefix}.Video.Pack=DHAV',
+                    f'{prefix}.Video.Profile=Main',
+                    f'{prefix}.Video.Quality=4',
+                    f'{prefix}.Video.QualityRange=6',
+                    f'{prefix}.Video.Width=1920',
+                    f'{prefix}.VideoEnable=true',
+                ]
+    for c in range(channels):
+        for day in range(7):
+            for section in range(6):
+                lines.append(
+                    f'table.Record[{c}].TimeSection[{day}][{section}]='
+                    f'{1 if section == 0 else 0} 00:00:00-'
+                    f'{"23:59:59" if section == 0 else "00:00:00"}')
+        lines += [
+            f'table.Record[{c}].Format=dav',
+            f'table.Record[{c}].HolidayEnable=false',
+            f'table.Record[{c}].PreRecord=4',
+            f'table.Record[{c}].Redundancy=false',
+            f'table.Record[{c}].Stream=0',
+            f'table.RecordMode[{c}].Mode=0',
+            f'table.RecordMode[{c}].ModeExtra1=2',
+        ]
+    lines += [
+        'table.Network.DefaultInterface=eth0',
+        'table.Network.Domain=intelbras',
+        'table.Network.Hostname=NVR',
+        'table.Network.eth0.DefaultGateway=192.168.1.1',
+        'table.Network.eth0.DhcpEnable=false',
+        'table.Network.eth0.IPAddress=192.168.1.108',
+        'table.Network.eth0.MTU=1500',
+        'table.Network.eth0.SubnetMask=255.255.255.0',
+    ]
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def media_files(count: int = 5000, channel: int = 0) -> str:
+    # Shaped like mediaFileFind.cgi?action=findNextFile
+    start = datetime(2024, 8, 28)
+    lines = [f'found={count}']
+    for i in range(count):
+        begin = start + timedelta(minutes=i)
+        end = begin + timedelta(seconds=59)
+        lines += [
+            f'items[{i}].Channel={channel}',
+            f'items[{i}].Cluster={371211 + i}',
+            f'items[{i}].CutLength=3276800',
+            f'items[{i}].Disk=2',
+            f'items[{i}].EndTime={end:%Y-%m-%d %H:%M:%S}',
+            f'items[{i}].Events[0]=FaceRecognition',
+            f'items[{i}].FilePath=/mnt/dvr/{begin:%Y-%m-%d}/{channel}/dav/'
+            f'{begin:%H}/0/2/{371211 + i}/'
+            f'{begin:%H.%M.%S}-{end:%H.%M.%S}[R][0@0][0].dav',
+            f'items[{i}].Flags[0]=Event',
+            f'items[{i}].Length=3276800',
+            f'items[{i}].Partition=2',
+            f'items[{i}].StartTime={begin:%Y-%m-%d %H:%M:%S}',
+            f'items[{i}].Type=dav',
+            f'items[{i}].VideoStream=Main',
+        ]
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def recordings(channels: int = 4, days: int = 7, minutes: int = 30,
+               start: datetime = datetime(2024, 8, 1)) -> list:
+    # Continuous recording split in files of the given minutes, shaped like
+    # the items of find_media_files (channels numbered from 0)
+    items = []
+    for channel in range(channels):
+        begin = start
+        while begin < start + timedelta(days=days):
+            end = begin + timedelta(minutes=minutes) - timedelta(seconds=1)
+            items.append({
+                'Channel': channel, 'StartTime': begin, 'EndTime': end,
+                'FilePath': f'/mnt/dvr/{begin:%Y-%m-%d}/{channel}/dav/{begin:%H}/'
+                            f'{begin:%H.%M.%S}-{end:%H.%M.%S}[R][0@0][0].dav',
+                'Length': 1024, 'Type': 'dav', 'VideoStream': 'Main'})
+            begin += timedelta(minutes=minutes)
+    return items
@@ -0,0 +1,216 @@
+# End-to-end benchmark suite against mock devices served from child
+# processes: request throughput and latency, parsing and download memory
+# peaks, and fleet sweeps with and without injected faults.
+#
+#   python benchmarks/suite.py --json results.json
+#   python benchmarks/suite.py --baseline results.json --tolerance 0.25
+#
+# With --baseline the exit status is 1 when a metric got worse than the
+# baseline by more than tolerance (a fraction), to catch regressions in CI.
+# Timing results vary between machines, compare runs of the same machine.
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import samples  # noqa: E402
+from mock_device import MockDevice  # noqa: E402
+from pyintelbras import IntelbrasAPI, DeviceFleet  # noqa: E402
+from pyintelbras.retry import RetryPolicy  # noqa: E402
+
+FILE = '/mnt/dvr/2024-08-28/0/dav/02/0/2/371211/02.40.49-02.41.00[R][0@0][0].dav'
+# Whether a higher value is better, by unit
+HIGHER_IS_BETTER = {'calls/s': True, 'MiB/s': True, 'ms': False,
+                    's': False, 'MiB': False, '%': True}
+
+
+def peak_memory(func) -> float:
+    # Peak of the Python allocations made by func, in MiB
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def best_of(repeat: int, func) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_calls(scale: float) -> dict:
+    calls = int(2000 * scale)
+    with MockDevice().start(process=True) as device, \
+            IntelbrasAPI(device.url, 'admin', 'admin') as api:
+        api.channels
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(calls):
+            call_start = time.perf_counter()
+            api.channels
+            latencies.append(time.perf_counter() - call_start)
+        elapsed = time.perf_counter() - start
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {
+        'calls': (calls / elapsed, 'calls/s'),
+        'p50': (percentiles[49] * 1000, 'ms'),
+        'p99': (percentiles[98] * 1000, 'ms'),
+    }
+
+
+def bench_media_files(scale: float) -> dict:
+    # 5040 recordings of 2 minutes on one channel by default
+    recordings = samples.recordings(channels=1, days=max(1, round(7 * scale)), minutes=2)
+    params = {'condition.Channel': 1}
+    with MockDevice(recordings=recordings).start(process=True) as device, \
+            IntelbrasAPI(device.url, 'admin', 'admin') as api:
+        return {
+            'find_media_files': (best_of(3, lambda: api.find_media_files(params)), 's'),
+            'find_media_files_peak': (
+                peak_memory(lambda: api.find_media_files(params)), 'MiB'),
+            'find_media_table': (best_of(3, lambda: api.find_media_table(params)), 's'),
+            'find_media_table_peak': (
+                peak_memory(lambda: api.find_media_table(params)), 'MiB'),
+        }
+
+
+def bench_configs(scale: float) -> dict:
+    channels = max(1, round(32 * scale))
+    names = ['ChannelTitle', 'Encode', 'Record', 'RecordMode', 'Network']
+    with MockDevice(channels=channels).start(process=True) as device, \
+            IntelbrasAPI(device.url, 'admin', 'admin') as api:
+        return {
+            'get_configs': (best_of(3, lambda: api.get_configs(names)), 's'),
+            'get_configs_peak': (peak_memory(lambda: api.get_configs(names)), 'MiB'),
+        }
+
+
+def bench_download(scale: float) -> dict:
+    size = int(64 * scale) * 2 ** 20
+    with MockDevice(files={FILE: size}).start(process=True) as device, \
+            IntelbrasAPI(device.url, 'admin', 'admin') as api, \
+            tempfile.TemporaryDirectory() as tmp:
+        dest = os.path.join(tmp, 'video.dav')
+
+        def download():
+            api.download_media_file(FILE, dest, resume=False)
+
+        elapsed = best_of(3, download)
+        return {
+            'download': (size / elapsed / 2 ** 20, 'MiB/s'),
+            'download_peak': (peak_memory(download), 'MiB'),
+        }
+
+
+def inventory(api: IntelbrasAPI) -> dict:
+    return {'version': api.api_version, 'channels': len(api.channels)}
+
+
+def sweep(devices: list, **kwargs) -> tuple:
+    with DeviceFleet([d.url for d in devices], user='admin', password='admin',
+                     max_workers=64, **kwargs) as fleet:
+        start = time.perf_counter()
+        results = list(fleet.map(inventory))
+        elapsed = time.perf_counter() - start
+    return elapsed, sum(r.ok for r in results) / len(results) * 100
+
+
+def bench_fleet(scale: float) -> dict:
+    count = max(2, int(50 * scale))
+    devices = [MockDevice(latency=0.02).start(process=True) for _ in range(count)]
+    try:
+        elapsed, _ = sweep(devices)
+    finally:
+        for device in devices:
+            device.stop()
+
+    # Every device drops or fails some requests, the retries hide them
+    devices = [MockDevice(latency=0.02, jitter=0.02, error_rate=0.05,
+                          error_status=503, drop_rate=0.05, seed=i).start(process=True)
+               for i in range(count)]
+    try:
+        faulty, ok = sweep(devices, retry=RetryPolicy(attempts=4, backoff=0.05))
+    finally:
+        for device in devices:
+            device.stop()
+    return {
+        'sweep': (elapsed, 's'),
+        'sweep_faults': (faulty, 's'),
+        'sweep_faults_ok': (ok, '%'),
+    }
+
+
+BENCHMARKS = {
+    'calls': bench_calls,
+    'media_files': bench_media_files,
+    'configs': bench_configs,
+    'download': bench_download,
+    'fleet': bench_fleet,
+}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    # Metrics worse than the baseline by more than tolerance
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old or not old['value']:
+            continue
+        change = result['value'] / old['value'] - 1
+        if not HIGHER_IS_BETTER[result['unit']]:
+            change = -change
+        if change < -tolerance:
+            regressions.append((name, old['value'], result['value'], result['unit'], change))
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmarks', nargs='*',
+                        help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default all)")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='size of the workloads, e.g. 0.1 for a quick run')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for group in args.benchmarks or BENCHMARKS:
+        for metric, (value, unit) in BENCHMARKS[group](args.scale).items():
+            name = f'{group}.{metric}'
+            results[name] = {'value': value, 'unit': unit}
+            print(f'{name:<36} {value:>10.2f} {unit}', flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, old, new, unit, change in regressions:
+            print(f'REGRESSION {name}: {old:.2f} -> {new:.2f} {unit} ({change:+.0%})')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -27,7 +27,4 @@ response = intelbras.find_media_files(params)
 for item in response.get('items'):
     fp = item.get('FilePath')
     filename = os.path.basename(fp)
-    r = intelbras.RPC_Loadfile(extra_path=fp)
-    if r.status_code == 200:
-        with open(filename, 'wb') as bf:
-            bf.write(r.content)
+    intelbras.download_media_file(fp, filename)
@@ -1,5 +1,9 @@
 from .api import IntelbrasAPI
+from .aio import AsyncIntelbrasAPI
+from .fleet import DeviceFleet
 
 __all__ = [
-    IntelbrasAPI
+    IntelbrasAPI,
+    AsyncIntelbrasAPI,
+    DeviceFleet,
 ]
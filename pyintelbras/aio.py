@@ -0,0 +1,433 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Tuple, Union
+
+from requests.auth import HTTPDigestAuth
+from requests.utils import parse_dict_header
+
+from .api import IntelbrasAPI, DigestAuth, DEFAULT_TIMEOUT, _config_ok, _retry_after, _CONFIG_NAME
+from .exceptions import IntelbrasAPIException
+from .limits import RateLimiter
+from .metrics import RequestEvent, endpoint_label
+from .retry import RetryPolicy, CircuitBreaker, budget_timeout, remaining, deadline as deadline_scope
+from .helpers import parse_response, parse_configs, diff_config, flatten_response, format_value
+from .media import MediaFileTable
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+_DIGEST_PREFIX = re.compile(r'digest ', flags=re.IGNORECASE)
+
+
+class AsyncIntelbrasAPI(IntelbrasAPI):
+    # asyncio counterpart of IntelbrasAPI. Method chains work the same way,
+    # but must be awaited:
+    #   await api.configManager(action='getConfig', name='ChannelTitle')
+    def __init__(
+        self, server: str = 'http://localhost',
+        user: str = '',
+        password: str = '',
+        auth: HTTPDigestAuth = None,
+        verify_ssl: bool = False,
+        limit: int = 100,
+        limit_per_host: int = 4,
+        keep_alive: bool = True,
+        session: "aiohttp.ClientSession" = None,
+        limiter: RateLimiter = None,
+        timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+        retry: RetryPolicy = None,
+        breaker: CircuitBreaker = None,
+        hooks: Iterable[Callable[[Any], None]] = None,
+    ) -> None:
+        if aiohttp is None:
+            raise IntelbrasAPIException(
+                'aiohttp is required for AsyncIntelbrasAPI, '
+                'install it with: pip install pyintelbras[async]')
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        # A shared session may be passed to drive many devices over one
+        # connector; in that case it is not closed by this client.
+        self._owns_session = session is None
+        self._semaphore = asyncio.Semaphore(limit_per_host)
+        super().__init__(
+            server=server, user=user, password=password, auth=auth,
+            verify_ssl=verify_ssl, keep_alive=keep_alive, limiter=limiter,
+            timeout=timeout, retry=retry, breaker=breaker, hooks=hooks)
+        if session is not None:
+            self.session = session
+
+    @property
+    async def api_version(self) -> dict:
+        response = await self.IntervideoManager(
+            action='getVersion', Name='CGI')
+        return self._parse('IntervideoManager.getVersion', parse_response, await response.text())
+
+    @property
+    async def channels(self) -> list:
+        response = await self.configManager(
+            action='getConfig', name='ChannelTitle')
+        parsed_response = self._parse(
+            'configManager.getConfig', parse_response, await response.text())
+        return parsed_response.get('table', {}).get('ChannelTitle', [])
+
+    async def get_configs(
+        self, names: Iterable[str], use_all: bool = None,
+        timeout: Union[float, Tuple[float, float]] = None
+    ) -> Dict[str, Any]:
+        # Same as IntelbrasAPI.get_configs, the single requests are bounded
+        # by limit_per_host
+        names = list(dict.fromkeys(names))
+        if use_all is None:
+            use_all = len(names) >= 3 and self._config_all is not False
+
+        configs = {}
+        if use_all:
+            response = await self.configManager(
+                action='getConfig', name='All', timeout=timeout)
+            text = await response.text()
+            self._config_all = _config_ok(response.status, text)
+            if self._config_all:
+                configs = self._parse('configManager.getConfig', parse_configs, text, names)
+            else:
+                logger.debug('getConfig&name=All not supported, reading names one by one')
+
+        missing = [name for name in names if configs.get(name) is None]
+        configs.update(zip(missing, await asyncio.gather(
+            *(self._get_config(name, timeout) for name in missing))))
+        return {name: configs.get(name) for name in names}
+
+    async def _get_config(
+        self, name: str, timeout: Union[float, Tuple[float, float]] = None
+    ) -> Any:
+        response = await self.configManager(
+            action='getConfig', name=name, timeout=timeout)
+        text = await response.text()
+        if not _config_ok(response.status, text):
+            logger.debug(f'Config {name} not available: {response.status}')
+            return None
+        return self._parse('configManager.getConfig', parse_configs, text, [name])[name]
+
+    async def set_config(
+        self, changes: dict, max_url_length: int = 2048,
+        timeout: Union[float, Tuple[float, float]] = None
+    ) -> int:
+        batches = self._config_batches(
+            {key: format_value(value) for key, value in flatten_response(changes).items()},
+            max_url_length)
+        # In order, a batch may depend on the previous one
+        for batch in batches:
+            response = await self.configManager(
+                action='setConfig', timeout=timeout, **batch)
+            text = await response.text()
+            if not _config_ok(response.status, text):
+                raise IntelbrasAPIException(
+                    f'setConfig failed: {response.status} - {text.strip()}',
+                    error=response)
+        return len(batches)
+
+    async def sync_config(
+        self, desired: dict, dry_run: bool = False, max_url_length: int = 2048,
+        timeout: Union[float, Tuple[float, float]] = None
+    ) -> dict:
+        desired = flatten_response(desired)
+        names = {_CONFIG_NAME.match(key).group(0) for key in desired}
+        current = await self.get_configs(sorted(names), timeout=timeout)
+        changes = diff_config(current, desired)
+        if changes and not dry_run:
+            logger.debug(f'Writing {len(changes)} of {len(desired)} config keys')
+            await self.set_config(
+                changes, max_url_length=max_url_length, timeout=timeout)
+        return changes
+
+    async def find_media_files(
+        self, params: dict, batch_size: int = 100, deadline: float = None
+    ) -> dict:
+        # Helper method to docs section 4.10.5 Find Media Files
+        with deadline_scope(deadline):
+            items = [item async for item in self.iter_media_files(
+                params, batch_size=batch_size)]
+        logger.debug(f"Found {len(items)} media files.")
+        return {'found': len(items), 'items': items}
+
+    async def iter_media_files(
+        self, params: dict, batch_size: int = 100
+    ) -> AsyncIterator[dict]:
+        batches = self._media_file_batches(params, batch_size)
+        try:
+            async for text in batches:
+                find_next_response = self._parse(
+                    'mediaFileFind.findNextFile', parse_response, text)
+                items = find_next_response.get('items') or []
+                found = find_next_response.get('found') or 0
+                logger.debug(f"Found {found} media files in batch.")
+                for item in items:
+                    yield item
+                if not items or found < batch_size:
+                    break
+        finally:
+            await batches.aclose()
+
+    async def find_media_table(
+        self, params: dict, batch_size: int = 100, deadline: float = None
+    ) -> MediaFileTable:
+        table = MediaFileTable()
+        with deadline_scope(deadline):
+            batches = self._media_file_batches(params, batch_size)
+            try:
+                async for text in batches:
+                    found = self._parse(
+                        'mediaFileFind.findNextFile', table.extend_response, text)
+                    logger.debug(f"Found {found} media files in batch.")
+                    if found < batch_size:
+                        break
+            finally:
+                await batches.aclose()
+        return table
+
+    # The file downloads of IntelbrasAPI stream on worker threads and have
+    # no asyncio counterpart; inherited, they would read the status of a
+    # coroutine
+    def download_media_file(self, *args, **kwargs) -> None:
+        raise IntelbrasAPIException(
+            'download_media_file is not supported by AsyncIntelbrasAPI, use IntelbrasAPI')
+
+    def download_clip(self, *args, **kwargs) -> None:
+        raise IntelbrasAPIException(
+            'download_clip is not supported by AsyncIntelbrasAPI, use IntelbrasAPI')
+
+    async def _media_file_batches(
+        self, params: dict, batch_size: int
+    ) -> AsyncIterator[str]:
+        # Step 1 - Create a media files finder.
+        create_response = await self._media_file_find('factory.create')
+        object_number = create_response.get('result')
+
+        if not object_number:
+            raise IntelbrasAPIException("Failed to create media file finder")
+
+        try:
+            # Step 2 - Start to find media files satisfied the conditions with the finder.
+            await self._media_file_find(
+                **{**params, 'action': 'findFile', 'object': object_number})
+
+            # Step 3 - Get the media file information found by the finder.
+            while True:
+                response = await self.mediaFileFind(
+                    action='findNextFile', object=object_number,
+                    count=batch_size)
+                yield await response.text()
+        finally:
+            # The finder is released even past the deadline
+            with deadline_scope(None):
+                # Step 4 - Close the finder.
+                await self._media_file_find('close', object=object_number)
+
+                # Step 5 - Destroy the finder.
+                await self._media_file_find('destroy', object=object_number)
+
+    async def _media_file_find(self, action: str, **kwargs) -> dict:
+        response = await self.mediaFileFind(action=action, **kwargs)
+        return self._parse(f'mediaFileFind.{action}', parse_response, await response.text())
+
+    async def close(self) -> None:
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+        self.session = None
+
+    async def __aenter__(self) -> "AsyncIntelbrasAPI":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def do_request(
+        self, method: str, path: str, params: dict,
+        timeout: Union[float, Tuple[float, float]] = None,
+        extra_path: str = '', headers: dict = {}, body: dict = None,
+        stream: bool = False
+    ) -> "aiohttp.ClientResponse":
+        url = self._api_url(path=path, params=params, extra_path=extra_path)
+        logger.debug(f'Requesting {method} to URL {url}')
+        self.last_request_url = url
+
+        extra_headers = {
+            "User-Agent": "python/pyintelbras",
+            "Cache-Control": "no-cache",
+        }
+        if not self.keep_alive:
+            extra_headers["Connection"] = "close"
+        extra_headers.update(headers)
+
+        timeout = self.timeout if timeout is None else timeout
+        retries = 0
+        if self.retry is not None and self.retry.retryable(
+                method, str(params.get('action', ''))):
+            retries = self.retry.attempts - 1
+
+        # Phase timings of the last attempt, only measured for hooks. The
+        # connection setup is not measured apart, it counts in ttfb.
+        timings = {} if self.hooks else None
+        started = time.perf_counter()
+        retry = 0
+        try:
+            for retry in range(retries + 1):
+                try:
+                    async with self._semaphore:
+                        response = await self._send_request(
+                            method, url, budget_timeout(timeout, url),
+                            extra_headers, body, stream, timings)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    if retry == retries or not await self._backoff(retry, url, e):
+                        raise
+                    continue
+                if (retry == retries or response.status not in self.retry.statuses
+                        or not await self._backoff(retry, url, response.status)):
+                    break
+                response.release()
+        except Exception as e:
+            if timings is not None:
+                self._emit(RequestEvent(
+                    self._host, endpoint_label(path, params), method, None,
+                    time.perf_counter() - started, retries=retry, error=e))
+            raise
+
+        if timings is not None:
+            self._emit(RequestEvent(
+                self._host, endpoint_label(path, params), method,
+                response.status, time.perf_counter() - started,
+                auth=timings.get('auth', 0.0), ttfb=timings.get('headers', 0.0),
+                transfer=timings.get('transfer', 0.0),
+                bytes_received=timings.get('size'), retries=retry,
+                challenges=timings.get('challenges', 0)))
+
+        logger.debug(
+            f'Request status_code {response.status} - {response.reason}')
+        return response
+
+    async def _send_request(
+        self, method: str, url: str, timeout: Union[float, Tuple[float, float]],
+        headers: dict, body: dict, stream: bool, timings: dict = None
+    ) -> "aiohttp.ClientResponse":
+        if self.breaker is not None:
+            self.breaker.before(self._host)
+        permit = None
+        if self.limiter is not None:
+            permit = await self.limiter.acquire_async(self._host, timeout=remaining())
+        try:
+            response = await self._request(
+                method, url, dict(headers), body, timeout, stream, timings)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if permit is not None:
+                permit.release(error=True)
+            if self.breaker is not None:
+                self.breaker.record(self._host, failed=isinstance(
+                    e, (aiohttp.ClientConnectionError, asyncio.TimeoutError)))
+            raise
+        if permit is not None:
+            permit.release(response.status,
+                           retry_after=_retry_after(response.headers))
+        if self.breaker is not None:
+            self.breaker.record(
+                self._host, failed=self.breaker.failed(response.status))
+        return response
+
+    async def _backoff(self, retry: int, url: str, reason: Any) -> bool:
+        delay = self.retry.delay(retry)
+        left = remaining()
+        if left is not None and delay >= left:
+            return False
+        logger.debug(f'Retrying {url} in {delay:.2f}s: {reason!r}')
+        await asyncio.sleep(delay)
+        return True
+
+    async def _request(
+        self, method: str, url: str, extra_headers: dict, body: dict,
+        timeout: Union[float, Tuple[float, float]], stream: bool,
+        timings: dict = None
+    ) -> "aiohttp.ClientResponse":
+        authorization = self._digest_header(method, url)
+        if authorization:
+            extra_headers["Authorization"] = authorization
+        if timings is not None:
+            timings.update(auth=0.0, challenges=0)
+        response = await self._send(
+            method, url, extra_headers, body, timeout, stream, timings)
+
+        # Digest challenge: either the first request of this client or
+        # the device rejected the cached nonce. Renegotiate once.
+        challenge = response.headers.get('WWW-Authenticate', '')
+        if (response.status == 401 and self.auth
+                and 'digest' in challenge.lower()):
+            self.auth.init_per_thread_state()
+            self.auth._thread_local.chal = parse_dict_header(
+                _DIGEST_PREFIX.sub('', challenge, count=1))
+            if isinstance(self.auth, DigestAuth):
+                self.auth._shared_chal = self.auth._thread_local.chal
+            authorization = self._digest_header(method, url)
+            if timings is not None:
+                timings.update(auth=timings['headers'] + timings['transfer'],
+                               challenges=1)
+            response = await self._send(
+                method, url, {**extra_headers,
+                              "Authorization": authorization},
+                body, timeout, stream, timings)
+        return response
+
+    def _digest_header(self, method: str, url: str) -> str:
+        if not self.auth:
+            return None
+        self.auth.init_per_thread_state()
+        if not self.auth._thread_local.chal:
+            return None
+        return self.auth.build_digest_header(method, url)
+
+    async def _send(
+        self, method: str, url: str, headers: dict, body: dict,
+        timeout: Union[float, Tuple[float, float]], stream: bool = False,
+        timings: dict = None
+    ) -> "aiohttp.ClientResponse":
+        start = time.perf_counter()
+        response = await self._get_session().request(
+            method, url, headers=headers, json=body,
+            timeout=self._client_timeout(timeout),
+            ssl=bool(self.verify_ssl))
+        headers_at = time.perf_counter()
+        # With stream the body is left unread, the caller must consume
+        # response.content and release the response.
+        size = response.content_length
+        if not stream or response.status == 401:
+            size = len(await response.read())
+        if timings is not None:
+            timings.update(headers=headers_at - start,
+                           transfer=time.perf_counter() - headers_at, size=size)
+        return response
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        # The session must be created inside a running event loop.
+        if self.session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host,
+                force_close=not self.keep_alive)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    def _build_session(self, *args, **kwargs) -> None:
+        return None
+
+    @staticmethod
+    def _client_timeout(
+        timeout: Union[float, Tuple[float, float]]
+    ) -> "aiohttp.ClientTimeout":
+        if timeout is None:
+            return aiohttp.ClientTimeout(total=None)
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+        return aiohttp.ClientTimeout(total=timeout)
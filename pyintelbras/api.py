@@ -1,16 +1,88 @@
+import contextvars
+import json
 import logging
-import requests
+import mmap
+import os
+import queue
 import re
-from typing import Union, Tuple, Dict, List
+import requests
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime
+from functools import lru_cache, partial
+from typing import Any, Union, Tuple, Dict, List, Callable, BinaryIO, Iterable, Iterator, Optional
 from requests.auth import HTTPDigestAuth
 from requests import Response
-from urllib.parse import urlencode, urlparse, parse_qsl, ParseResult
+from urllib3.util.retry import Retry
+from urllib.parse import urlencode, urlparse, parse_qsl, quote_plus, ParseResult
+from .cache import ResponseCache
 from .exceptions import IntelbrasAPIException
-from .helpers import parse_response
+from .limits import RateLimiter
+from .metrics import RequestEvent, ParseEvent, TimedHTTPAdapter, endpoint_label, _take_connect_time
+from .retry import RetryPolicy, CircuitBreaker, budget_timeout, remaining, deadline as deadline_scope
+from .helpers import parse_response, parse_configs, diff_config, flatten_response, format_value
+from .media import MediaFileTable, to_epoch, _format_epoch
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+# (connect, read) timeout of requests made without one
+DEFAULT_TIMEOUT = (10, 30)
+# Failures worth a retry, counted by the circuit breaker
+_TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout)
+# Smallest byte range fetched by a segmented download
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+# Bytes downloaded between two saves of the segment journal
+CHECKPOINT_SIZE = 16 * 1024 * 1024
+# Retries of the segments when the client has no RetryPolicy
+_SEGMENT_RETRY = RetryPolicy()
+# VideoStream of the recordings of each download_clip subtype
+_SUBTYPE_STREAMS = {0: 'Main', 1: 'Extra1', 2: 'Extra2', 3: 'Extra3'}
+
+
+class DigestAuth(HTTPDigestAuth):
+    # HTTPDigestAuth keeps the server challenge per thread, so every new
+    # worker thread of a pool pays an extra 401 round-trip. Here the last
+    # challenge seeds new threads; a nonce the device rejects is still
+    # renegotiated by handle_401. The nonce count is shared by the threads,
+    # so no two requests send the same nc with one nonce, which strict
+    # devices reject as a replay.
+    def __init__(self, username: str, password: str) -> None:
+        super().__init__(username, password)
+        self._shared_chal = None
+        self._nonce = None
+        self._nonce_count = 0
+        self._nonce_lock = threading.Lock()
+
+    def init_per_thread_state(self) -> None:
+        super().init_per_thread_state()
+        chal = self._shared_chal
+        if chal and not self._thread_local.chal:
+            self._thread_local.chal = dict(chal)
+            self._thread_local.last_nonce = chal.get('nonce', '')
+            self._thread_local.nonce_count = 0
+
+    def build_digest_header(self, method: str, url: str) -> str:
+        nonce = self._thread_local.chal.get('nonce')
+        with self._nonce_lock:
+            if nonce == self._nonce:
+                self._nonce_count += 1
+            else:
+                self._nonce, self._nonce_count = nonce, 1
+            # HTTPDigestAuth counts one more for the nonce it last used
+            self._thread_local.last_nonce = nonce
+            self._thread_local.nonce_count = self._nonce_count - 1
+        return super().build_digest_header(method, url)
+
+    def handle_401(self, r: Response, **kwargs) -> Response:
+        response = super().handle_401(r, **kwargs)
+        if self._thread_local.chal:
+            self._shared_chal = self._thread_local.chal
+        return response
+
 
 class IntelbrasAPI:
     def __init__(
@@ -19,6 +91,16 @@ class IntelbrasAPI:
         password: str = '',
         auth: HTTPDigestAuth = None,
         verify_ssl: bool = False,
+        pool_connections: int = 1,
+        pool_maxsize: int = 10,
+        max_retries: Union[int, Retry] = 0,
+        keep_alive: bool = True,
+        cache: ResponseCache = None,
+        limiter: RateLimiter = None,
+        timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT,
+        retry: RetryPolicy = None,
+        breaker: CircuitBreaker = None,
+        hooks: Iterable[Callable[[Any], None]] = None,
     ) -> None:
         self.server = server if server.startswith(
             'http') else f'http://{server}'
@@ -28,33 +110,214 @@ class IntelbrasAPI:
         self.password = self.auth.password if auth else password
         self.verify_ssl = verify_ssl
         self.last_request_url = None
+        self.keep_alive = keep_alive
+        # Opt-in cache of idempotent reads, see ResponseCache
+        self.cache = cache
+        # Opt-in throttling of the requests to the device, see RateLimiter
+        self.limiter = limiter
+        # Timeout of requests made without one, None waits forever
+        self.timeout = timeout
+        # Opt-in retries of idempotent reads and fail fast on dead devices,
+        # see RetryPolicy and CircuitBreaker
+        self.retry = retry
+        self.breaker = breaker
+        # Called with a RequestEvent per request and a ParseEvent per
+        # parsed response, e.g. a Metrics instance
+        self.hooks = list(hooks or ())
+        # Whether the device answers getConfig&name=All, None until known
+        self._config_all = None
+        # Whether the device answers loadfile.cgi?action=startLoad, None
+        # until known
+        self._load_by_time = None
+        self.session = self._build_session(
+            pool_connections, pool_maxsize, max_retries)
 
         if user and password and not auth:
             self.login(user, password)
 
         logger.info(f"API Server Endpoint: {self.server}")
 
+    @property
+    def server(self) -> str:
+        return self._server
+
+    @server.setter
+    def server(self, server: str) -> None:
+        # The server URL never changes between calls, so it is parsed here
+        # once instead of on every request
+        self._server = server
+        self._server_parts = urlparse(server)
+        self._server_query = dict(parse_qsl(self._server_parts.query))
+        # host:port, the key of the per device state shared between clients
+        parts = self._server_parts
+        self._host = f"{parts.hostname}:{parts.port or (443 if parts.scheme == 'https' else 80)}"
+        self._url_prefixes = {}
+
+    def endpoint(self, chain: str) -> "IntelbrasAPIMethod":
+        # Bound method chain resolved once, e.g.
+        #   config_manager = api.endpoint('configManager')
+        #   config_manager(action='getConfig', name='ChannelTitle')
+        return IntelbrasAPIMethod(chain.split('.'), self)
+
     def login(self, user: str, password: str) -> None:
         if not user or not password:
             raise IntelbrasAPIException('Empty user or password')
         self.user = user
         self.password = password
-        self.auth = HTTPDigestAuth(user, password)
+        self.auth = DigestAuth(user, password)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "IntelbrasAPI":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
 
     @property
     def api_version(self) -> dict:
         response = self.IntervideoManager(action='getVersion', Name='CGI')
-        return parse_response(response.text)
+        return self._parse('IntervideoManager.getVersion', parse_response, response.text)
 
     @property
     def channels(self) -> list:
         response = self.configManager(action='getConfig', name='ChannelTitle')
-        parsed_response = parse_response(response.text)
+        parsed_response = self._parse('configManager.getConfig', parse_response, response.text)
         return parsed_response.get('table', {}).get('ChannelTitle', [])
 
+    def get_configs(
+        self, names: Iterable[str], use_all: bool = None,
+        max_workers: int = 4, timeout: Union[float, Tuple[float, float]] = None
+    ) -> Dict[str, Any]:
+        # Read several configManager names at once:
+        #   intelbras.get_configs(['ChannelTitle', 'Encode', 'RecordMode'])
+        #   # {'ChannelTitle': [...], 'Encode': [...], 'RecordMode': [...]}
+        # use_all (the default for three or more names) fetches them with a
+        # single getConfig&name=All. Devices rejecting All, and names missing
+        # from its answer, are read with concurrent single requests. Names
+        # unknown to the device map to None.
+        names = list(dict.fromkeys(names))
+        if use_all is None:
+            use_all = len(names) >= 3 and self._config_all is not False
+
+        configs = {}
+        if use_all:
+            response = self.configManager(
+                action='getConfig', name='All', timeout=timeout)
+            self._config_all = _config_ok(response.status_code, response.text)
+            if self._config_all:
+                configs = self._parse(
+                    'configManager.getConfig', parse_configs, response.text, names)
+            else:
+                logger.debug('getConfig&name=All not supported, reading names one by one')
+
+        missing = [name for name in names if configs.get(name) is None]
+        if len(missing) == 1:
+            configs[missing[0]] = self._get_config(missing[0], timeout)
+        elif missing:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+                # In copies of this context, to keep its deadline
+                futures = [executor.submit(contextvars.copy_context().run,
+                                           self._get_config, name, timeout)
+                           for name in missing]
+                configs.update(zip(missing, (f.result() for f in futures)))
+        return {name: configs.get(name) for name in names}
+
+    def _get_config(self, name: str, timeout: Union[float, Tuple[float, float]] = None) -> Any:
+        response = self.configManager(action='getConfig', name=name, timeout=timeout)
+        if not _config_ok(response.status_code, response.text):
+            logger.debug(f'Config {name} not available: {response.status_code}')
+            return None
+        return self._parse(
+            'configManager.getConfig', parse_configs, response.text, [name])[name]
+
+    def get_config_dump(
+        self, names: Iterable[str] = None,
+        timeout: Union[float, Tuple[float, float]] = None
+    ) -> bytes:
+        # Raw getConfig body with the given names, left to the caller to
+        # parse (e.g. in another process). None dumps everything
+        # getConfig&name=All returns. As in get_configs, three or more names
+        # use All when the device supports it, otherwise the bodies of the
+        # single names are joined; names unknown to the device are left out.
+        names = None if names is None else list(dict.fromkeys(names))
+        if names is None or (len(names) >= 3 and self._config_all is not False):
+            response = self.configManager(
+                action='getConfig', name='All', timeout=timeout)
+            self._config_all = response.status_code == 200 and not _error_body(response)
+            if self._config_all:
+                return response.content
+            if names is None:
+                raise IntelbrasAPIException(
+                    'getConfig&name=All not supported, pass the config names',
+                    error=response)
+        bodies = []
+        for name in names:
+            response = self.configManager(
+                action='getConfig', name=name, timeout=timeout)
+            if response.status_code == 200 and not _error_body(response):
+                bodies.append(response.content.rstrip(b'\r\n') + b'\r\n')
+            else:
+                logger.debug(f'Config {name} not available: {response.status_code}')
+        return b''.join(bodies)
+
+    def set_config(
+        self, changes: dict, max_url_length: int = 2048,
+        timeout: Union[float, Tuple[float, float]] = None
+    ) -> int:
+        # setConfig with the given keys, nested or in the CGI form
+        # ({'ChannelTitle[0].Name': 'Lab01'}), packed into as few requests as
+        # max_url_length allows. Returns the number of requests sent.
+        batches = self._config_batches(
+            {key: format_value(value) for key, value in flatten_response(changes).items()},
+            max_url_length)
+        for batch in batches:
+            response = self.configManager(
+                action='setConfig', timeout=timeout, **batch)
+            if not _config_ok(response.status_code, response.text):
+                raise IntelbrasAPIException(
+                    f'setConfig failed: {response.status_code} - {response.text.strip()}',
+                    error=response)
+        return len(batches)
+
+    def sync_config(
+        self, desired: dict, dry_run: bool = False, max_url_length: int = 2048,
+        timeout: Union[float, Tuple[float, float]] = None
+    ) -> dict:
+        # Bring the device to the desired config writing only what differs:
+        #   intelbras.sync_config({'ChannelTitle': [{'Name': 'Lab01'}],
+        #                          'Network.Hostname': 'NVR'})
+        # The current values of the config names in desired are read with
+        # get_configs, and the changed keys are sent with set_config. List
+        # items to leave untouched may be None. Returns the changed keys.
+        desired = flatten_response(desired)
+        names = {_CONFIG_NAME.match(key).group(0) for key in desired}
+        current = self.get_configs(sorted(names), timeout=timeout)
+        changes = diff_config(current, desired)
+        if changes and not dry_run:
+            logger.debug(f'Writing {len(changes)} of {len(desired)} config keys')
+            self.set_config(changes, max_url_length=max_url_length, timeout=timeout)
+        return changes
+
+    def _config_batches(self, params: dict, max_url_length: int) -> List[dict]:
+        # Split params so that each setConfig URL fits in max_url_length
+        base = len(self._api_url('configManager', {'action': 'setConfig'}))
+        batches, batch, length = [], {}, base
+        for key, value in params.items():
+            size = len(quote_plus(key)) + len(quote_plus(value)) + 2
+            if batch and length + size > max_url_length:
+                batches.append(batch)
+                batch, length = {}, base
+            batch[key] = value
+            length += size
+        if batch:
+            batches.append(batch)
+        return batches
+
     def rtsp_url(self, protocol: str = 'rtsp', port: int = 554, channel: int = 1, subtype: int = 0) -> str:
-        url_parts = urlparse(self.server)
-        query = dict(parse_qsl(url_parts.query))
+        url_parts = self._server_parts
+        query = dict(self._server_query)
         query.update({'channel': channel, 'subtype': subtype})
         path = f'{url_parts.path}/cam/realmonitor'
         netloc = f'{url_parts.hostname}:{port}'
@@ -66,67 +329,741 @@ class IntelbrasAPI:
             query=urlencode(query), fragment=url_parts.fragment
         ).geturl()
 
-    def find_media_files(self, params: dict) -> dict:
+    def find_media_files(
+        self, params: dict, batch_size: int = 100, deadline: float = None
+    ) -> dict:
         # Helper method to docs section 4.10.5 Find Media Files
-        def execute_action(action: str, **kwargs) -> dict:
-            response = self.mediaFileFind(action=action, **kwargs)
-            return parse_response(response.text)
+        # deadline bounds the whole flow, in seconds
+        with deadline_scope(deadline):
+            items = list(self.iter_media_files(params, batch_size=batch_size))
+        logger.debug(f"Found {len(items)} media files.")
+        return {'found': len(items), 'items': items}
+
+    def iter_media_files(
+        self, params: dict, batch_size: int = 100
+    ) -> Iterator[dict]:
+        # Lazy version of find_media_files. findNextFile is called in batches
+        # of batch_size until the finder is exhausted, yielding each item as
+        # soon as its batch arrives. The finder is always closed and
+        # destroyed, even if the consumer stops iterating early.
+        with closing(self._media_file_batches(params, batch_size)) as batches:
+            for text in batches:
+                find_next_response = self._parse(
+                    'mediaFileFind.findNextFile', parse_response, text)
+                items = find_next_response.get('items') or []
+                found = find_next_response.get('found') or 0
+                logger.debug(f"Found {found} media files in batch.")
+                yield from items
+                if not items or found < batch_size:
+                    break
+
+    def find_media_table(
+        self, params: dict, batch_size: int = 100, deadline: float = None
+    ) -> MediaFileTable:
+        # find_media_files into a compact MediaFileTable, the findNextFile
+        # responses are read straight into its columns
+        table = MediaFileTable()
+        with deadline_scope(deadline), \
+                closing(self._media_file_batches(params, batch_size)) as batches:
+            for text in batches:
+                found = self._parse(
+                    'mediaFileFind.findNextFile', table.extend_response, text)
+                logger.debug(f"Found {found} media files in batch.")
+                if found < batch_size:
+                    break
+        return table
+
+    def _media_file_batches(self, params: dict, batch_size: int) -> Iterator[str]:
+        # Bodies of findNextFile, until the consumer stops
 
         # Step 1 - Create a media files finder.
-        create_response = execute_action('factory.create')
+        create_response = self._media_file_find('factory.create')
         object_number = create_response.get('result')
 
         if not object_number:
             raise IntelbrasAPIException("Failed to create media file finder")
 
-        # Step 2 - Start to find media files satisfied the conditions with the finder.
-        params.update({'action': 'findFile', 'object': object_number})
-        execute_action(**params)
+        try:
+            # Step 2 - Start to find media files satisfied the conditions with the finder.
+            self._media_file_find(
+                **{**params, 'action': 'findFile', 'object': object_number})
+
+            # Step 3 - Get the media file information found by the finder.
+            while True:
+                yield self.mediaFileFind(
+                    action='findNextFile', object=object_number,
+                    count=batch_size).text
+        finally:
+            # The finder is released even past the deadline
+            with deadline_scope(None):
+                # Step 4 - Close the finder.
+                self._media_file_find('close', object=object_number)
+
+                # Step 5 - Destroy the finder.
+                self._media_file_find('destroy', object=object_number)
+
+    def _media_file_find(self, action: str, **kwargs) -> dict:
+        response = self.mediaFileFind(action=action, **kwargs)
+        return self._parse(f'mediaFileFind.{action}', parse_response, response.text)
+
+    def download_media_file(
+        self, path: str, dest: Union[str, os.PathLike, BinaryIO],
+        chunk_size: int = 64 * 1024, resume: bool = True,
+        progress: Callable[[int, int, float], None] = None,
+        timeout: Union[float, Tuple[float, float]] = None,
+        offset: int = None, segments: int = 1, memory_map: bool = False,
+        segment_retries: int = 3
+    ) -> int:
+        # Helper method to docs section 4.10.13 Download Media File with the File Name
+        # The body is streamed in chunks of chunk_size straight to dest, which
+        # may be a file path or a writable binary buffer. When dest is a path
+        # that already exists and resume is set, only the missing bytes are
+        # requested with an HTTP Range header. progress, if given, is called
+        # after each chunk with (bytes_done, total_bytes, bytes_per_second);
+        # total_bytes is None when the device does not send Content-Length.
+        # offset is the number of bytes dest already holds, e.g. a buffer
+        # opened in append mode; it defaults to the size of an existing path.
+        # segments > 1 splits the missing bytes of a path dest in up to that
+        # many ranges (of at least MIN_SEGMENT_SIZE) downloaded at once over
+        # pooled connections into <dest>.part, renamed to dest once complete,
+        # see _download_segments.
+        is_path = isinstance(dest, (str, os.PathLike))
+        if offset is None:
+            offset = 0
+            if is_path and resume and os.path.exists(dest):
+                offset = os.path.getsize(dest)
+
+        if segments > 1 and is_path:
+            done = self._download_segments(
+                path, dest, offset, segments, chunk_size, progress, timeout,
+                memory_map, segment_retries)
+            if done is not None:
+                return done
+
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        response = self.RPC_Loadfile(
+            extra_path=path, headers=headers, timeout=timeout, stream=True)
+
+        try:
+            if offset and response.status_code == 416:
+                logger.debug(f'Media file {path} already downloaded')
+                return offset
+            if response.status_code not in (200, 206):
+                raise IntelbrasAPIException(
+                    f'Failed to download media file {path}: '
+                    f'{response.status_code} - {response.reason}',
+                    error=response)
+            if response.status_code == 200 and offset:
+                # Range ignored by the device, start over
+                offset = 0
+                if not is_path:
+                    dest.seek(0)
+                    dest.truncate()
+
+            length = response.headers.get('Content-Length')
+            total = offset + int(length) if length else None
+            done = offset
+            start = time.monotonic()
+
+            f = open(dest, 'ab' if offset else 'wb') if is_path else dest
+            try:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    done += len(chunk)
+                    if progress:
+                        elapsed = time.monotonic() - start
+                        rate = (done - offset) / elapsed if elapsed else 0.0
+                        progress(done, total, rate)
+            finally:
+                if is_path:
+                    f.close()
+        finally:
+            response.close()
+
+        logger.debug(f'Downloaded {done} bytes of media file {path}')
+        return done
+
+    def _download_segments(
+        self, path: str, dest: Union[str, os.PathLike], offset: int,
+        segments: int, chunk_size: int,
+        progress: Callable[[int, int, float], None],
+        timeout: Union[float, Tuple[float, float]], memory_map: bool,
+        retries: int
+    ) -> Optional[int]:
+        # Bytes offset to the end of the file in concurrent Range requests,
+        # each written at its own position of <dest>.part, preallocated to
+        # the file size (and memory mapped with memory_map). A segment cut by
+        # a dropped connection is retried from its last byte, up to retries
+        # times. The bytes written to disk by each segment are recorded in
+        # the <dest>.part.json journal, every CHECKPOINT_SIZE bytes and on
+        # failure, so a later call (even after a crash) resumes the segments
+        # where they were. dest only appears, renamed from the .part file,
+        # once every segment is complete. None when the device ignores Range
+        # or the file is too small to split.
+        response = self.RPC_Loadfile(
+            extra_path=path, headers={'Range': 'bytes=0-0'}, timeout=timeout,
+            stream=True)
+        try:
+            # 416 for an empty file
+            if response.status_code not in (200, 206, 416):
+                raise IntelbrasAPIException(
+                    f'Failed to download media file {path}: '
+                    f'{response.status_code} - {response.reason}',
+                    error=response)
+            size = _range_size(response.headers.get('Content-Range'))
+        finally:
+            response.close()
+        if response.status_code != 206 or size is None:
+            logger.debug(f'Range not supported for {path}, downloading in one request')
+            return None
+
+        part = f'{os.fspath(dest)}.part'
+        journal = f'{part}.json'
+        bounds = positions = None
+        if os.path.exists(part) and os.path.exists(journal):
+            try:
+                with open(journal) as f:
+                    state = json.load(f)
+                if state['size'] == size:
+                    bounds, positions = state['bounds'], state['positions']
+            except (OSError, ValueError, KeyError):
+                logger.debug(f'Ignoring the unreadable journal {journal}')
+        if bounds is None:
+            if offset > size:
+                offset = 0
+            segments = min(segments, (size - offset) // MIN_SEGMENT_SIZE)
+            if segments < 2:
+                return None
+            bounds = [offset + (size - offset) * i // segments for i in range(segments + 1)]
+            # Next byte to write of each segment
+            positions = bounds[:-1]
+            if offset:
+                # The bytes dest holds are the start of the file
+                os.replace(dest, part)
+            elif os.path.exists(part):
+                os.remove(part)
+        lock = threading.Lock()
+        failed = threading.Event()
+        done = size - sum(bounds[i + 1] - position for i, position in enumerate(positions))
+        offset = done
+        unsaved = 0
+        start = time.monotonic()
+
+        with open(part, 'r+b' if os.path.exists(part) else 'w+b') as f:
+            if os.path.getsize(part) != size:
+                f.truncate(size)
+                if hasattr(os, 'posix_fallocate'):
+                    try:
+                        os.posix_fallocate(f.fileno(), offset, size - offset)
+                    except OSError:
+                        # Not supported by the filesystem, the file stays sparse
+                        pass
+            view = mmap.mmap(f.fileno(), size) if memory_map else None
+
+            def save() -> None:
+                # The data reaches the disk before the journal claims it
+                nonlocal unsaved
+                if view is not None:
+                    view.flush()
+                os.fsync(f.fileno())
+                with open(f'{journal}.tmp', 'w') as state:
+                    json.dump({'size': size, 'bounds': bounds, 'positions': positions}, state)
+                os.replace(f'{journal}.tmp', journal)
+                unsaved = 0
+
+            def written(segment: int, length: int) -> None:
+                nonlocal done, unsaved
+                with lock:
+                    positions[segment] += length
+                    done += length
+                    unsaved += length
+                    if unsaved >= CHECKPOINT_SIZE:
+                        save()
+                    if progress:
+                        elapsed = time.monotonic() - start
+                        progress(done, size, (done - offset) / elapsed if elapsed else 0.0)
+
+            try:
+                save()
+                with ThreadPoolExecutor(max_workers=len(positions)) as executor:
+                    # In copies of this context, to keep its deadline
+                    futures = [executor.submit(
+                        contextvars.copy_context().run, self._download_segment,
+                        path, part, view, i, positions[i], bounds[i + 1] - 1,
+                        chunk_size, timeout, retries, written, failed)
+                        for i in range(len(positions)) if positions[i] < bounds[i + 1]]
+                errors = [future.exception() for future in futures
+                          if future.exception() is not None]
+                if errors:
+                    raise errors[0]
+                if done != size:
+                    raise IntelbrasAPIException(
+                        f'Downloaded {done} of {size} bytes of media file {path}')
+                if view is not None:
+                    view.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                try:
+                    with lock:
+                        save()
+                except OSError as e:
+                    logger.debug(f'Failed to save the journal {journal}: {e!r}')
+                raise
+            finally:
+                if view is not None:
+                    view.close()
+
+        os.replace(part, dest)
+        if os.path.exists(journal):
+            os.remove(journal)
+        logger.debug(f'Downloaded {done} bytes of media file {path} in {len(positions)} segments')
+        return done
+
+    def _download_segment(
+        self, path: str, dest: Union[str, os.PathLike], view: Optional[mmap.mmap],
+        segment: int, first: int, last: int, chunk_size: int,
+        timeout: Union[float, Tuple[float, float]], retries: int,
+        written: Callable[[int, int], None], failed: threading.Event
+    ) -> None:
+        position = first
+        f = open(dest, 'r+b') if view is None else None
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    response = self.RPC_Loadfile(
+                        extra_path=path, headers={'Range': f'bytes={position}-{last}'},
+                        timeout=timeout, stream=True)
+                    try:
+                        content_range = response.headers.get('Content-Range', '')
+                        if (response.status_code != 206
+                                or not content_range.startswith(f'bytes {position}-')):
+                            raise IntelbrasAPIException(
+                                f'Failed to download bytes {position}-{last} of '
+                                f'media file {path}: {response.status_code} - '
+                                f'{response.reason}', error=response)
+                        if f is not None:
+                            f.seek(position)
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            if failed.is_set():
+                                return
+                            chunk = chunk[:last + 1 - position]
+                            if f is not None:
+                                # Every byte reported to written is in the file
+                                f.write(chunk)
+                                f.flush()
+                            else:
+                                view[position:position + len(chunk)] = chunk
+                            position += len(chunk)
+                            written(segment, len(chunk))
+                            if position > last:
+                                return
+                    finally:
+                        response.close()
+                    reason = 'connection closed early'
+                except (*_TRANSIENT_ERRORS, requests.exceptions.ChunkedEncodingError) as e:
+                    reason = e
+                if failed.is_set() or attempt == retries or not self._backoff(
+                        attempt, f'{path} bytes={position}-{last}', reason,
+                        self.retry or _SEGMENT_RETRY):
+                    break
+            raise IntelbrasAPIException(
+                f'Failed to download bytes {position}-{last} of media file '
+                f'{path}: {reason}')
+        except BaseException:
+            failed.set()
+            raise
+        finally:
+            if f is not None:
+                f.close()
+
+    def download_clip(
+        self, channel: int, start: Union[datetime, str], end: Union[datetime, str],
+        sink: Union[str, os.PathLike, BinaryIO, Callable[[bytes], Any]],
+        subtype: int = 0, by_time: bool = None, prefetch: int = 1,
+        buffer_size: int = 8 * 1024 * 1024, chunk_size: int = 64 * 1024,
+        progress: Callable[[int, int, float], None] = None,
+        timeout: Union[float, Tuple[float, float]] = None
+    ) -> int:
+        # Recording of channel (from 1) from start to end as one stream,
+        # written to sink: a file path, a writable binary file or a callable
+        # taking each chunk. Devices supporting loadfile.cgi?action=startLoad
+        # (docs section 4.10.14 Download Media File between Times) send only
+        # the requested window. Otherwise the .dav files intersecting it are
+        # found with mediaFileFind and sent whole, in time order. by_time
+        # forces either way. The next prefetch files are downloaded, up to
+        # buffer_size bytes each, while the current one is written. progress
+        # is called as in download_media_file. Returns the number of bytes
+        # written.
+        is_path = isinstance(sink, (str, os.PathLike))
+        f = open(sink, 'wb') if is_path else None
+        write = f.write if f else getattr(sink, 'write', sink)
+        try:
+            opened = None
+            if by_time or (by_time is None and self._load_by_time is not False):
+                opened = self._load_by_time_response(channel, start, end, subtype, timeout)
+                if opened is None and (by_time or self._load_by_time):
+                    raise IntelbrasAPIException(
+                        f'Failed to load channel {channel} from {start} to {end}')
+            if opened is not None:
+                length = opened.headers.get('Content-Length')
+                total = int(length) if length else None
+                segments = [lambda: opened]
+            else:
+                files = self._clip_files(channel, start, end, subtype)
+                logger.debug(f'Downloading clip of channel {channel} from {len(files)} files')
+                total = sum(length for _, length in files)
+                if any(length < 0 for _, length in files):
+                    total = None
+                segments = [partial(self.RPC_Loadfile, extra_path=path,
+                                    timeout=timeout, stream=True)
+                            for path, _ in files]
+            return self._stream_segments(
+                segments, write, prefetch, max(1, buffer_size // chunk_size),
+                chunk_size, partial(_with_total, progress, total) if progress else None)
+        finally:
+            if f:
+                f.close()
+
+    def _load_by_time_response(
+        self, channel: int, start: Union[datetime, str], end: Union[datetime, str],
+        subtype: int, timeout: Union[float, Tuple[float, float]]
+    ) -> Optional[Response]:
+        # Open response of loadfile.cgi, None when not supported
+        response = self.loadfile(
+            action='startLoad', channel=channel,
+            startTime=_format_epoch(to_epoch(start)),
+            endTime=_format_epoch(to_epoch(end)), subtype=subtype,
+            timeout=timeout, stream=True)
+        content_type = response.headers.get('Content-Type', '')
+        if response.status_code == 200 and not content_type.startswith('text/'):
+            self._load_by_time = True
+            return response
+        response.close()
+        logger.debug(f'loadfile.cgi not supported: {response.status_code}')
+        if self._load_by_time is None:
+            self._load_by_time = False
+        return None
 
-        # Step 3 - Get the media file information found by the finder.
-        find_next_response = execute_action(
-            'findNextFile', object=object_number, count=100)
-        found = find_next_response.get('found')
-        logger.debug(f"Found {found} media files.")
+    def _clip_files(
+        self, channel: int, start: Union[datetime, str], end: Union[datetime, str],
+        subtype: int
+    ) -> List[Tuple[str, int]]:
+        # (path, length) of the recordings intersecting start to end, in
+        # time order; -1 for unknown lengths
+        low, high = to_epoch(start), to_epoch(end)
+        table = self.find_media_table({
+            'condition.Channel': channel,
+            'condition.StartTime': _format_epoch(low),
+            'condition.EndTime': _format_epoch(high),
+            'condition.Types[0]': 'dav',
+            'condition.VideoStream': _SUBTYPE_STREAMS.get(subtype, 'Main'),
+        })
+        rows = sorted(table.indexes(low, high), key=lambda i: table.start[i])
+        return [(table.path[i], table.length[i]) for i in rows if table.path[i]]
 
-        # Step 4 - Close the finder.
-        execute_action('close', object=object_number)
+    def _stream_segments(
+        self, segments: List[Callable[[], Response]],
+        write: Callable[[bytes], Any], prefetch: int, buffered: int,
+        chunk_size: int, progress: Optional[Callable[[int, float], None]]
+    ) -> int:
+        # Bodies of the responses opened by segments, written in order while
+        # the next prefetch are read into queues of buffered chunks
+        cancelled = threading.Event()
+        pending = deque(segments)
+        active = deque()
+        done = 0
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=prefetch + 1) as executor:
 
-        # Step 5 - Destroy the finder.
-        execute_action('destroy', object=object_number)
+            def submit() -> None:
+                chunks = queue.Queue(maxsize=buffered)
+                # In a copy of this context, to keep its deadline
+                executor.submit(contextvars.copy_context().run, self._read_segment,
+                                pending.popleft(), chunks, chunk_size, cancelled)
+                active.append(chunks)
 
-        return find_next_response
+            try:
+                while pending and len(active) <= prefetch:
+                    submit()
+                while active:
+                    chunks = active.popleft()
+                    if pending:
+                        submit()
+                    while True:
+                        chunk = chunks.get()
+                        if chunk is None:
+                            break
+                        if isinstance(chunk, BaseException):
+                            raise chunk
+                        write(chunk)
+                        done += len(chunk)
+                        if progress:
+                            elapsed = time.monotonic() - start
+                            progress(done, done / elapsed if elapsed else 0.0)
+            finally:
+                cancelled.set()
+        return done
+
+    def _read_segment(
+        self, open_response: Callable[[], Response], chunks: queue.Queue,
+        chunk_size: int, cancelled: threading.Event
+    ) -> None:
+
+        def put(item: Any) -> bool:
+            while not cancelled.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        try:
+            response = open_response()
+            try:
+                if response.status_code != 200:
+                    raise IntelbrasAPIException(
+                        f'Failed to download media file {response.url}: '
+                        f'{response.status_code} - {response.reason}',
+                        error=response)
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if not put(chunk):
+                        return
+            finally:
+                response.close()
+            put(None)
+        except BaseException as e:
+            put(e)
 
     def do_request(
         self, method: str, path: str, params: dict,
         timeout: Union[float, Tuple[float, float]] = None,
-        extra_path: str = '', headers: dict = {}, body: dict = None
+        extra_path: str = '', headers: dict = {}, body: dict = None,
+        stream: bool = False
     ) -> Response:
-        url = self._parse_api_url(
-            path=path, params=params, extra_path=extra_path).geturl()
-        logger.debug(f'Requesting {method} to URL {url}')
+        url = self._api_url(path=path, params=params, extra_path=extra_path)
         self.last_request_url = url
 
+        cache_key = None
+        if self.cache is not None and not stream:
+            action = str(params.get('action', ''))
+            if self.cache.cacheable(method, action):
+                cache_key = self.cache.key(self._host, self.user, path, extra_path, params)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.debug(f'Cache hit for URL {url}')
+                    if self.hooks:
+                        self._emit(RequestEvent(
+                            self._host, endpoint_label(path, params), method,
+                            cached.status_code, 0.0, cached=True))
+                    return cached
+            elif self.cache.invalidates(action):
+                self.cache.invalidate(path, host=self._host)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'Requesting {method} to URL {url}')
+
         extra_headers = {
             "User-Agent": "python/pyintelbras",
             "Cache-Control": "no-cache",
         }
+        if not self.keep_alive:
+            extra_headers["Connection"] = "close"
         extra_headers.update(headers)
 
-        response = requests.request(
-            method=method, url=url, timeout=timeout,
-            auth=self.auth, verify=self.verify_ssl,
-            headers=extra_headers, json=body
-        )
+        timeout = self.timeout if timeout is None else timeout
+        retries = 0
+        if self.retry is not None and self.retry.retryable(
+                method, str(params.get('action', ''))):
+            retries = self.retry.attempts - 1
 
-        logger.debug(
-            f'Request status_code {response.status_code} - {response.reason}')
+        # Phase timings of the last attempt, only measured for hooks
+        timings = None
+        if self.hooks:
+            timings = {}
+            started = time.perf_counter()
+            _take_connect_time()
+
+        retry = 0
+        try:
+            for retry in range(retries + 1):
+                try:
+                    response = self._send_request(
+                        method, url, budget_timeout(timeout, url), extra_headers,
+                        body, stream, timings)
+                except _TRANSIENT_ERRORS as e:
+                    if retry == retries or not self._backoff(retry, url, e):
+                        raise
+                    continue
+                if (retry == retries or response.status_code not in self.retry.statuses
+                        or not self._backoff(retry, url, response.status_code)):
+                    break
+                response.close()
+        except Exception as e:
+            if timings is not None:
+                self._emit(self._request_event(
+                    method, path, params, started, timings, retry, error=e))
+            raise
+
+        if timings is not None:
+            self._emit(self._request_event(
+                method, path, params, started, timings, retry,
+                response=response, stream=stream))
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f'Request status_code {response.status_code} - {response.reason}')
+
+        if cache_key is not None and response.status_code == 200 and not _error_body(response):
+            self.cache.set(cache_key, response, self.cache.ttl_for(
+                path, params.get('action', '')))
         return response
 
+    def _send_request(
+        self, method: str, url: str, timeout: Union[float, Tuple[float, float]],
+        headers: dict, body: dict, stream: bool, timings: dict = None
+    ) -> Response:
+        if self.breaker is not None:
+            self.breaker.before(self._host)
+        permit = None
+        if self.limiter is not None:
+            permit = self.limiter.acquire(self._host, timeout=remaining())
+        # The same HTTPDigestAuth object is reused on every call, so after
+        # the first challenge its nonce/nc is sent preemptively and only
+        # renegotiated when the device answers 401 again.
+        try:
+            if timings is None:
+                response = self.session.request(
+                    method=method, url=url, timeout=timeout,
+                    auth=self.auth, verify=self.verify_ssl,
+                    headers=headers, json=body, stream=stream
+                )
+            else:
+                # Streamed to time the headers apart from the body
+                start = time.perf_counter()
+                response = self.session.request(
+                    method=method, url=url, timeout=timeout,
+                    auth=self.auth, verify=self.verify_ssl,
+                    headers=headers, json=body, stream=True
+                )
+                timings['headers'] = time.perf_counter() - start
+                if not stream:
+                    response.content
+                timings['transfer'] = time.perf_counter() - start - timings['headers']
+        except requests.RequestException as e:
+            if permit is not None:
+                permit.release(error=True)
+            if self.breaker is not None:
+                self.breaker.record(
+                    self._host, failed=isinstance(e, _TRANSIENT_ERRORS))
+            raise
+        if permit is not None:
+            # Streamed bodies are read after the release
+            permit.release(response.status_code,
+                           retry_after=_retry_after(response.headers))
+        if self.breaker is not None:
+            self.breaker.record(
+                self._host, failed=self.breaker.failed(response.status_code))
+        return response
+
+    def _request_event(
+        self, method: str, path: str, params: dict, started: float,
+        timings: dict, retries: int, response: Response = None,
+        stream: bool = False, error: Exception = None
+    ) -> RequestEvent:
+        connect = _take_connect_time()
+        if response is None:
+            return RequestEvent(
+                self._host, endpoint_label(path, params), method, None,
+                time.perf_counter() - started, connect=connect,
+                retries=retries, error=error)
+
+        challenges = [r for r in response.history if r.status_code == 401]
+        auth = sum(r.elapsed.total_seconds() for r in challenges)
+        # A challenged request opened its connection in the challenge
+        ttfb = timings['headers'] - (auth if challenges else connect)
+        if stream:
+            length = response.headers.get('Content-Length')
+            size = int(length) if length and length.isdigit() else None
+        else:
+            size = len(response.content)
+        return RequestEvent(
+            self._host, endpoint_label(path, params), method,
+            response.status_code, time.perf_counter() - started,
+            connect=connect, auth=auth, ttfb=max(0.0, ttfb),
+            transfer=timings['transfer'], bytes_received=size,
+            retries=retries, challenges=len(challenges))
+
+    def _emit(self, event: Any) -> None:
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception:
+                logger.exception(f'Hook {hook!r} failed')
+
+    def _parse(self, endpoint: str, parse: Callable[..., Any], text: str, *args) -> Any:
+        # parse(text, *args), timed for the hooks
+        if not self.hooks:
+            return parse(text, *args)
+        start = time.perf_counter()
+        try:
+            return parse(text, *args)
+        finally:
+            self.record_parse(endpoint, time.perf_counter() - start, len(text))
+
+    def record_parse(self, endpoint: str, elapsed: float, size: int) -> None:
+        # ParseEvent for the hooks of a response parsed elsewhere (e.g. a
+        # get_config_dump parsed in a worker process)
+        self._emit(ParseEvent(self._host, endpoint, elapsed, size))
+
+    def _backoff(
+        self, retry: int, url: str, reason: Any, policy: RetryPolicy = None
+    ) -> bool:
+        # Wait before retrying, False when the deadline comes first
+        delay = (policy or self.retry).delay(retry)
+        left = remaining()
+        if left is not None and delay >= left:
+            return False
+        logger.debug(f'Retrying {url} in {delay:.2f}s: {reason!r}')
+        time.sleep(delay)
+        return True
+
+    def _build_session(
+        self, pool_connections: int, pool_maxsize: int,
+        max_retries: Union[int, Retry]
+    ) -> requests.Session:
+        session = requests.Session()
+        adapter = TimedHTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+            max_retries=max_retries, pool_block=False)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
     def _parse_api_url(self, path: str, params: dict, extra_path: str = '') -> ParseResult:
-        url_parts = urlparse(self.server)
-        query = dict(parse_qsl(url_parts.query))
-        query.update(params)
+        return urlparse(self._api_url(path, params, extra_path))
+
+    def _api_url(self, path: str, params: dict, extra_path: str = '') -> str:
+        try:
+            prefix, fragment = self._url_prefixes[path, extra_path]
+        except KeyError:
+            prefix, fragment = self._url_prefix(path, extra_path)
+
+        if self._server_query:
+            query = dict(self._server_query)
+            query.update(params)
+        else:
+            query = params
+        query = urlencode(query)
+
+        if query:
+            return f"{prefix}?{query}{fragment}"
+        return f"{prefix}{fragment}"
+
+    def _url_prefix(self, path: str, extra_path: str) -> Tuple[str, str]:
+        # Everything in the URL but the query string, memoized per chain
+        url_parts = self._server_parts
+        key = (path, extra_path)
 
         if extra_path and not extra_path.startswith('/'):
             extra_path = f"/{extra_path}"
@@ -139,11 +1076,17 @@ class IntelbrasAPI:
             f".cgi"                      # requirement of Intelbras API
         )
 
-        return ParseResult(
+        prefix = ParseResult(
             scheme=url_parts.scheme, netloc=url_parts.netloc,
             path=url_path, params=url_parts.params,
-            query=urlencode(query), fragment=url_parts.fragment
-        )
+            query='', fragment=''
+        ).geturl()
+        fragment = f"#{url_parts.fragment}" if url_parts.fragment else ''
+
+        # Media file paths are unique, keep the memo bounded
+        if len(self._url_prefixes) < 1024:
+            self._url_prefixes[key] = (prefix, fragment)
+        return prefix, fragment
 
     def _method(self, attr: str) -> "IntelbrasAPIMethod":
         return IntelbrasAPIMethod([attr], self)
@@ -152,33 +1095,83 @@ class IntelbrasAPI:
         return self._method(attr)
 
 
+# Config name of a CGI key, e.g. Encode in Encode[0].MainFormat[0].Video.FPS
+_CONFIG_NAME = re.compile(r'[^.\[]+')
+
+
+def _retry_after(headers) -> float:
+    # Retry-After in seconds; HTTP dates are not sent by the devices
+    try:
+        return float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _with_total(
+    progress: Callable[[int, int, float], None], total: Optional[int],
+    done: int, rate: float
+) -> None:
+    progress(done, total, rate)
+
+
+def _range_size(content_range: str) -> int:
+    # Full size from a Content-Range such as bytes 0-0/1048576
+    try:
+        return int(content_range.rsplit('/', 1)[1])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def _config_ok(status_code: int, text: str) -> bool:
+    # Unknown names and unsupported requests answer Error, sometimes with 200
+    return status_code == 200 and not text.lstrip().startswith('Error')
+
+
+def _error_body(response: Response) -> bool:
+    # _config_ok without decoding the whole body
+    return response.content[:64].lstrip().startswith(b'Error')
+
+
+@lru_cache(maxsize=1024)
+def _resolve_chain(methods: Tuple[str, ...]) -> Tuple[str, str]:
+    # Resolve a method chain into (HTTP method, CGI path). A trailing
+    # .get/.post selects the HTTP method, anything else is a GET.
+    method = methods[-1].upper()
+    if method not in {'GET', 'POST'} or len(methods) == 1:
+        return 'GET', '.'.join(methods)
+    return method, '.'.join(methods[:-1])
+
+
 class IntelbrasAPIMethod:
+    __slots__ = ('methods', 'parent', '_resolved')
+
     def __init__(self, methods: List[str] = None, parent: IntelbrasAPI = None):
-        self.methods = methods or []
+        self.methods = tuple(methods or ())
         self.parent = parent
+        self._resolved = None
 
     def __getattr__(self, name: str) -> "IntelbrasAPIMethod":
-        return IntelbrasAPIMethod(self.methods + [name], self.parent)
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return IntelbrasAPIMethod(self.methods + (name,), self.parent)
 
     def __call__(
         self, extra_path: str = '',
         headers: dict = {}, body: dict = None,
         timeout: Union[float, Tuple[float, float]] = None,
+        stream: bool = False,
         *args, **kwargs
     ) -> Response:
-        method_chain = ".".join(self.methods)
-        logger.debug(
-            f"Call method '{method_chain}' with arguments: {args} and {kwargs}")
-
-        method = method_chain.split('.')[-1].upper()
-        if method not in {'GET', 'POST'}:
-            method = 'GET'
-            path = method_chain
-        else:
-            path = re.sub(r'.(get|post)$', '',
-                          method_chain, flags=re.IGNORECASE)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"Call method '{'.'.join(self.methods)}' with arguments: {args} and {kwargs}")
+
+        if self._resolved is None:
+            self._resolved = _resolve_chain(self.methods)
+        method, path = self._resolved
 
         return self.parent.do_request(
             method=method, path=path, params=kwargs, timeout=timeout,
-            extra_path=extra_path.strip(), headers=headers, body=body
+            extra_path=extra_path.strip(), headers=headers, body=body,
+            stream=stream
         )
@@ -0,0 +1,198 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from .api import IntelbrasAPI
+from .exceptions import IntelbrasAPIException
+from .fleet import DeviceFleet
+from .helpers import parse_configs, parse_response
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class BackupResult(NamedTuple):
+    device: IntelbrasAPI
+    # Bytes received from the device and config names written
+    size: int = 0
+    names: int = 0
+    error: Optional[IntelbrasAPIException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _failed(error: BaseException) -> Future:
+    future = Future()
+    future.set_exception(error)
+    return future
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _parse_dump(raw: bytes, names: Optional[List[str]]) -> Tuple[bytes, int, float]:
+    # getConfig body to the JSON of its {name: config}, run in the worker
+    # processes: the raw bytes go in and the JSON text comes back, so no
+    # nested objects are pickled. Returns (json, names, parse seconds).
+    start = time.perf_counter()
+    text = raw.decode('utf-8', 'replace')
+    if names is None:
+        configs = parse_response(text).get('table', {})
+    else:
+        configs = parse_configs(text, names)
+    elapsed = time.perf_counter() - start
+    payload = json.dumps(configs, default=_json_default, separators=(',', ':'))
+    return payload.encode(), sum(c is not None for c in configs.values()), elapsed
+
+
+class ConfigBackup:
+    # Bulk backup of the configuration of many devices to a JSON Lines
+    # file, one line per device written as soon as it is ready:
+    #
+    #   backup = ConfigBackup(fleet, '/srv/backup/2024-08-28.jsonl')
+    #   for r in backup.run():
+    #       if not r.ok:
+    #           print(r.device.server, r.error)
+    #   # {"device": "http://10.0.0.1", "time": "...", "config": {"ChannelTitle": [...], ...}}
+    #
+    # The getConfig dumps are fetched by max_workers threads and parsed in
+    # a pool of worker processes (processes, os.cpu_count() by default), so
+    # parsing large dumps does not hold the GIL of the threads waiting on
+    # the network; processes=0 parses in the fetching threads. At most
+    # queued dumps per process wait to be parsed, fetching pauses beyond.
+    # names limits the backup to those config names, read with one
+    # getConfig&name=All, or name by name on devices without it; None
+    # backs up everything name=All returns.
+    def __init__(
+        self, devices: Union[IntelbrasAPI, DeviceFleet, Iterable[IntelbrasAPI]],
+        path: str, names: Iterable[str] = None, max_workers: int = 16,
+        processes: int = None, queued: int = 2,
+        timeout: Union[float, Tuple[float, float]] = (10, 60)
+    ) -> None:
+        if isinstance(devices, IntelbrasAPI):
+            devices = [devices]
+        self.devices = list(devices)
+        self.path = path
+        self.names = None if names is None else list(names)
+        self.max_workers = max_workers
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.queued = queued
+        self.timeout = timeout
+        self.stats = {'saved': 0, 'failed': 0, 'bytes': 0}
+
+    def run(self) -> Iterator[BackupResult]:
+        # Results are yielded as each device line is written
+        results = queue.Queue()
+        # Dumps fetched and not parsed yet
+        slots = threading.BoundedSemaphore(max(1, self.processes) * self.queued)
+        stopped = threading.Event()
+        parsers = None
+        if self.processes:
+            parsers = ProcessPoolExecutor(self.processes)
+            # Start the processes before the fetching threads exist
+            parsers.submit(int).result()
+        fetchers = ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_workers, len(self.devices))),
+            thread_name_prefix='pyintelbras-backup')
+        try:
+            tasks = [fetchers.submit(self._backup, index, device, parsers, slots,
+                                     results, stopped)
+                     for index, device in enumerate(self.devices)]
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            pending = dict(enumerate(self.devices))
+            with open(self.path, 'wb') as f:
+                while pending:
+                    try:
+                        index, size, future = results.get(timeout=1)
+                    except queue.Empty:
+                        # Every fetcher finished and devices are missing:
+                        # they were lost, not slow
+                        if all(t.done() for t in tasks) and results.empty():
+                            for index, device in pending.items():
+                                results.put((index, 0, _failed(IntelbrasAPIException(
+                                    f'{device.server}: backup lost'))))
+                        continue
+                    device = pending.pop(index, None)
+                    if device is None:
+                        continue
+                    result = self._write(f, device, size, future)
+                    self._count(result)
+                    yield result
+        finally:
+            # The consumer may stop early, devices not started are skipped
+            stopped.set()
+            fetchers.shutdown(wait=True)
+            if parsers is not None:
+                parsers.shutdown(wait=True)
+
+    def _backup(
+        self, index: int, device: IntelbrasAPI, parsers: Optional[ProcessPoolExecutor],
+        slots: threading.BoundedSemaphore, results: queue.Queue,
+        stopped: threading.Event
+    ) -> None:
+        # Every device started puts a result, whatever fails
+        if stopped.is_set():
+            return
+        try:
+            size, future = self._submit(device, parsers, slots)
+        except BaseException as e:
+            size, future = 0, _failed(e)
+        results.put((index, size, future))
+
+    def _submit(
+        self, device: IntelbrasAPI, parsers: Optional[ProcessPoolExecutor],
+        slots: threading.BoundedSemaphore
+    ) -> Tuple[int, Future]:
+        raw = device.get_config_dump(self.names, timeout=self.timeout)
+        if parsers is None:
+            future = Future()
+            try:
+                future.set_result(_parse_dump(raw, self.names))
+            except Exception as e:
+                future.set_exception(e)
+            return len(raw), future
+        slots.acquire()
+        try:
+            future = parsers.submit(_parse_dump, raw, self.names)
+        except BaseException:
+            # BrokenProcessPool once a worker died
+            slots.release()
+            raise
+        future.add_done_callback(lambda f: slots.release())
+        return len(raw), future
+
+    def _write(self, f, device: IntelbrasAPI, size: int, future: Future) -> BackupResult:
+        try:
+            payload, names, elapsed = future.result()
+        except Exception as e:
+            logger.debug(f'Backup of {device.server} failed: {e!r}')
+            if not isinstance(e, IntelbrasAPIException):
+                e = IntelbrasAPIException(f'{device.server}: {e}', error=e)
+            return BackupResult(device, size, error=e)
+        device.record_parse('configManager.getConfig', elapsed, size)
+        # The parsed JSON is embedded as it came from the worker
+        header = json.dumps({'device': device.server,
+                             'time': time.strftime('%Y-%m-%dT%H:%M:%S')})
+        f.write(header[:-1].encode() + b', "config": ' + payload + b'}\n')
+        f.flush()
+        return BackupResult(device, size, names)
+
+    def _count(self, result: BackupResult) -> None:
+        if result.ok:
+            self.stats['saved'] += 1
+            self.stats['bytes'] += result.size
+        else:
+            self.stats['failed'] += 1
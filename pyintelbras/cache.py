@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class ResponseCache:
+    # In-memory LRU cache for idempotent CGI reads (getConfig, getVersion,
+    # getCaps, ...), keyed by device, user, method chain and params, so one
+    # cache can be shared by many clients (e.g. a DeviceFleet). Entries
+    # expire after their endpoint TTL, and write actions (setConfig, ...)
+    # invalidate the cached reads of that endpoint on that device.
+    #
+    # ttls maps an endpoint ('configManager') or an endpoint action
+    # ('configManager.getConfig') to its TTL in seconds, 0 disables caching.
+    def __init__(
+        self, maxsize: int = 256, ttl: float = 30.0,
+        ttls: Dict[str, float] = None
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cacheable(method: str, action: str) -> bool:
+        return method == 'GET' and action.startswith('get')
+
+    @staticmethod
+    def invalidates(action: str) -> bool:
+        return not action.startswith('get') and action.startswith(
+            ('set', 'delete', 'remove', 'add', 'reset', 'restore'))
+
+    @staticmethod
+    def key(host: str, user: str, path: str, extra_path: str, params: dict) -> Hashable:
+        return (host, user, path, extra_path,
+                tuple(sorted((str(k), str(v)) for k, v in params.items())))
+
+    def ttl_for(self, path: str, action: str) -> float:
+        ttl = self.ttls.get(f'{path}.{action}')
+        if ttl is None:
+            ttl = self.ttls.get(path, self.ttl)
+        return ttl
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path: str = None, host: str = None) -> None:
+        # Drop the entries of one endpoint and/or device, or everything
+        with self._lock:
+            if path is None and host is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries
+                        if path in (None, k[2]) and host in (None, k[0])]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def __len__(self) -> int:
+        return len(self._entries)
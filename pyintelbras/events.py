@@ -0,0 +1,303 @@
+import asyncio
+import json
+import logging
+import random
+import re
+import threading
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+import urllib3
+
+from .aio import AsyncIntelbrasAPI
+from .api import IntelbrasAPI
+from .exceptions import IntelbrasAPIException
+from .helpers import parse_response
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+_BOUNDARY = re.compile(r'boundary="?([^";]+)"?', flags=re.IGNORECASE)
+_CONTENT_LENGTH = re.compile(rb'^content-length:\s*(\d+)\s*$',
+                             flags=re.IGNORECASE | re.MULTILINE)
+# A part may carry several events, each one starting with Code=
+_EVENT_SPLIT = re.compile(r'\r?\n(?=Code=)')
+
+
+class MultipartParser:
+    # Incremental parser for the multipart/x-mixed-replace body sent by
+    # eventManager.cgi?action=attach. Bytes are fed as they arrive and the
+    # complete part bodies are returned. The buffer never holds more than
+    # max_part_size bytes, larger parts raise IntelbrasAPIException.
+    def __init__(self, boundary: str = 'myboundary', max_part_size: int = 64 * 1024):
+        self.delimiter = f'--{boundary}'.encode()
+        self.max_part_size = max_part_size
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[bytes]:
+        self._buffer += data
+        parts = []
+        while True:
+            part = self._next_part()
+            if part is None:
+                break
+            parts.append(part)
+
+        if len(self._buffer) > self.max_part_size:
+            self._buffer.clear()
+            raise IntelbrasAPIException(
+                f'Event part larger than {self.max_part_size} bytes')
+        return parts
+
+    def _next_part(self) -> Optional[bytes]:
+        buffer = self._buffer
+        start = buffer.find(self.delimiter)
+        if start < 0:
+            # Keep only what may be the beginning of a delimiter
+            del buffer[:max(0, len(buffer) - len(self.delimiter))]
+            return None
+
+        headers_start = buffer.find(b'\n', start)
+        if headers_start < 0:
+            return None
+        headers_end = buffer.find(b'\r\n\r\n', headers_start)
+        separator = 4
+        if headers_end < 0:
+            headers_end = buffer.find(b'\n\n', headers_start)
+            separator = 2
+            if headers_end < 0:
+                return None
+
+        body_start = headers_end + separator
+        length = _CONTENT_LENGTH.search(
+            bytes(buffer[headers_start:headers_end]))
+        if length:
+            body_end = body_start + int(length.group(1))
+            if len(buffer) < body_end:
+                return None
+            next_start = body_end
+        else:
+            # Without Content-Length the part ends at the next delimiter
+            body_end = buffer.find(self.delimiter, body_start)
+            if body_end < 0:
+                return None
+            next_start = body_end
+
+        body = bytes(buffer[body_start:body_end])
+        del buffer[:next_start]
+        return body.strip()
+
+
+def parse_event_body(body: bytes) -> List[dict]:
+    # Code=VideoMotion;action=Start;index=0[;data={...}]
+    events = []
+    text = body.decode('utf-8', 'replace').strip()
+    if not text or text == 'Heartbeat':
+        return events
+
+    for chunk in _EVENT_SPLIT.split(text):
+        head, sep, data = chunk.partition(';data=')
+        event = parse_response(head.replace(';', '\n'))
+        if sep:
+            try:
+                event['data'] = json.loads(data)
+            except ValueError:
+                event['data'] = data.strip()
+        events.append(event)
+    return events
+
+
+def _boundary(content_type: str) -> str:
+    match = _BOUNDARY.search(content_type or '')
+    return match.group(1) if match else 'myboundary'
+
+
+def _attach_params(codes: List[str], heartbeat: int) -> dict:
+    params = {'action': 'attach', 'codes': f"[{','.join(codes)}]"}
+    if heartbeat:
+        params['heartbeat'] = heartbeat
+    return params
+
+
+def _backoff(attempt: int, backoff: float, max_backoff: float) -> float:
+    delay = min(max_backoff, backoff * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class EventStream:
+    # Long-lived subscription to eventManager.cgi?action=attach. Iterating
+    # yields one dict per event, e.g.
+    #   {'Code': 'VideoMotion', 'action': 'Start', 'index': 0}
+    # and reconnects with jittered exponential backoff when the stream
+    # drops, fails or goes silent for longer than three heartbeats.
+    #
+    #   with EventStream(intelbras, codes=['VideoMotion', 'VideoLoss']) as events:
+    #       for event in events:
+    #           print(event)
+    def __init__(
+        self, api: IntelbrasAPI, codes: Iterable[str] = ('All',),
+        heartbeat: int = 5, reconnect: bool = True,
+        backoff: float = 1.0, max_backoff: float = 60.0,
+        max_part_size: int = 64 * 1024, chunk_size: int = 4096,
+        connect_timeout: float = 10.0
+    ) -> None:
+        self.api = api
+        self.codes = list(codes)
+        self.heartbeat = heartbeat
+        self.reconnect = reconnect
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_part_size = max_part_size
+        self.chunk_size = chunk_size
+        self.connect_timeout = connect_timeout
+        self._closed = threading.Event()
+        self._response = None
+
+    def __iter__(self) -> Iterator[dict]:
+        attempt = 0
+        while not self._closed.is_set():
+            try:
+                for event in self._attach():
+                    attempt = 0
+                    yield event
+                if self._closed.is_set():
+                    break
+                logger.debug(f'Event stream from {self.api.server} ended')
+            except (requests.RequestException, urllib3.exceptions.HTTPError,
+                    OSError, IntelbrasAPIException) as e:
+                if self._closed.is_set():
+                    break
+                logger.debug(f'Event stream from {self.api.server} failed: {e}')
+                if not self.reconnect:
+                    raise
+            if not self.reconnect:
+                break
+            delay = _backoff(attempt, self.backoff, self.max_backoff)
+            attempt += 1
+            logger.debug(f'Reconnecting to {self.api.server} in {delay:.1f}s')
+            self._closed.wait(delay)
+
+    def run(self, callback: Callable[[dict], Any]) -> None:
+        # Callback mode, blocks until close() is called
+        for event in self:
+            callback(event)
+
+    def close(self) -> None:
+        self._closed.set()
+        response = self._response
+        if response is not None:
+            response.close()
+
+    def __enter__(self) -> "EventStream":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _attach(self) -> Iterator[dict]:
+        read_timeout = self.heartbeat * 3 if self.heartbeat else None
+        response = self.api.eventManager(
+            stream=True, timeout=(self.connect_timeout, read_timeout),
+            **_attach_params(self.codes, self.heartbeat))
+        self._response = response
+        try:
+            if response.status_code != 200:
+                raise IntelbrasAPIException(
+                    f'Event attach failed: {response.status_code} - {response.reason}',
+                    error=response)
+            parser = MultipartParser(
+                _boundary(response.headers.get('Content-Type')),
+                max_part_size=self.max_part_size)
+
+            # read1 returns as soon as any bytes arrive, instead of waiting
+            # for a full chunk, so events are not delayed by buffering
+            read = getattr(response.raw, 'read1', None)
+            chunks = iter(lambda: read(self.chunk_size), b'') if read else \
+                response.iter_content(chunk_size=1)
+            for chunk in chunks:
+                for part in parser.feed(chunk):
+                    yield from parse_event_body(part)
+        finally:
+            self._response = None
+            response.close()
+
+
+async def aiter_events(
+    api: AsyncIntelbrasAPI, codes: Iterable[str] = ('All',),
+    heartbeat: int = 5, reconnect: bool = True,
+    backoff: float = 1.0, max_backoff: float = 60.0,
+    max_part_size: int = 64 * 1024, connect_timeout: float = 10.0
+) -> AsyncIterator[dict]:
+    # asyncio version of EventStream for an AsyncIntelbrasAPI
+    params = _attach_params(list(codes), heartbeat)
+    read_timeout = heartbeat * 3 if heartbeat else None
+    attempt = 0
+    while True:
+        try:
+            response = await api.eventManager(
+                stream=True, timeout=(connect_timeout, read_timeout), **params)
+            try:
+                if response.status != 200:
+                    raise IntelbrasAPIException(
+                        f'Event attach failed: {response.status} - {response.reason}',
+                        error=response)
+                parser = MultipartParser(
+                    _boundary(response.headers.get('Content-Type')),
+                    max_part_size=max_part_size)
+                async for chunk in response.content.iter_any():
+                    for part in parser.feed(chunk):
+                        for event in parse_event_body(part):
+                            attempt = 0
+                            yield event
+            finally:
+                response.release()
+            logger.debug(f'Event stream from {api.server} ended')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f'Event stream from {api.server} failed: {e!r}')
+            if not reconnect:
+                raise
+        if not reconnect:
+            break
+        delay = _backoff(attempt, backoff, max_backoff)
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+async def multiplex_events(
+    apis: Iterable[AsyncIntelbrasAPI], max_queued: int = 1000, **kwargs
+) -> AsyncIterator[Tuple[AsyncIntelbrasAPI, dict]]:
+    # Merge the event streams of many devices into one async iterator of
+    # (api, event). The queue is bounded, so a slow consumer applies
+    # backpressure to the readers instead of growing memory.
+    queue = asyncio.Queue(maxsize=max_queued)
+
+    async def pump(api):
+        cancelled = False
+        try:
+            async for event in aiter_events(api, **kwargs):
+                await queue.put((api, event))
+        except asyncio.CancelledError:
+            # The consumer closed the iterator, nothing reads a full queue
+            # anymore
+            cancelled = True
+            raise
+        finally:
+            # Marks this stream as finished (only without reconnect)
+            if not cancelled:
+                await queue.put((api, None))
+
+    tasks = [asyncio.ensure_future(pump(api)) for api in apis]
+    running = len(tasks)
+    try:
+        while running:
+            api, event = await queue.get()
+            if event is None:
+                running -= 1
+                continue
+            yield api, event
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
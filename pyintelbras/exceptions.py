@@ -5,3 +5,11 @@ class IntelbrasAPIException(Exception):
         super().__init__(*args)
 
         self.error = kwargs.get("error", None)
+
+
+class DeadlineExceeded(IntelbrasAPIException):
+    """Operation deadline exceeded"""
+
+
+class CircuitOpenError(IntelbrasAPIException):
+    """Device circuit breaker is open"""
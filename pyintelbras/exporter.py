@@ -0,0 +1,370 @@
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+from .api import IntelbrasAPI
+from .exceptions import IntelbrasAPIException
+from .fleet import DeviceFleet
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+Query = Union[dict, Iterable[dict], Dict[IntelbrasAPI, Iterable[dict]]]
+
+
+class ExportResult(NamedTuple):
+    device: IntelbrasAPI
+    item: Optional[dict] = None
+    file: Optional[str] = None
+    size: int = 0
+    checksum: Optional[str] = None
+    # exported, skipped or failed
+    status: str = 'exported'
+    error: Optional[IntelbrasAPIException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def recording_query(
+    channel: int, start: Union[datetime, str], end: Union[datetime, str],
+    **conditions
+) -> dict:
+    # find_media_files params for one channel and time range, e.g.
+    #   recording_query(1, datetime(2024, 8, 27), datetime(2024, 8, 28), Types=['dav'])
+    params = {'condition.Channel': channel,
+              'condition.StartTime': _format_time(start),
+              'condition.EndTime': _format_time(end)}
+    for key, value in conditions.items():
+        if isinstance(value, (list, tuple)):
+            for i, v in enumerate(value):
+                params[f'condition.{key}[{i}]'] = v
+        else:
+            params[f'condition.{key}'] = value
+    return params
+
+
+def _format_time(value: Union[datetime, str]) -> str:
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def default_name(device: IntelbrasAPI, item: dict) -> str:
+    # <host>/<FilePath on the device>, unique across devices and days
+    host = urlparse(device.server).netloc.replace(':', '_')
+    return os.path.join(host, *item['FilePath'].strip('/').split('/'))
+
+
+class _HashingFile:
+    # Append-mode file that hashes what it holds, including the bytes left
+    # by an interrupted run, so the checksum needs no second read
+    def __init__(self, path: str, algorithm: str, chunk_size: int):
+        self.hash = hashlib.new(algorithm)
+        self.file = open(path, 'a+b')
+        self.file.seek(0)
+        for chunk in iter(lambda: self.file.read(chunk_size), b''):
+            self.hash.update(chunk)
+        self.size = self.file.tell()
+
+    def write(self, data: bytes) -> int:
+        self.hash.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def seek(self, offset: int) -> int:
+        # Only rewinding is supported, the download restarts from zero
+        self.hash = hashlib.new(self.hash.name)
+        self.size = offset
+        return self.file.seek(offset)
+
+    def truncate(self) -> int:
+        return self.file.truncate()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "_HashingFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class RecordingExporter:
+    # Bulk export of recordings from many devices. The media file searches
+    # of every device run concurrently and each item found is handed
+    # straight to a bounded pool of streaming downloads, with at most
+    # per_device downloads per device so the recorder disk is not
+    # overloaded.
+    #
+    # Files are written to <dest>/<name(device, item)> through a .part file,
+    # which is resumed with a Range request by the next run. A file whose
+    # size differs from the Length reported by the device fails and is not
+    # renamed. Each exported
+    # file is appended to a JSON Lines manifest with its size and checksum,
+    # and files already exported (same device path and size) are skipped:
+    #
+    #   exporter = RecordingExporter(fleet, '/srv/export', per_device=2)
+    #   query = recording_query(1, '2024-8-27 00:00:00', '2024-8-28 00:00:00')
+    #   for r in exporter.export(query):
+    #       print(r.status, r.file, r.error or '')
+    def __init__(
+        self, devices: Union[IntelbrasAPI, DeviceFleet, Iterable[IntelbrasAPI]],
+        dest: str, max_workers: int = 16, per_device: int = 2,
+        max_searches: int = 8, batch_size: int = 100,
+        manifest: str = 'manifest.jsonl', checksum: str = 'sha256',
+        chunk_size: int = 256 * 1024,
+        timeout: Union[float, Tuple[float, float]] = (10, 60),
+        name: Callable[[IntelbrasAPI, dict], str] = default_name
+    ) -> None:
+        if isinstance(devices, IntelbrasAPI):
+            devices = [devices]
+        self.devices = list(devices)
+        self.dest = dest
+        self.max_workers = max_workers
+        self.per_device = per_device
+        self.max_searches = max_searches
+        self.batch_size = batch_size
+        self.manifest_path = os.path.join(dest, manifest)
+        self.checksum = checksum
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.name = name
+        self.stats = {'exported': 0, 'skipped': 0, 'failed': 0, 'bytes': 0}
+        self.manifest = self._load_manifest()
+        self._lock = threading.Lock()
+
+    def export(self, queries: Query) -> Iterator[ExportResult]:
+        # queries are find_media_files params: one dict or a list of them
+        # for every device, or a dict of device -> list of params. Results
+        # are yielded as each file completes.
+        jobs = self._jobs(queries)
+        run = _ExportRun(self, len(jobs))
+        searches = ThreadPoolExecutor(
+            max_workers=max(1, min(self.max_searches, len(jobs))),
+            thread_name_prefix='pyintelbras-export-search')
+        downloads = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='pyintelbras-export')
+        run.executor = downloads
+        try:
+            for device, params in jobs:
+                searches.submit(run.search, device, params)
+            while True:
+                result = run.results.get()
+                if result is None:
+                    break
+                self._count(result)
+                yield result
+        finally:
+            run.stop()
+            searches.shutdown(wait=True)
+            downloads.shutdown(wait=True)
+
+    def _jobs(self, queries: Query) -> List[Tuple[IntelbrasAPI, dict]]:
+        if isinstance(queries, dict) and queries and all(
+                isinstance(d, IntelbrasAPI) for d in queries):
+            return [(device, params) for device, device_queries in queries.items()
+                    for params in device_queries]
+        if isinstance(queries, dict):
+            queries = [queries]
+        queries = list(queries)
+        return [(device, params) for device in self.devices for params in queries]
+
+    def _existing(self, device: IntelbrasAPI, item: dict, file: str) -> Optional[ExportResult]:
+        # Already exported: the manifest entry matches the size reported by
+        # the device, or the file has that size (exported before a manifest)
+        length = item.get('Length')
+        try:
+            size = os.path.getsize(file)
+        except OSError:
+            return None
+        entry = self.manifest.get((device.server, item['FilePath']))
+        if entry and entry.get('length') == length and entry.get('size') == size:
+            return ExportResult(device, item, file, size, entry.get(self.checksum),
+                                status='skipped')
+        if length is None or size != length:
+            return None
+        with _HashingFile(file, self.checksum, self.chunk_size) as f:
+            digest = f.hash.hexdigest()
+        self._record(device, item, file, size, digest)
+        return ExportResult(device, item, file, size, digest, status='skipped')
+
+    def _download(self, device: IntelbrasAPI, item: dict, file: str) -> ExportResult:
+        try:
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            part = f'{file}.part'
+            with _HashingFile(part, self.checksum, self.chunk_size) as f:
+                size = device.download_media_file(
+                    item['FilePath'], f, chunk_size=self.chunk_size,
+                    timeout=self.timeout, offset=f.size)
+                digest = f.hash.hexdigest()
+            length = item.get('Length')
+            if length is not None and size != length:
+                if size > length:
+                    # Not the file listed, e.g. still being recorded; a
+                    # longer .part can not be resumed
+                    os.remove(part)
+                raise IntelbrasAPIException(
+                    f"{device.server} {item['FilePath']}: got {size} bytes, "
+                    f"device reported {length}")
+            os.replace(part, file)
+        except Exception as e:
+            logger.debug(f"Export of {device.server} {item['FilePath']} failed: {e!r}")
+            if not isinstance(e, IntelbrasAPIException):
+                e = IntelbrasAPIException(f"{device.server}: {e}", error=e)
+            return ExportResult(device, item, file, status='failed', error=e)
+        self._record(device, item, file, size, digest)
+        return ExportResult(device, item, file, size, digest)
+
+    def _load_manifest(self) -> Dict[Tuple[str, str], dict]:
+        manifest = {}
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Line cut by an interrupted run
+                        continue
+                    manifest[(entry['device'], entry['path'])] = entry
+        except FileNotFoundError:
+            pass
+        return manifest
+
+    def _record(self, device: IntelbrasAPI, item: dict, file: str,
+                size: int, digest: str) -> None:
+        entry = {
+            'device': device.server,
+            'path': item['FilePath'],
+            'file': os.path.relpath(file, self.dest),
+            'size': size,
+            'length': item.get('Length'),
+            self.checksum: digest,
+            'channel': item.get('Channel'),
+            'start': _json_value(item.get('StartTime')),
+            'end': _json_value(item.get('EndTime')),
+            'exported': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            self.manifest[(entry['device'], entry['path'])] = entry
+            os.makedirs(self.dest, exist_ok=True)
+            # One write per entry, a crash never loses earlier entries
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def _count(self, result: ExportResult) -> None:
+        self.stats[result.status] += 1
+        if result.status == 'exported':
+            self.stats['bytes'] += result.size
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+class _ExportRun:
+    # State of one RecordingExporter.export call. Each device has a deque
+    # of found files; downloads are submitted while the device has fewer
+    # than per_device running, and every finished download submits the
+    # next one. outstanding counts searches plus queued and running
+    # downloads, the run ends when it reaches zero.
+    def __init__(self, exporter: RecordingExporter, searches: int):
+        self.exporter = exporter
+        self.executor = None
+        self.results = queue.Queue()
+        self.pending: Dict[IntelbrasAPI, deque] = {}
+        self.running: Dict[IntelbrasAPI, int] = {}
+        self.seen = set()
+        self.outstanding = searches
+        self.stopped = False
+        self.lock = threading.Lock()
+        if not searches:
+            self.results.put(None)
+
+    def search(self, device: IntelbrasAPI, params: dict) -> None:
+        exporter = self.exporter
+        try:
+            items = device.iter_media_files(params, batch_size=exporter.batch_size)
+            for item in items:
+                if self.stopped:
+                    items.close()
+                    break
+                path = item.get('FilePath')
+                if not path:
+                    continue
+                # Searches of one device may overlap, each file is
+                # downloaded once
+                with self.lock:
+                    new = (device.server, path) not in self.seen
+                    self.seen.add((device.server, path))
+                if not new:
+                    continue
+                file = os.path.join(exporter.dest, exporter.name(device, item))
+                existing = exporter._existing(device, item, file)
+                if existing is not None:
+                    self.results.put(existing)
+                    continue
+                self.push(device, item, file)
+        except Exception as e:
+            logger.debug(f'Media file search on {device.server} failed: {e!r}')
+            if not isinstance(e, IntelbrasAPIException):
+                e = IntelbrasAPIException(f'{device.server}: {e}', error=e)
+            self.results.put(ExportResult(device, status='failed', error=e))
+        finally:
+            self.done()
+
+    def push(self, device: IntelbrasAPI, item: dict, file: str) -> None:
+        with self.lock:
+            self.outstanding += 1
+            self.pending.setdefault(device, deque()).append((item, file))
+        self.dispatch(device)
+
+    def dispatch(self, device: IntelbrasAPI) -> None:
+        with self.lock:
+            pending = self.pending.get(device)
+            while (pending and not self.stopped
+                   and self.running.get(device, 0) < self.exporter.per_device):
+                item, file = pending.popleft()
+                self.running[device] = self.running.get(device, 0) + 1
+                self.executor.submit(self.download, device, item, file)
+
+    def download(self, device: IntelbrasAPI, item: dict, file: str) -> None:
+        try:
+            self.results.put(self.exporter._download(device, item, file))
+        finally:
+            with self.lock:
+                self.running[device] -= 1
+            self.dispatch(device)
+            self.done()
+
+    def done(self, count: int = 1) -> None:
+        with self.lock:
+            self.outstanding -= count
+            finished = self.outstanding == 0
+        if finished:
+            self.results.put(None)
+
+    def stop(self) -> None:
+        # The consumer stopped early: drop what was not started yet
+        with self.lock:
+            self.stopped = True
+            dropped = sum(len(p) for p in self.pending.values())
+            for pending in self.pending.values():
+                pending.clear()
+        if dropped:
+            self.done(dropped)
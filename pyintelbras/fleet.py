@@ -0,0 +1,176 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Any, Callable, Iterable, Iterator, List, NamedTuple, Optional, Union
+
+from .api import IntelbrasAPI, IntelbrasAPIMethod
+from .exceptions import IntelbrasAPIException
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class FleetResult(NamedTuple):
+    device: IntelbrasAPI
+    result: Any = None
+    error: Optional[IntelbrasAPIException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class DeviceFleet:
+    # Runs the same call across many devices on a bounded thread pool.
+    # Results are yielded as each device completes, and a failing or slow
+    # device is reported in its FleetResult without aborting the others:
+    #
+    #   fleet = DeviceFleet(['10.0.0.1', '10.0.0.2'], user='u', password='p')
+    #   for r in fleet.configManager(action='getConfig', name='ChannelTitle'):
+    #       print(r.device.server, r.error or r.result.status_code)
+    def __init__(
+        self, devices: Iterable[Union[IntelbrasAPI, str, dict]] = (),
+        user: str = '', password: str = '',
+        max_workers: int = 32, timeout: float = None,
+        **api_kwargs
+    ) -> None:
+        self.user = user
+        self.password = password
+        self.max_workers = max_workers
+        # Per-device timeout, applied to each HTTP request and to the whole
+        # call made on the device
+        self.timeout = timeout
+        self.api_kwargs = api_kwargs
+        self.devices: List[IntelbrasAPI] = []
+        # Clients built by the fleet, the only ones close() closes
+        self._owned: List[IntelbrasAPI] = []
+        self._executor = None
+        self._lock = threading.Lock()
+
+        for device in devices:
+            self.add(device)
+
+    def add(self, device: Union[IntelbrasAPI, str, dict]) -> IntelbrasAPI:
+        # Devices may be IntelbrasAPI instances, server addresses using the
+        # fleet credentials, or dicts of IntelbrasAPI arguments. Instances
+        # stay owned by the caller and are not closed by close().
+        if isinstance(device, str):
+            device = {'server': device}
+        if isinstance(device, dict):
+            kwargs = {'user': self.user, 'password': self.password,
+                      **self.api_kwargs, **device}
+            device = IntelbrasAPI(**kwargs)
+            self._owned.append(device)
+        self.devices.append(device)
+        return device
+
+    def map(
+        self, func: Callable[[IntelbrasAPI], Any], timeout: float = None
+    ) -> Iterator[FleetResult]:
+        # Call func(device) for every device, yielding in completion order
+        timeout = self.timeout if timeout is None else timeout
+        executor = self._get_executor()
+        started = {}
+
+        def run(device: IntelbrasAPI) -> Any:
+            started[device] = time.monotonic()
+            return func(device)
+
+        # Each device runs in a copy of this context, under the caller's
+        # deadline if any
+        pending = {executor.submit(contextvars.copy_context().run, run, device): device
+                   for device in self.devices}
+        try:
+            while pending:
+                wait_timeout = None
+                if timeout is not None:
+                    deadlines = [started[d] + timeout
+                                 for d in pending.values() if d in started]
+                    if deadlines:
+                        wait_timeout = max(0, min(deadlines) - time.monotonic())
+                done, _ = wait(pending, timeout=wait_timeout,
+                               return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    yield self._result(pending.pop(future), future)
+
+                if timeout is not None:
+                    now = time.monotonic()
+                    for future, device in list(pending.items()):
+                        if device in started and now - started[device] >= timeout:
+                            # The worker can't be interrupted, it finishes
+                            # in the background and its result is dropped
+                            del pending[future]
+                            yield FleetResult(device, error=IntelbrasAPIException(
+                                f'{device.server}: timed out after {timeout}s',
+                                error=TimeoutError()))
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        for device in self._owned:
+            device.close()
+
+    def __enter__(self) -> "DeviceFleet":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def __iter__(self) -> Iterator[IntelbrasAPI]:
+        return iter(self.devices)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='pyintelbras-fleet')
+            return self._executor
+
+    @staticmethod
+    def _result(device: IntelbrasAPI, future: Future) -> FleetResult:
+        try:
+            return FleetResult(device, result=future.result())
+        except IntelbrasAPIException as e:
+            return FleetResult(device, error=e)
+        except Exception as e:
+            logger.debug(f'Device {device.server} failed: {e!r}')
+            return FleetResult(device, error=IntelbrasAPIException(
+                f'{device.server}: {e}', error=e))
+
+    def _method(self, attr: str) -> "FleetMethod":
+        return FleetMethod([attr], self)
+
+    def __getattr__(self, attr: str) -> "FleetMethod":
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        return self._method(attr)
+
+
+class FleetMethod:
+    def __init__(self, methods: List[str] = None, fleet: DeviceFleet = None):
+        self.methods = methods or []
+        self.fleet = fleet
+
+    def __getattr__(self, name: str) -> "FleetMethod":
+        return FleetMethod(self.methods + [name], self.fleet)
+
+    def __call__(self, *args, **kwargs) -> Iterator[FleetResult]:
+        if self.fleet.timeout is not None:
+            kwargs.setdefault('timeout', self.fleet.timeout)
+
+        def call(device: IntelbrasAPI) -> Any:
+            return IntelbrasAPIMethod(self.methods, device)(*args, **kwargs)
+
+        return self.fleet.map(call)
@@ -1,114 +1,360 @@
+import re
+from sys import intern
+from collections.abc import Mapping, Sequence
 from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
 
 from .exceptions import IntelbrasAPIException
 
+# Value classification. Each value is matched once against these patterns
+# instead of trying int(), float(), ... and catching the failures.
+_DIGITS = r'\d(?:_?\d)*'
+_NUMBER = re.compile(
+    rf'(?P<int>[+-]?{_DIGITS})'
+    rf'|(?P<float>[+-]?(?:{_DIGITS}\.(?:{_DIGITS})?|\.{_DIGITS}|{_DIGITS})'
+    rf'(?:[eE][+-]?{_DIGITS})?'
+    r'|[+-]?(?:inf(?:inity)?|nan))',
+    flags=re.IGNORECASE)
+_DATETIME = re.compile(
+    r'(\d{4})-(\d{1,2})-(\d{1,2})\s+(\d{1,2}):(\d{1,2}):(\d{1,2})')
+_CONSTANTS = {'null': None, 'none': None, 'true': True, 'false': False}
+# First characters that may start a number or a datetime
+_NUMERIC_START = frozenset('0123456789+-.iInN')
 
-def parse_response(s: str) -> dict:
-    # Helper function to try convert types
-    def convert_value(value):
-        # Check for null or None values
-        if value.lower() in ('null', 'none'):
-            return None
 
-        # Try to convert to int
-        try:
+def convert_value(value: str) -> Any:
+    # Convert a raw response value to None, int, float, bool or datetime,
+    # falling back to the string itself
+    if len(value) <= 5:
+        constant = _CONSTANTS.get(value.lower(), value)
+        if constant is not value:
+            return constant
+
+    if value.isdecimal():
+        return int(value)
+
+    if not value or (value[0] not in _NUMERIC_START and not value[0].isdigit()):
+        return value
+
+    match = _NUMBER.fullmatch(value)
+    if match:
+        if match.lastgroup == 'int':
             return int(value)
-        except ValueError:
-            pass
+        return float(value)
 
-        # Try to convert to float
+    match = _DATETIME.fullmatch(value)
+    if match:
         try:
-            return float(value)
+            return datetime(*map(int, match.groups()))
         except ValueError:
+            # Out of range fields, e.g. 2024-02-30
             pass
 
-        # Try to convert to boolean
-        if value.lower() in ('true', 'false'):
-            return value.lower() == 'true'
+    return value
 
-        # Try to convert to datetime
-        try:
-            return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
-        except ValueError:
-            pass
 
-        # Return the value as string if no conversion is possible
+def convert_typed(key: str, value: str, schema: Dict[str, Callable]) -> Any:
+    # Convert a raw value with the type declared for its key in schema,
+    # e.g. {'StartTime': datetime, 'Channel': int}. Keys without a declared
+    # type are guessed by convert_value.
+    kind = schema.get(key)
+    if kind is None:
+        return convert_value(value)
+    if value.lower() in ('null', 'none'):
+        return None
+    if kind is str:
         return value
+    if kind is bool:
+        return value.lower() == 'true'
+    if kind is datetime:
+        match = _DATETIME.fullmatch(value)
+        if not match:
+            raise ValueError(f'{key}={value} is not a datetime')
+        return datetime(*map(int, match.groups()))
+    return kind(value)
+
+
+def format_value(value: Any) -> str:
+    # Inverse of convert_value, the raw form the device expects
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)
+
+
+class LazyDict(Mapping):
+    # Read-only view over a parsed response whose values are still the raw
+    # strings. Values are converted when accessed, with the type from schema
+    # when the key has one, and the result is kept for later reads.
+    __slots__ = ('_data', '_schema')
+
+    def __init__(self, data: dict, schema: Dict[str, Callable] = None):
+        self._data = data
+        self._schema = schema or {}
+
+    def __getitem__(self, key: str) -> Any:
+        return _lazy_value(self._data, key, key, self._schema)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f'LazyDict({list(self._data)})'
+
+    def to_dict(self) -> dict:
+        # Convert everything, giving the same result as the eager parser
+        return {key: _materialize(value) for key, value in self.items()}
+
+
+class LazyList(Sequence):
+    __slots__ = ('_data', '_key', '_schema')
+
+    def __init__(self, data: list, key: str, schema: Dict[str, Callable] = None):
+        self._data = data
+        self._key = key
+        self._schema = schema or {}
+
+    def __getitem__(self, index: int) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._data)))]
+        return _lazy_value(self._data, index, self._key, self._schema)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f'LazyList({self._key}, {len(self._data)} items)'
+
+    def to_list(self) -> list:
+        return [_materialize(value) for value in self]
+
+
+def _lazy_value(container, index, key: str, schema: Dict[str, Callable]) -> Any:
+    value = container[index]
+    if isinstance(value, str):
+        try:
+            converted = convert_typed(key, value, schema)
+        except Exception as e:
+            raise IntelbrasAPIException(f'Parser Response Error: {e}')
+        if not isinstance(converted, str):
+            container[index] = converted
+        return converted
+    if isinstance(value, dict):
+        return LazyDict(value, schema)
+    if isinstance(value, list):
+        return LazyList(value, key, schema)
+    return value
+
+
+def _materialize(value: Any) -> Any:
+    if isinstance(value, LazyDict):
+        return value.to_dict()
+    if isinstance(value, LazyList):
+        return value.to_list()
+    return value
+
+
+@lru_cache(maxsize=4096)
+def _tokenize(part: str) -> Tuple[str, Optional[int]]:
+    # Split a path part into (key, index). Plain keys and double indexes
+    # (e.g. TimeSection[0][1]) are dict keys and have no index.
+    if '[' in part and ']' in part and part.count('[') == 1:
+        key, index = part.split('[')
+        return key, int(index.rstrip(']'))
+    return part, None
+
+
+def iter_response_items(
+    lines: Iterable[Union[str, bytes]], schema: Dict[str, Callable] = None,
+    raw: bool = False
+) -> Iterator[Tuple[str, Any]]:
+    # Event mode: yields (path, value) for each key=value line as it is read,
+    # e.g. ('items[0].Channel', 1), without building the nested result.
+    # lines may be str or bytes, such as Response.iter_lines(). With raw the
+    # values are the stripped strings.
+    try:
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', 'replace')
+            line = line.strip()
+            if not line:
+                continue
+
+            path, sep, value = line.partition('=')
+            if not sep:
+                value = None
+            elif raw:
+                value = value.strip()
+            elif schema:
+                key, _ = _tokenize(path.rpartition('.')[2])
+                value = convert_typed(key, value.strip(), schema)
+            else:
+                value = convert_value(value.strip())
+            yield path, value
+    except IntelbrasAPIException:
+        raise
+    except Exception as e:
+        raise IntelbrasAPIException(f'Parser Response Error: {e}')
+
+
+def parse_response(
+    s: str, lazy: bool = False, schema: Dict[str, Callable] = None
+) -> dict:
+    # With lazy, a LazyDict is returned and values are only converted when
+    # read. schema maps key names to the type of their values (int, float,
+    # bool, str, datetime or any callable taking the raw string), skipping
+    # the type guessing for those keys.
+    try:
+        lines = s.splitlines()
+    except AttributeError as e:
+        raise IntelbrasAPIException(f'Parser Response Error: {e}')
+    return parse_response_lines(lines, lazy=lazy, schema=schema)
+
+
+def parse_response_lines(
+    lines: Iterable[Union[str, bytes]], lazy: bool = False,
+    schema: Dict[str, Callable] = None
+) -> dict:
+    # Same as parse_response, but consumes the response line by line (str
+    # or bytes), so a streamed body can be parsed while it downloads:
+    #   r = intelbras.configManager(action='getConfig', name='All', stream=True)
+    #   parse_response_lines(r.iter_lines())
 
     # Initialize the dictionary
     result = {}
 
     try:
-        # Split the string into lines, handling various line breaks and spaces
-        lines = [line.strip() for line in s.splitlines() if line.strip()]
+        # Consecutive lines usually share the same prefix (e.g. every field
+        # of items[3]), so the container of the last prefix is reused
+        last_prefix = None
+        container = None
 
-        # Process each line
         for line in lines:
-            # Ignore entries without '=' sign
-            if '=' in line:
-                # Split the line at '=' to separate the path from the value
-                path, value = line.split('=', 1)
-                # Try convert the value to the appropriate type
-                value = convert_value(value.strip())
-            else:
-                path, value = line, None
-
-            # Split the path into parts
-            parts = path.split('.')
-
-            # Initialize the current level of the dictionary
-            current_level = result
-
-            # Iterate over the parts of the path (except the last one)
-            for part in parts[:-1]:
-                # Check if the part contains a list index (e.g., Snap[0])
-                if '[' in part and ']' in part:
-                    # If it's a double index (e.g., TimeSection[0][1]), treat it as a key
-                    if part.count('[') > 1:
-                        # Use the entire part as the key (e.g., 'TimeSection[0][1]')
-                        key = part
-                        if key not in current_level:
-                            current_level[key] = {}
-                        current_level = current_level[key]
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', 'replace')
+            line = line.strip()
+            if not line:
+                continue
+
+            path, sep, value = line.partition('=')
+            prefix, dot, last_part = path.rpartition('.')
+            prefix += dot
+
+            if prefix != last_prefix:
+                # Walk the path, creating dicts and lists (of dicts) on the way
+                container = result
+                parts = prefix[:-1].split('.') if prefix else ()
+                for part_key, part_index in map(_tokenize, parts):
+                    if part_index is None:
+                        if part_key not in container:
+                            container[part_key] = {}
+                        container = container[part_key]
                     else:
-                        # Handle single index (e.g., Snap[0])
-                        key, index = part.split('[')
-                        # Remove the ']' and convert to integer
-                        index = int(index.rstrip(']'))
-                        if key not in current_level:
-                            current_level[key] = []
-                        # Ensure the list has the required size
-                        while len(current_level[key]) <= index:
-                            current_level[key].append({})
-                        current_level = current_level[key][index]
-                else:
-                    # Handle regular keys
-                    if part not in current_level:
-                        current_level[part] = {}
-                    current_level = current_level[part]
+                        if part_key not in container:
+                            container[part_key] = []
+                        items = container[part_key]
+                        if len(items) <= part_index:
+                            items.extend(
+                                {} for _ in range(part_index + 1 - len(items)))
+                        container = items[part_index]
+                last_prefix = prefix
 
             # Add the final value
-            last_part = parts[-1]
-            if '[' in last_part and ']' in last_part:
-                # If it's a double index (e.g., TimeSection[0][1]), treat it as a key
-                if last_part.count('[') > 1:
-                    # Use the entire part as the key (e.g., 'TimeSection[0][1]')
-                    key = last_part
-                else:
-                    # Handle single index (e.g., Snap[0])
-                    key, index = last_part.split('[')
-                    index = int(index.rstrip(']'))
-                    if key not in current_level:
-                        current_level[key] = []
-                    while len(current_level[key]) <= index:
-                        current_level[key].append(None)
-                    current_level[key][index] = value
-                    continue  # Skip the assignment below
+            key, index = _tokenize(last_part)
+            if not sep:
+                # Entries without '=' sign have no value
+                value = None
+            elif lazy:
+                # Raw values repeat a lot (dav, Main, 3276800, ...), keep
+                # one copy of each
+                value = intern(value.strip())
+            elif schema:
+                value = convert_typed(key, value.strip(), schema)
             else:
-                key = last_part  # Use the part as the key
+                value = convert_value(value.strip())
 
-            current_level[key] = value
+            if index is None:
+                container[key] = value
+            else:
+                if key not in container:
+                    container[key] = []
+                items = container[key]
+                if len(items) <= index:
+                    items.extend([None] * (index + 1 - len(items)))
+                items[index] = value
     except Exception as e:
         raise IntelbrasAPIException(f'Parser Response Error: {e}')
 
+    if lazy:
+        return LazyDict(result, schema)
     return result
+
+
+def parse_configs(
+    s: str, names: Iterable[str], lazy: bool = False,
+    schema: Dict[str, Callable] = None
+) -> Dict[str, Any]:
+    # Split a getConfig response (e.g. name=All) into {name: config} for the
+    # given names. Lines of other names are dropped before parsing, so a
+    # large dump costs little more than the names that were asked for.
+    names = list(names)
+    prefixes = tuple(f'table.{name}{c}' for name in names for c in '.[=')
+    try:
+        lines = [line for line in s.splitlines()
+                 if line.lstrip().startswith(prefixes)]
+    except AttributeError as e:
+        raise IntelbrasAPIException(f'Parser Response Error: {e}')
+    table = parse_response_lines(lines, lazy=lazy, schema=schema).get('table', {})
+    return {name: table.get(name) for name in names}
+
+
+def flatten_response(data: Any, prefix: str = '') -> Dict[str, Any]:
+    # Inverse of parse_response: nested dicts and lists back to the CGI
+    # key form, e.g. {'Encode': [{'Video': {'FPS': 15}}]} becomes
+    # {'Encode[0].Video.FPS': 15}. Values are kept as they are, see
+    # format_value; None (list holes, keys without value) is left out.
+    flat = {}
+    _flatten(data, prefix, flat)
+    return flat
+
+
+def _flatten(value: Any, path: str, flat: Dict[str, Any]) -> None:
+    if isinstance(value, Mapping):
+        for key, item in value.items():
+            _flatten(item, f'{path}.{key}' if path else key, flat)
+    elif isinstance(value, (list, tuple, LazyList)):
+        for index, item in enumerate(value):
+            _flatten(item, f'{path}[{index}]', flat)
+    elif value is not None:
+        flat[path] = value
+
+
+def diff_config(current: Any, desired: Any) -> Dict[str, Any]:
+    # Keys of desired whose value differs from current, both nested (as
+    # returned by parse_response) or already flat. Raw string values in
+    # desired are converted only to compare, so '15.000000' equals 15.0;
+    # the changes keep the values as given, e.g. a Name of '007'.
+    current = flatten_response(current)
+    changes = {}
+    for key, value in flatten_response(desired).items():
+        compared = convert_value(value.strip()) if isinstance(value, str) else value
+        old = current.get(key)
+        if old is None or not _same_value(old, compared):
+            changes[key] = value
+    return changes
+
+
+def _same_value(a: Any, b: Any) -> bool:
+    # 1 == True in Python, but not for the device
+    return a == b and isinstance(a, bool) == isinstance(b, bool)
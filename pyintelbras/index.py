@@ -0,0 +1,256 @@
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple, Union
+
+from .api import IntelbrasAPI
+from .exporter import recording_query
+from .media import MediaFileTable, to_epoch, from_epoch
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+Time = Union[datetime, str, int]
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    device TEXT NOT NULL,
+    path TEXT NOT NULL,
+    channel INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    length INTEGER,
+    type TEXT,
+    stream TEXT,
+    events TEXT,
+    PRIMARY KEY (device, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_start ON files (device, channel, start);
+CREATE TABLE IF NOT EXISTS syncs (
+    device TEXT NOT NULL,
+    channel INTEGER NOT NULL,
+    synced_from INTEGER NOT NULL,
+    synced_until INTEGER NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (device, channel)
+);
+'''
+
+
+class RecordingIndex:
+    # Local SQLite index of the recordings of one or more devices, so that
+    # "what exists on channel 5 last Tuesday" is answered without running
+    # the mediaFileFind steps on the device:
+    #
+    #   index = RecordingIndex('recordings.db')
+    #   index.sync(intelbras, channels=[1, 2, 3, 4])
+    #   files = index.query(intelbras, 5, datetime(2024, 8, 27), datetime(2024, 8, 28))
+    #
+    # The channels taken by sync and query are numbered as in
+    # condition.Channel (from 1). The tables returned by query number them
+    # as the devices report the items (from 0), like find_media_table and
+    # Timeline.
+    #
+    # sync only asks the device for the time since the previous sync of
+    # each channel, starting overlap seconds earlier to catch the file that
+    # was still being recorded. query goes back to the device when the
+    # range reaches past the last sync and that sync is older than max_age
+    # seconds; older ranges are served locally, use sync(since=...) or
+    # prune() when the device overwrites old recordings.
+    def __init__(
+        self, path: str = ':memory:', max_age: float = 300,
+        history: timedelta = timedelta(days=30), overlap: int = 3600,
+        batch_size: int = 100
+    ) -> None:
+        self.path = path
+        self.max_age = max_age
+        # How far back the first sync of a channel goes
+        self.history = history
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self._longest = {}
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            if path != ':memory:':
+                self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> "RecordingIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def sync(
+        self, api: IntelbrasAPI, channels: Iterable[int] = None,
+        since: Time = None, until: Time = None
+    ) -> int:
+        # Fetch the recordings of each channel from the device, one channel
+        # after another since devices handle concurrent finders poorly.
+        # since forces the start of the window, e.g. to pick up recordings
+        # removed from the device. Returns the number of files stored.
+        if channels is None:
+            channels = range(1, len(api.channels) + 1)
+        until = to_epoch(until if until is not None else datetime.now())
+        stored = 0
+        for channel in channels:
+            if since is not None:
+                start = to_epoch(since)
+            else:
+                synced = self._synced(api.server, channel)
+                if synced is None:
+                    start = until - int(self.history.total_seconds())
+                else:
+                    start = min(synced[1] - self.overlap, until)
+            stored += self._fetch(api, channel, start, until)
+        return stored
+
+    def _fetch(self, api: IntelbrasAPI, channel: int, start: int, until: int) -> int:
+        query = recording_query(channel, from_epoch(start), from_epoch(until))
+        table = api.find_media_table(query, batch_size=self.batch_size)
+        return self._store(api.server, channel, start, until, table)
+
+    def _synced(self, device: str, channel: int) -> Optional[Tuple[int, int, float]]:
+        # (synced_from, synced_until, synced_at) of a channel
+        with self._lock:
+            return self._db.execute(
+                'SELECT synced_from, synced_until, synced_at FROM syncs '
+                'WHERE device = ? AND channel = ?', (device, channel)).fetchone()
+
+    def _store(self, device: str, channel: int, start: int, until: int,
+               table: MediaFileTable) -> int:
+        # The window is replaced as a whole: files that grew or were
+        # renamed since the previous sync do not linger
+        rows = [(device, path, channel, s, e, None if length == -1 else length,
+                 type, stream, '|'.join(events))
+                for s, e, length, path, type, stream, events in zip(
+                    table.start, table.end, table.length, table.path,
+                    table.type, table.stream, table.events)
+                if path and s != -1 and e != -1]
+        with self._lock, self._db:
+            self._db.execute(
+                'DELETE FROM files WHERE device = ? AND channel = ? '
+                'AND start >= ? AND start < ?', (device, channel, start, until))
+            self._insert(rows)
+            synced = self._synced(device, channel)
+            synced_at = time.time()
+            if synced is not None:
+                # A backfill of older files does not refresh the recent ones
+                if until < synced[1]:
+                    synced_at = synced[2]
+                start, until = min(start, synced[0]), max(until, synced[1])
+            self._db.execute(
+                'INSERT OR REPLACE INTO syncs VALUES (?, ?, ?, ?, ?)',
+                (device, channel, start, until, synced_at))
+        logger.debug(f'Indexed {len(rows)} files of {device} channel {channel}')
+        return len(rows)
+
+    def _insert(self, rows: List[tuple]) -> None:
+        self._db.executemany(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        for row in rows:
+            key = (row[0], row[2])
+            if key in self._longest:
+                self._longest[key] = max(self._longest[key], row[4] - row[3])
+
+    def _longest_file(self, device: str, channel: int) -> int:
+        # Duration of the longest file, bounds how far before a range a file
+        # overlapping it may start
+        key = (device, channel)
+        if key not in self._longest:
+            self._longest[key] = self._db.execute(
+                'SELECT MAX(end - start) FROM files WHERE device = ? AND channel = ?',
+                key).fetchone()[0] or 0
+        return self._longest[key]
+
+    def add(self, api: Union[IntelbrasAPI, str], items: Union[Iterable[dict], MediaFileTable]) -> int:
+        # Store find_media_files items (or a MediaFileTable) found by other
+        # means; the sync windows are not changed. Items without a channel
+        # are skipped.
+        device = api if isinstance(api, str) else api.server
+        table = items if isinstance(items, MediaFileTable) else MediaFileTable.from_items(items)
+        rows = [(device, f.path, f.channel + 1, f.start, f.end, f.length, f.type,
+                 f.stream, '|'.join(f.events))
+                for f in table if f.path and f.channel is not None
+                and f.start is not None and f.end is not None]
+        with self._lock, self._db:
+            self._insert(rows)
+        return len(rows)
+
+    def query(
+        self, api: Union[IntelbrasAPI, str], channels: Union[int, Iterable[int]],
+        start: Time, end: Time, max_age: float = None
+    ) -> MediaFileTable:
+        # Files of the channels overlapping [start, end), sorted by start.
+        # With an IntelbrasAPI, the windows the index misses or holds stale
+        # are fetched from the device first.
+        channels = [channels] if isinstance(channels, int) else list(channels)
+        start, end = to_epoch(start), to_epoch(end)
+        device = api if isinstance(api, str) else api.server
+        if isinstance(api, IntelbrasAPI):
+            for channel, window_start, window_end in self.stale(
+                    device, channels, start, end, max_age):
+                self._fetch(api, channel, window_start, window_end)
+
+        table = MediaFileTable()
+        with self._lock:
+            for channel in channels:
+                # Stored as condition.Channel, returned as the devices number them
+                rows = self._db.execute(
+                    'SELECT channel - 1, start, end, length, path, type, stream, events '
+                    'FROM files WHERE device = ? AND channel = ? AND start >= ? '
+                    'AND start < ? AND end > ? ORDER BY start',
+                    (device, channel, start - self._longest_file(device, channel),
+                     end, start))
+                for row in rows:
+                    *fields, events = row
+                    table._append(*fields, events.split('|') if events else ())
+        return table
+
+    def stale(
+        self, device: str, channels: Iterable[int], start: Time, end: Time,
+        max_age: float = None
+    ) -> List[Tuple[int, int, int]]:
+        # (channel, start, end) windows to fetch before answering [start,
+        # end) locally: never synced, older than the first sync, or past the
+        # last sync when it is older than max_age
+        max_age = self.max_age if max_age is None else max_age
+        start, end = to_epoch(start), to_epoch(end)
+        now = to_epoch(datetime.now())
+        windows = []
+        for channel in channels:
+            synced = self._synced(device, channel)
+            if synced is None:
+                windows.append((channel, min(start, now - int(self.history.total_seconds())),
+                                max(end, now)))
+                continue
+            synced_from, synced_until, synced_at = synced
+            if start < synced_from:
+                windows.append((channel, start, synced_from))
+            if end > synced_until and time.time() - synced_at > max_age:
+                windows.append((channel, synced_until - self.overlap, max(end, now)))
+        return windows
+
+    def prune(self, before: Time, api: Union[IntelbrasAPI, str] = None) -> int:
+        # Drop files that ended before the given time, e.g. past the
+        # retention of the devices
+        before = to_epoch(before)
+        with self._lock, self._db:
+            if api is None:
+                cursor = self._db.execute('DELETE FROM files WHERE end < ?', (before,))
+            else:
+                device = api if isinstance(api, str) else api.server
+                cursor = self._db.execute(
+                    'DELETE FROM files WHERE device = ? AND end < ?', (device, before))
+            return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM files').fetchone()[0]
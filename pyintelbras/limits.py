@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Tuple
+
+from .exceptions import IntelbrasAPIException
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Answers of an overloaded device
+OVERLOAD_STATUS = frozenset((429, 500, 502, 503, 504))
+
+
+class _HostState:
+    def __init__(self, rate: float, limit: float) -> None:
+        self.rate = rate
+        self.limit = limit
+        self.tokens = max(rate, 1.0)
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.slow_start = True
+        # No new decrease until the requests sent before the last one end
+        self.hold_until = 0.0
+        # Requests stop until then, from Retry-After
+        self.paused_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+
+class Permit:
+    # One admitted request, release it with its outcome
+    __slots__ = ('limiter', 'host', 'started', '_released')
+
+    def __init__(self, limiter: "RateLimiter", host: str) -> None:
+        self.limiter = limiter
+        self.host = host
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self, status: int = None, error: bool = False,
+                retry_after: float = None) -> None:
+        # status of the response, or error when the request failed to get
+        # one (connection dropped, timeout)
+        if self._released:
+            return
+        self._released = True
+        self.limiter._release(
+            self.host, time.monotonic() - self.started,
+            error or status in OVERLOAD_STATUS, retry_after)
+
+
+class RateLimiter:
+    # Token bucket plus a cap of requests in flight, kept per host and
+    # adjusted from what the device answers (AIMD): every success slowly
+    # raises the rate and the in flight cap, an overload answer (503, ...),
+    # a dropped connection or a latency above target_latency halves the
+    # cap, or the rate once the cap is at min_in_flight.
+    # Pass the same limiter to every client of a host, the state is shared
+    # by all of them and by their threads:
+    #
+    #   limiter = RateLimiter(rate=10, max_in_flight=4)
+    #   a = IntelbrasAPI('10.0.0.1', 'admin', 'pass', limiter=limiter)
+    #   b = IntelbrasAPI('10.0.0.1', 'viewer', 'pass', limiter=limiter)
+    #
+    # rate is the starting number of requests per second, it moves between
+    # min_rate and max_rate; the in flight cap moves between min_in_flight
+    # and max_in_flight, starting at the latter. wait_timeout bounds how
+    # long a request waits for its turn.
+    def __init__(
+        self, rate: float = 10.0, max_in_flight: int = 4,
+        min_rate: float = 0.5, max_rate: float = 50.0,
+        min_in_flight: int = 1, target_latency: float = 2.0,
+        backoff: float = 0.5, wait_timeout: float = None
+    ) -> None:
+        if not 0 < min_rate <= rate <= max_rate:
+            raise IntelbrasAPIException('Invalid rate, expected min_rate <= rate <= max_rate')
+        if not 0 < min_in_flight <= max_in_flight:
+            raise IntelbrasAPIException('Invalid in flight cap')
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.min_in_flight = min_in_flight
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.wait_timeout = wait_timeout
+        self._hosts: Dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def acquire(self, host: str, timeout: float = None) -> Permit:
+        # Block until the host admits one more request
+        timeout = self.wait_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                permit, delay = self._try_acquire(host)
+                if permit is not None:
+                    return permit
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise IntelbrasAPIException(
+                            f'Rate limit wait timeout for {host}')
+                    delay = remaining if delay is None else min(delay, remaining)
+                # Woken early when a request in flight is released
+                self._released.wait(delay)
+
+    async def acquire_async(self, host: str, timeout: float = None) -> Permit:
+        # acquire for asyncio, waits without blocking the event loop
+        timeout = self.wait_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                permit, delay = self._try_acquire(host)
+            if permit is not None:
+                return permit
+            if deadline is not None and time.monotonic() >= deadline:
+                raise IntelbrasAPIException(f'Rate limit wait timeout for {host}')
+            # Releases are not signaled to the loop, poll for them
+            await asyncio.sleep(0.01 if delay is None else min(delay, 0.05))
+
+    def _try_acquire(self, host: str) -> Tuple[Permit, float]:
+        # Under self._lock. Returns a permit, or how long to wait for a
+        # token (None when waiting on the in flight cap).
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.rate, self.max_in_flight)
+        now = time.monotonic()
+        if now < state.paused_until:
+            return None, state.paused_until - now
+
+        state.tokens = min(max(state.rate, 1.0),
+                           state.tokens + (now - state.updated) * state.rate)
+        state.updated = now
+        if state.in_flight >= int(state.limit):
+            return None, None
+        if state.tokens < 1.0:
+            return None, (1.0 - state.tokens) / state.rate
+
+        state.tokens -= 1.0
+        state.in_flight += 1
+        state.requests += 1
+        return Permit(self, host), 0.0
+
+    def _release(self, host: str, latency: float, error: bool,
+                 retry_after: float = None) -> None:
+        with self._lock:
+            state = self._hosts[host]
+            state.in_flight -= 1
+            now = time.monotonic()
+            if error or latency > self.target_latency:
+                if error:
+                    state.errors += 1
+                if retry_after:
+                    state.paused_until = max(state.paused_until, now + retry_after)
+                if now >= state.hold_until:
+                    # Fewer requests at once first, then fewer per second
+                    state.slow_start = False
+                    if int(state.limit) > self.min_in_flight:
+                        state.limit = max(self.min_in_flight, state.limit * self.backoff)
+                    else:
+                        state.rate = max(self.min_rate, state.rate * self.backoff)
+                        state.tokens = min(state.tokens, 0.0)
+                    state.hold_until = now + max(latency, 1.0 / state.rate)
+                    logger.debug(
+                        f'Throttling {host}: {state.rate:.2f} req/s, '
+                        f'{int(state.limit)} in flight')
+            else:
+                # Until the first overload the rate doubles every round of
+                # requests (slow start), then it grows +1/s per round, at
+                # most +10%/s. The cap grows +1 per round.
+                step = 1.0 if state.slow_start else max(0.1, 1.0 / state.rate)
+                state.rate = min(self.max_rate, state.rate + step)
+                state.limit = min(self.max_in_flight, state.limit + 1.0 / state.limit)
+            self._released.notify_all()
+
+    def stats(self, host: str) -> dict:
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                return {'rate': self.rate, 'in_flight_limit': self.max_in_flight,
+                        'in_flight': 0, 'requests': 0, 'errors': 0}
+            return {'rate': state.rate, 'in_flight_limit': int(state.limit),
+                    'in_flight': state.in_flight, 'requests': state.requests,
+                    'errors': state.errors}
+
+    def reset(self, host: str = None) -> None:
+        # Forget the learned limits of one host, or of all
+        with self._lock:
+            if host is None:
+                self._hosts.clear()
+            else:
+                self._hosts.pop(host, None)
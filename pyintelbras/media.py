@@ -0,0 +1,259 @@
+import calendar
+import csv
+import json
+import time
+from array import array
+from datetime import datetime, timedelta
+from functools import lru_cache
+from sys import intern
+from typing import IO, Iterable, Iterator, List, Tuple, Union
+
+from .exceptions import IntelbrasAPIException
+from .helpers import _DATETIME
+
+_EPOCH = datetime(1970, 1, 1)
+# Columns exported by to_csv and to_jsonl
+FIELDS = ('Channel', 'StartTime', 'EndTime', 'Length', 'FilePath', 'Type',
+          'VideoStream', 'Events')
+
+# Position in a row of the fields read from findNextFile
+_SLOTS = {field: slot for slot, field in enumerate(FIELDS[:-1])}
+
+
+def to_epoch(value: Union[datetime, str, int]) -> int:
+    # Device times carry no timezone, they are kept as seconds since
+    # 1970-01-01 in the device local time
+    if isinstance(value, int):
+        return value
+    if isinstance(value, datetime):
+        return calendar.timegm(value.timetuple())
+    match = _DATETIME.fullmatch(value.strip())
+    if not match:
+        raise IntelbrasAPIException(f'Parser Response Error: {value} is not a datetime')
+    year, month, day, hour, minute, second = match.groups()
+    return (_day_epoch(year, month, day)
+            + int(hour) * 3600 + int(minute) * 60 + int(second))
+
+
+@lru_cache(maxsize=4096)
+def _day_epoch(year: str, month: str, day: str) -> int:
+    # Listings cover few days, each one is converted once
+    return calendar.timegm((int(year), int(month), int(day), 0, 0, 0))
+
+
+def from_epoch(value: int) -> datetime:
+    return _EPOCH + timedelta(seconds=value)
+
+
+def _format_epoch(value: int) -> str:
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(value))
+
+
+class MediaFile:
+    # One row of a MediaFileTable, built only when accessed
+    __slots__ = ('channel', 'start', 'end', 'length', 'path', 'type',
+                 'stream', 'events')
+
+    def __init__(self, channel: int, start: int, end: int, length: int,
+                 path: str, type: str, stream: str, events: Tuple[str, ...]):
+        self.channel = channel
+        self.start = start
+        self.end = end
+        self.length = length
+        self.path = path
+        self.type = type
+        self.stream = stream
+        self.events = events
+
+    @property
+    def start_time(self) -> datetime:
+        return None if self.start is None else from_epoch(self.start)
+
+    @property
+    def end_time(self) -> datetime:
+        return None if self.end is None else from_epoch(self.end)
+
+    def to_dict(self) -> dict:
+        # Same keys and types as the items of find_media_files
+        item = {'Channel': self.channel, 'StartTime': self.start_time,
+                'EndTime': self.end_time, 'Length': self.length,
+                'FilePath': self.path, 'Type': self.type,
+                'VideoStream': self.stream, 'Events': list(self.events)}
+        return {k: v for k, v in item.items() if v is not None and v != []}
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, MediaFile):
+            return NotImplemented
+        return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    def __repr__(self) -> str:
+        return (f'MediaFile(channel={self.channel}, start={self.start_time}, '
+                f'path={self.path!r})')
+
+
+class MediaFileTable:
+    # Compact, column oriented list of media files, for listings too large
+    # for one dict per item. Times, channels and sizes are kept in typed
+    # arrays (8 bytes per value) and strings are interned, so repeated
+    # values (type, stream, events) are stored once:
+    #
+    #   table = intelbras.find_media_table(params)
+    #   night = table.filter(start=datetime(2024, 8, 28, 0), end=datetime(2024, 8, 28, 6),
+    #                        channels=[1, 2])
+    #   with open('night.csv', 'w', newline='') as f:
+    #       night.to_csv(f)
+    #
+    # Only the fields in FIELDS are kept.
+    def __init__(self) -> None:
+        self.channel = array('q')
+        self.start = array('q')
+        self.end = array('q')
+        self.length = array('q')
+        self.path: List[str] = []
+        self.type: List[str] = []
+        self.stream: List[str] = []
+        self.events: List[Tuple[str, ...]] = []
+        self._tuples = {(): ()}
+
+    @classmethod
+    def from_items(cls, items: Iterable[dict]) -> "MediaFileTable":
+        # From parsed items, e.g. find_media_files()['items']
+        table = cls()
+        for item in items:
+            table.append(item)
+        return table
+
+    def append(self, item: dict) -> None:
+        self._append(
+            item.get('Channel'), item.get('StartTime'), item.get('EndTime'),
+            item.get('Length'), item.get('FilePath'), item.get('Type'),
+            item.get('VideoStream'), item.get('Events') or ())
+
+    def _append(self, channel, start, end, length, path, type, stream, events) -> None:
+        # Missing numbers are stored as -1
+        self.channel.append(-1 if channel is None else int(channel))
+        self.start.append(-1 if start is None else to_epoch(start))
+        self.end.append(-1 if end is None else to_epoch(end))
+        self.length.append(-1 if length is None else int(length))
+        self.path.append(path)
+        self.type.append(None if type is None else intern(type))
+        self.stream.append(None if stream is None else intern(stream))
+        events = tuple(intern(str(e)) for e in events)
+        self.events.append(self._tuples.setdefault(events, events))
+
+    def extend_response(self, text: str) -> int:
+        # Append the items of a findNextFile response body, read straight
+        # from its lines without building the nested dicts. Returns found.
+        found = 0
+        row = None
+        index = None
+        try:
+            for line in text.splitlines():
+                key, sep, value = line.strip().partition('=')
+                if not sep:
+                    continue
+                value = value.strip()
+                if not key.startswith('items['):
+                    if key == 'found':
+                        found = int(value)
+                    continue
+                close = key.index(']')
+                if key[6:close] != index:
+                    if row is not None:
+                        self._append(*row)
+                    index = key[6:close]
+                    row = [None, None, None, None, None, None, None, []]
+                field = key[close + 2:]
+                slot = _SLOTS.get(field)
+                if slot is not None:
+                    row[slot] = value
+                elif field.startswith('Events['):
+                    row[7].append(value)
+            if row is not None:
+                self._append(*row)
+        except IntelbrasAPIException:
+            raise
+        except Exception as e:
+            raise IntelbrasAPIException(f'Parser Response Error: {e}')
+        return found
+
+    def __len__(self) -> int:
+        return len(self.path)
+
+    def __getitem__(self, index: int) -> MediaFile:
+        return MediaFile(*(self._value(column, index) for column in MediaFile.__slots__))
+
+    def __iter__(self) -> Iterator[MediaFile]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def _value(self, column: str, index: int):
+        value = getattr(self, column)[index]
+        if value == -1 and column in ('channel', 'start', 'end', 'length'):
+            return None
+        return value
+
+    def indexes(
+        self, start: Union[datetime, str, int] = None,
+        end: Union[datetime, str, int] = None,
+        channels: Iterable[int] = None
+    ) -> List[int]:
+        # Rows of files overlapping [start, end) on the given channels, in
+        # one pass over the columns. Missing times (-1) are open ended: a
+        # row without an end overlaps everything after its start, so the
+        # rows of files still being recorded are kept.
+        low = -1 if start is None else to_epoch(start)
+        high = 2 ** 63 - 1 if end is None else to_epoch(end)
+        rows = zip(self.start, self.end)
+        if channels is None:
+            return [i for i, (s, e) in enumerate(rows) if (e > low or e == -1) and s < high]
+        channels = set(channels)
+        return [i for i, (s, e, c) in enumerate(zip(self.start, self.end, self.channel))
+                if (e > low or e == -1) and s < high and c in channels]
+
+    def filter(
+        self, start: Union[datetime, str, int] = None,
+        end: Union[datetime, str, int] = None,
+        channels: Iterable[int] = None
+    ) -> "MediaFileTable":
+        return self.take(self.indexes(start, end, channels))
+
+    def take(self, indexes: Iterable[int]) -> "MediaFileTable":
+        # New table with the given rows, sharing the interned values
+        indexes = list(indexes)
+        table = MediaFileTable()
+        table._tuples = self._tuples
+        for column in MediaFile.__slots__:
+            source = getattr(self, column)
+            getattr(table, column).extend([source[i] for i in indexes])
+        return table
+
+    def total_length(self) -> int:
+        return sum(length for length in self.length if length > 0)
+
+    def rows(self) -> Iterator[Tuple]:
+        # Rows in FIELDS order, with times as strings, as exported
+        for channel, start, end, length, path, type, stream, events in zip(
+                self.channel, self.start, self.end, self.length, self.path,
+                self.type, self.stream, self.events):
+            yield (None if channel == -1 else channel,
+                   None if start == -1 else _format_epoch(start),
+                   None if end == -1 else _format_epoch(end),
+                   None if length == -1 else length,
+                   path, type, stream, list(events))
+
+    def to_csv(self, f: IO[str], header: bool = True) -> None:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(FIELDS)
+        for row in self.rows():
+            writer.writerow(row[:-1] + ('|'.join(row[-1]),))
+
+    def to_jsonl(self, f: IO[str]) -> None:
+        encode = json.JSONEncoder(separators=(',', ':')).encode
+        for row in self.rows():
+            f.write(encode({k: v for k, v in zip(FIELDS, row) if v is not None}))
+            f.write('\n')
+
+    def __repr__(self) -> str:
+        return f'MediaFileTable({len(self)} files)'
@@ -0,0 +1,266 @@
+import bisect
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Upper bounds in seconds, as the Prometheus client defaults
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PHASES = ('connect', 'auth', 'ttfb', 'transfer', 'parse')
+
+
+class RequestEvent(NamedTuple):
+    # One do_request call, passed to the hooks of the client. Times are in
+    # seconds: connect covers DNS and TCP/TLS setup (0 on a pooled
+    # connection), auth the digest challenge round-trips, ttfb the wait for
+    # the response headers and transfer the body download (0 for streamed
+    # responses, read later by the caller).
+    host: str
+    endpoint: str
+    method: str
+    status: Optional[int]
+    elapsed: float
+    connect: float = 0.0
+    auth: float = 0.0
+    ttfb: float = 0.0
+    transfer: float = 0.0
+    bytes_received: Optional[int] = None
+    retries: int = 0
+    challenges: int = 0
+    cached: bool = False
+    error: Optional[Exception] = None
+
+
+class ParseEvent(NamedTuple):
+    # Parsing of a response body by the helpers of the client
+    host: str
+    endpoint: str
+    elapsed: float
+    size: int
+
+
+def endpoint_label(path: str, params: dict) -> str:
+    # Method chain and action, e.g. configManager.getConfig
+    action = params.get('action')
+    return f'{path}.{action}' if action else path
+
+
+# Connection setup time of the requests running in each thread
+_connect = threading.local()
+
+
+def _take_connect_time() -> float:
+    value = getattr(_connect, 'seconds', 0.0)
+    _connect.seconds = 0.0
+    return value
+
+
+class _TimedConnection:
+    def connect(self) -> None:
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect.seconds = (getattr(_connect, 'seconds', 0.0)
+                                + time.perf_counter() - start)
+
+
+class _TimedHTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    # HTTPAdapter whose connections record how long they took to open
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS) -> None:
+        self.buckets = buckets
+        # Last count is for values above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Estimated by linear interpolation inside the bucket, as
+        # Prometheus histogram_quantile does
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                low = self.buckets[i - 1] if i else 0.0
+                return low + (self.buckets[i] - low) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+
+class _Series:
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.elapsed = Histogram(buckets)
+        self.phases = {phase: Histogram(buckets) for phase in PHASES}
+        self.statuses = Counter()
+        self.errors = 0
+        self.retries = 0
+        self.challenges = 0
+        self.cached = 0
+        self.bytes = 0
+
+
+class Metrics:
+    # Hook aggregating the events of any number of clients into latency
+    # histograms and counters per device and endpoint:
+    #
+    #   metrics = Metrics()
+    #   intelbras = IntelbrasAPI(server, user, password, hooks=[metrics])
+    #   ...
+    #   for row in metrics.summary()[:5]:
+    #       print(row['host'], row['endpoint'], row['p95'])
+    #   text = metrics.prometheus()
+    def __init__(self, buckets: Iterable[float] = BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event) -> None:
+        with self._lock:
+            key = (event.host, event.endpoint)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.buckets)
+            if isinstance(event, ParseEvent):
+                series.phases['parse'].observe(event.elapsed)
+                return
+            if event.cached:
+                series.cached += 1
+                return
+            series.elapsed.observe(event.elapsed)
+            if event.error is not None:
+                series.errors += 1
+            else:
+                series.statuses[event.status] += 1
+                for phase in PHASES[:-1]:
+                    series.phases[phase].observe(getattr(event, phase))
+            series.retries += event.retries
+            series.challenges += event.challenges
+            series.bytes += event.bytes_received or 0
+
+    def summary(self) -> List[dict]:
+        # One row per device and endpoint, slowest (by total time) first
+        with self._lock:
+            rows = []
+            for (host, endpoint), series in self._series.items():
+                elapsed = series.elapsed
+                rows.append({
+                    'host': host, 'endpoint': endpoint,
+                    'requests': elapsed.count, 'errors': series.errors,
+                    'retries': series.retries, 'challenges': series.challenges,
+                    'cached': series.cached, 'bytes': series.bytes,
+                    'total': elapsed.sum, 'mean': elapsed.mean,
+                    'p50': elapsed.quantile(0.5), 'p95': elapsed.quantile(0.95),
+                    'p99': elapsed.quantile(0.99),
+                    **{phase: series.phases[phase].mean for phase in PHASES},
+                })
+        return sorted(rows, key=lambda row: row['total'], reverse=True)
+
+    def prometheus(self, prefix: str = 'pyintelbras') -> str:
+        # Metrics in the Prometheus text exposition format
+        lines = []
+        with self._lock:
+            series = sorted(self._series.items())
+            lines += [f'# HELP {prefix}_request_duration_seconds Duration of the requests to the devices.',
+                      f'# TYPE {prefix}_request_duration_seconds histogram']
+            for (host, endpoint), s in series:
+                lines += _histogram_lines(
+                    f'{prefix}_request_duration_seconds',
+                    _labels(host=host, endpoint=endpoint), s.elapsed)
+            lines += [f'# HELP {prefix}_request_phase_seconds Duration of each phase of the requests.',
+                      f'# TYPE {prefix}_request_phase_seconds histogram']
+            for (host, endpoint), s in series:
+                for phase in PHASES:
+                    if s.phases[phase].count:
+                        lines += _histogram_lines(
+                            f'{prefix}_request_phase_seconds',
+                            _labels(host=host, endpoint=endpoint, phase=phase),
+                            s.phases[phase])
+            lines += [f'# HELP {prefix}_requests_total Responses by status.',
+                      f'# TYPE {prefix}_requests_total counter']
+            for (host, endpoint), s in series:
+                for status, count in sorted(s.statuses.items()):
+                    lines.append(f'{prefix}_requests_total'
+                                 f'{_labels(host=host, endpoint=endpoint, status=status)} {count}')
+            for name, attr, help in (
+                    ('request_errors_total', 'errors', 'Requests failed without a response.'),
+                    ('retries_total', 'retries', 'Requests retried.'),
+                    ('auth_challenges_total', 'challenges', 'Digest challenges answered.'),
+                    ('cache_hits_total', 'cached', 'Requests served by the cache.'),
+                    ('received_bytes_total', 'bytes', 'Response bytes received.')):
+                lines += [f'# HELP {prefix}_{name} {help}',
+                          f'# TYPE {prefix}_{name} counter']
+                for (host, endpoint), s in series:
+                    lines.append(f'{prefix}_{name}'
+                                 f'{_labels(host=host, endpoint=endpoint)} {getattr(s, attr)}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+def _labels(**labels) -> str:
+    values = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+    return f'{{{values}}}'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(name: str, labels: str, histogram: Histogram) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{labels[:-1]},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{labels[:-1]},le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{labels} {histogram.sum}')
+    lines.append(f'{name}_count{labels} {histogram.count}')
+    return lines
@@ -0,0 +1,175 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+
+from .exceptions import CircuitOpenError, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+Timeout = Union[float, Tuple[float, float]]
+
+# time.monotonic() by which the operation running in this thread or task
+# must end, None without deadline
+_deadline: ContextVar[Optional[float]] = ContextVar('pyintelbras_deadline', default=None)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    # Time budget of every request made in the block, by any client:
+    #
+    #   with deadline(30):
+    #       intelbras.find_media_files(params)
+    #
+    # Each request timeout is cut to the time left, and requests past the
+    # deadline raise DeadlineExceeded. Nested deadlines can only shorten the
+    # budget; None lifts it inside the block, e.g. for cleanup requests.
+    # Threads and tasks started in the block do not inherit it unless run
+    # in a copy of the context (contextvars.copy_context).
+    if seconds is None:
+        value = None
+    else:
+        value = time.monotonic() + seconds
+        outer = _deadline.get()
+        if outer is not None:
+            value = min(value, outer)
+    token = _deadline.set(value)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    # Seconds left before the current deadline, None without deadline
+    value = _deadline.get()
+    if value is None:
+        return None
+    return value - time.monotonic()
+
+
+def budget_timeout(timeout: Timeout, url: str = '') -> Timeout:
+    # timeout cut to the time left before the deadline
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded(f'Deadline exceeded before requesting {url}')
+    if timeout is None:
+        return left
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return (min(connect, left) if connect is not None else left,
+                min(read, left) if read is not None else left)
+    return min(timeout, left)
+
+
+class RetryPolicy:
+    # Retries of idempotent reads (get* and find* actions, e.g. getConfig
+    # and findNextFile) failed by a dropped connection, a timeout or one of
+    # statuses. Writes such as setConfig are never retried. The waits use
+    # full jitter: random between 0 and backoff * 2 ** retry, at most
+    # max_backoff, so clients hit by the same outage do not retry in step.
+    # actions adds actions to retry, e.g. 'factory.create'.
+    def __init__(
+        self, attempts: int = 3, backoff: float = 0.5,
+        max_backoff: float = 10.0,
+        statuses: Iterable[int] = (502, 503, 504),
+        actions: Iterable[str] = ()
+    ) -> None:
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = frozenset(statuses)
+        self.actions = frozenset(actions)
+
+    def retryable(self, method: str, action: str) -> bool:
+        return method == 'GET' and (
+            action.startswith(('get', 'find')) or action in self.actions)
+
+    def delay(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** retry))
+
+
+class _Circuit:
+    def __init__(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        # Start of the request probing a half open circuit
+        self.probing = None
+
+
+class CircuitBreaker:
+    # Per host breaker: after failure_threshold failures in a row (dropped
+    # connections, timeouts, 502/503/504) the host is considered down and
+    # its requests raise CircuitOpenError without touching the network.
+    # After reset_timeout seconds one request is let through; its success
+    # closes the circuit, its failure opens it again. Share one breaker
+    # between the clients of a fleet like a RateLimiter.
+    def __init__(
+        self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+        statuses: Iterable[int] = (502, 503, 504)
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.statuses = frozenset(statuses)
+        self._circuits: Dict[str, _Circuit] = {}
+        self._lock = threading.Lock()
+
+    def before(self, host: str) -> None:
+        # Raises CircuitOpenError when the request must not be sent
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit.opened_at is None:
+                return
+            now = time.monotonic()
+            wait = circuit.opened_at + self.reset_timeout - now
+            # A probe that never reported back expires like the circuit
+            if wait > 0 or (circuit.probing is not None
+                            and now - circuit.probing < self.reset_timeout):
+                raise CircuitOpenError(
+                    f'Circuit open for {host} after {circuit.failures} failures'
+                    + (f', retrying in {wait:.1f}s' if wait > 0 else ''))
+            # Half open, this request probes the host
+            circuit.probing = now
+
+    def record(self, host: str, failed: bool) -> None:
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None:
+                if not failed:
+                    return
+                circuit = self._circuits[host] = _Circuit()
+            circuit.probing = None
+            if not failed:
+                circuit.failures = 0
+                circuit.opened_at = None
+                return
+            circuit.failures += 1
+            if circuit.opened_at is not None or circuit.failures >= self.failure_threshold:
+                if circuit.opened_at is None:
+                    logger.debug(f'Opening circuit for {host}')
+                circuit.opened_at = time.monotonic()
+
+    def failed(self, status: int = None, error: bool = False) -> bool:
+        return error or status in self.statuses
+
+    def state(self, host: str) -> str:
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit.opened_at is None:
+                return 'closed'
+            if time.monotonic() - circuit.opened_at < self.reset_timeout:
+                return 'open'
+            return 'half-open'
+
+    def reset(self, host: str = None) -> None:
+        with self._lock:
+            if host is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(host, None)
@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, NamedTuple, Tuple, Union
+from urllib.parse import urlparse
+
+from .api import IntelbrasAPI
+from .exceptions import IntelbrasAPIException
+from .fleet import DeviceFleet
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+class Snapshot(NamedTuple):
+    device: IntelbrasAPI
+    channel: int
+    timestamp: float
+    data: bytes
+    digest: bytes
+
+
+class DirectorySink:
+    # Writes each snapshot as <dest>/<host>/<channel>/<timestamp>.jpg, or
+    # only <dest>/<host>/<channel>.jpg when latest_only is set (e.g. for a
+    # wall mosaic that always shows the last frame)
+    def __init__(self, dest: str, latest_only: bool = False):
+        self.dest = dest
+        self.latest_only = latest_only
+
+    def __call__(self, snapshot: Snapshot) -> None:
+        host = urlparse(snapshot.device.server).netloc.replace(':', '_')
+        if self.latest_only:
+            directory = os.path.join(self.dest, host)
+            filename = f'{snapshot.channel}.jpg'
+        else:
+            directory = os.path.join(self.dest, host, str(snapshot.channel))
+            filename = f'{snapshot.timestamp:.3f}.jpg'
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, filename)
+        # Write then rename, readers never see a partial image
+        with open(f'{path}.tmp', 'wb') as f:
+            f.write(snapshot.data)
+        os.replace(f'{path}.tmp', path)
+
+
+class QueueSink:
+    # Hands snapshots to a consumer thread. With a bounded queue and
+    # block=False, frames are dropped instead of stalling the capture.
+    def __init__(self, q: queue.Queue = None, block: bool = False):
+        self.queue = q if q is not None else queue.Queue(maxsize=1024)
+        self.block = block
+        self.dropped = 0
+
+    def __call__(self, snapshot: Snapshot) -> None:
+        try:
+            self.queue.put(snapshot, block=self.block)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RingBufferSink:
+    # Keeps the last size snapshots of each (device, channel) in memory
+    def __init__(self, size: int = 1):
+        self.size = size
+        self.buffers: Dict[Tuple[str, int], deque] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, snapshot: Snapshot) -> None:
+        key = (snapshot.device.server, snapshot.channel)
+        with self._lock:
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                buffer = self.buffers[key] = deque(maxlen=self.size)
+            buffer.append(snapshot)
+
+    def latest(self, device: IntelbrasAPI, channel: int) -> Snapshot:
+        buffer = self.buffers.get((device.server, channel))
+        return buffer[-1] if buffer else None
+
+
+class SnapshotPipeline:
+    # Captures snapshots of many channels and devices concurrently, at most
+    # once every interval seconds, and sends the changed frames to sink.
+    # Frames whose content hash equals the previous one of the same channel
+    # are skipped.
+    #
+    #   pipeline = SnapshotPipeline(fleet, DirectorySink('/srv/wall', latest_only=True),
+    #                               interval=5)
+    #   pipeline.run()
+    def __init__(
+        self, devices: Union[IntelbrasAPI, DeviceFleet, Iterable[IntelbrasAPI]],
+        sink: Callable[[Snapshot], None],
+        channels: Union[Iterable[int], Dict[IntelbrasAPI, Iterable[int]]] = None,
+        interval: float = 5.0, max_workers: int = 32, per_device: int = 4,
+        snapshot_type: int = 0, dedup: bool = True, timeout: float = 10.0
+    ) -> None:
+        if isinstance(devices, IntelbrasAPI):
+            devices = [devices]
+        self.devices = list(devices)
+        self.sink = sink
+        self.channels = channels
+        self.interval = interval
+        self.max_workers = max_workers
+        self.per_device = per_device
+        self.snapshot_type = snapshot_type
+        self.dedup = dedup
+        self.timeout = timeout
+        self.stats = {'captured': 0, 'unchanged': 0, 'errors': 0}
+        self._digests = {}
+        self._device_channels = {}
+        self._semaphores = {
+            device: threading.BoundedSemaphore(per_device)
+            for device in self.devices}
+        self._executor = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def capture(self) -> List[Snapshot]:
+        # One round over every channel of every device. Returns the changed
+        # snapshots sent to the sink.
+        executor = self._get_executor()
+        futures = [executor.submit(self._capture, device, channel)
+                   for device in self.devices
+                   for channel in self._channels(device)]
+        wait(futures)
+        return [f.result() for f in futures if f.result() is not None]
+
+    def run(self, rounds: int = None) -> None:
+        # Capture every interval seconds until stop() or rounds are done
+        done = 0
+        while not self._stop.is_set() and (rounds is None or done < rounds):
+            start = time.monotonic()
+            self.capture()
+            done += 1
+            elapsed = time.monotonic() - start
+            if elapsed > self.interval:
+                logger.debug(
+                    f'Snapshot round took {elapsed:.2f}s, over the {self.interval}s interval')
+            self._stop.wait(max(0, self.interval - elapsed))
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def close(self) -> None:
+        self.stop()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self) -> "SnapshotPipeline":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='pyintelbras-snapshot')
+        return self._executor
+
+    def _channels(self, device: IntelbrasAPI) -> List[int]:
+        if isinstance(self.channels, dict):
+            return list(self.channels.get(device, ()))
+        if self.channels is not None:
+            return list(self.channels)
+        # All channels of the device, looked up once
+        channels = self._device_channels.get(device)
+        if channels is None:
+            try:
+                channels = list(range(1, len(device.channels) + 1))
+            except Exception as e:
+                logger.debug(f'Failed to list channels of {device.server}: {e!r}')
+                self._count('errors')
+                return []
+            self._device_channels[device] = channels
+        return channels
+
+    def _capture(self, device: IntelbrasAPI, channel: int) -> Snapshot:
+        try:
+            with self._semaphores[device]:
+                response = device.snapshot(
+                    channel=channel, type=self.snapshot_type,
+                    timeout=self.timeout)
+            if response.status_code != 200:
+                raise IntelbrasAPIException(
+                    f'Snapshot failed: {response.status_code} - {response.reason}',
+                    error=response)
+            data = response.content
+        except Exception as e:
+            logger.debug(
+                f'Snapshot of {device.server} channel {channel} failed: {e!r}')
+            self._count('errors')
+            return None
+
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        key = (device, channel)
+        if self.dedup and self._digests.get(key) == digest:
+            self._count('unchanged')
+            return None
+
+        snapshot = Snapshot(device, channel, time.time(), data, digest)
+        try:
+            self.sink(snapshot)
+        except Exception as e:
+            logger.debug(
+                f'Sink failed for {device.server} channel {channel}: {e!r}')
+            self._count('errors')
+            return None
+        # Only a delivered frame counts as the last one, a failed one is
+        # sent again next round
+        self._digests[key] = digest
+        self._count('captured')
+        return snapshot
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
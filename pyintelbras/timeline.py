@@ -0,0 +1,359 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from .media import MediaFileTable, to_epoch, from_epoch
+
+Time = Union[datetime, str, int]
+# (device, channel)
+Key = Tuple[str, int]
+
+
+class Interval(NamedTuple):
+    # Seconds since 1970-01-01 in the device local time, as MediaFileTable
+    start: int
+    end: int
+
+    @property
+    def start_time(self) -> datetime:
+        return from_epoch(self.start)
+
+    @property
+    def end_time(self) -> datetime:
+        return from_epoch(self.end)
+
+    @property
+    def seconds(self) -> int:
+        return self.end - self.start
+
+
+class IntervalSet:
+    # Sorted, disjoint time intervals kept in two typed arrays. Intervals
+    # closer than tolerance seconds are merged, so consecutive recordings
+    # (one ending at 10:29:59, the next starting at 10:30:00) form a single
+    # interval. Lookups are binary searches.
+    def __init__(self, tolerance: int = 0) -> None:
+        self.tolerance = tolerance
+        self.starts = array('q')
+        self.ends = array('q')
+
+    def add(self, start: int, end: int) -> List[Interval]:
+        # Merge [start, end] in, returning the parts it overlaps with the
+        # intervals already in the set
+        if end < start:
+            return []
+        starts, ends = self.starts, self.ends
+        # Intervals from first to last touch [start, end]
+        first = bisect_left(ends, start - self.tolerance)
+        last = bisect_right(starts, end + self.tolerance, first)
+        if first == last:
+            starts.insert(first, start)
+            ends.insert(first, end)
+            return []
+        overlaps = []
+        for i in range(first, last):
+            low, high = max(start, starts[i]), min(end, ends[i])
+            if high > low:
+                overlaps.append(Interval(low, high))
+        starts[first:last] = array('q', (min(start, starts[first]),))
+        ends[first:last] = array('q', (max(end, ends[last - 1]),))
+        return overlaps
+
+    def covers(self, start: int, end: int) -> bool:
+        # Whether [start, end] is inside a single interval
+        i = bisect_right(self.starts, start) - 1
+        return i >= 0 and self.ends[i] >= end
+
+    def intersection(self, start: int, end: int) -> List[Interval]:
+        # Intervals clipped to [start, end]
+        starts, ends = self.starts, self.ends
+        i = bisect_right(ends, start)
+        clipped = []
+        while i < len(starts) and starts[i] < end:
+            clipped.append(Interval(max(start, starts[i]), min(end, ends[i])))
+            i += 1
+        return clipped
+
+    def gaps(self, start: int, end: int) -> List[Interval]:
+        # Parts of [start, end] outside the intervals, longer than tolerance
+        gaps = []
+        cursor = start
+        for interval in self.intersection(start, end):
+            if interval.start - cursor > self.tolerance:
+                gaps.append(Interval(cursor, interval.start))
+            cursor = interval.end
+        if end - cursor > self.tolerance:
+            gaps.append(Interval(cursor, end))
+        return gaps
+
+    def covered_seconds(self, start: int, end: int) -> int:
+        return sum(i.seconds for i in self.intersection(start, end))
+
+    def prune(self, before: int) -> None:
+        # Forget the time before before, e.g. recordings overwritten by
+        # the device
+        i = bisect_right(self.ends, before)
+        del self.starts[:i]
+        del self.ends[:i]
+        if self.starts and self.starts[0] < before:
+            self.starts[0] = before
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self) -> Iterator[Interval]:
+        return map(Interval, self.starts, self.ends)
+
+    def __repr__(self) -> str:
+        return f'IntervalSet({len(self)} intervals)'
+
+
+class _Files:
+    # Intervals of the distinct recording files of one channel, sorted by
+    # start, by file (its FilePath, or its start and end without one)
+    def __init__(self) -> None:
+        self.starts = array('q')
+        self.ends = array('q')
+        self.ids: List[Hashable] = []
+        self.by_id: Dict[Hashable, int] = {}
+        self.longest = 0
+
+    def get(self, file: Hashable) -> Optional[Interval]:
+        i = self._find(file)
+        return None if i is None else Interval(self.starts[i], self.ends[i])
+
+    def _find(self, file: Hashable) -> Optional[int]:
+        start = self.by_id.get(file)
+        if start is None:
+            return None
+        i = bisect_left(self.starts, start)
+        while self.ids[i] != file:
+            i += 1
+        return i
+
+    def add(self, file: Hashable, start: int, end: int) -> None:
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, file)
+        self.by_id[file] = start
+        self.longest = max(self.longest, end - start)
+
+    def remove(self, file: Hashable) -> None:
+        i = self._find(file)
+        del self.starts[i], self.ends[i], self.ids[i], self.by_id[file]
+
+    def overlaps(self, file: Hashable, start: int, end: int) -> List[Interval]:
+        # Parts of [start, end] recorded by the other files
+        overlaps = []
+        i = bisect_left(self.starts, start - self.longest)
+        while i < len(self.starts) and self.starts[i] < end:
+            low, high = max(start, self.starts[i]), min(end, self.ends[i])
+            if high > low and self.ids[i] != file:
+                overlaps.append(Interval(low, high))
+            i += 1
+        return overlaps
+
+    def all_overlaps(self) -> Iterator[Interval]:
+        # Time recorded by two files or more, in one sweep
+        reach = None
+        for start, end in zip(self.starts, self.ends):
+            if reach is not None and min(end, reach) > start:
+                yield Interval(start, min(end, reach))
+            reach = end if reach is None else max(reach, end)
+
+    def prune(self, before: int) -> None:
+        # Forget the files ending before before, the others are kept whole
+        # so adding them again changes nothing
+        keep = [i for i, end in enumerate(self.ends) if end > before]
+        for file, end in zip(self.ids, self.ends):
+            if end <= before:
+                del self.by_id[file]
+        self.starts = array('q', (self.starts[i] for i in keep))
+        self.ends = array('q', (self.ends[i] for i in keep))
+        self.ids = [self.ids[i] for i in keep]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+class Timeline:
+    # Recording coverage per device and channel, built from media file
+    # listings and updated as new batches arrive:
+    #
+    #   timeline = Timeline()
+    #   timeline.add_table(intelbras.find_media_table(params), device=intelbras.server)
+    #   timeline.covered(datetime(2024, 8, 27, 8), datetime(2024, 8, 27, 18))
+    #   # [('http://10.0.0.1', 0), ('http://10.0.0.1', 2), ...]
+    #   for (device, channel), gaps in timeline.gaps(start, end).items():
+    #       ...
+    #
+    # Channels are keyed as in the listings (the devices number them from
+    # 0). Files closer than tolerance seconds count as continuous, and
+    # distinct files overlapping each other (the same time recorded twice)
+    # are reported by overlaps. A file added again, e.g. by a re-sync or
+    # because its recording went on, replaces its earlier interval; files
+    # are told apart by FilePath, or by start and end without one. Queries
+    # accept datetimes, device time strings
+    # or epoch seconds, and take the device and channels to look at, all
+    # known ones by default.
+    def __init__(self, tolerance: int = 1) -> None:
+        self.tolerance = tolerance
+        self._coverage: Dict[Key, IntervalSet] = {}
+        self._overlaps: Dict[Key, IntervalSet] = {}
+        self._files: Dict[Key, _Files] = {}
+        self._lock = threading.Lock()
+
+    def add(
+        self, device: str, channel: int, start: Time, end: Time,
+        file: str = None
+    ) -> None:
+        with self._lock:
+            self._add((device, channel), to_epoch(start), to_epoch(end), file)
+
+    def _add(self, key: Key, start: int, end: int, file: Optional[str]) -> None:
+        if end < start:
+            return
+        files = self._files.get(key)
+        if files is None:
+            files = self._files[key] = _Files()
+            self._coverage[key] = IntervalSet(self.tolerance)
+        file = (start, end) if file is None else file
+        known = files.get(file)
+        if known == (start, end):
+            return
+        if known is not None:
+            files.remove(file)
+        files.add(file, start, end)
+        if known is not None and not (start <= known.start and known.end <= end):
+            # Shrunk, the old interval may hold time no file covers now
+            self._rebuild(key)
+            return
+        self._coverage[key].add(start, end)
+        for overlap in files.overlaps(file, start, end):
+            overlaps = self._overlaps.get(key)
+            if overlaps is None:
+                overlaps = self._overlaps[key] = IntervalSet()
+            overlaps.add(*overlap)
+
+    def _rebuild(self, key: Key) -> None:
+        files = self._files[key]
+        coverage = self._coverage[key] = IntervalSet(self.tolerance)
+        for start, end in zip(files.starts, files.ends):
+            coverage.add(start, end)
+        overlaps = IntervalSet()
+        for overlap in files.all_overlaps():
+            overlaps.add(*overlap)
+        self._overlaps.pop(key, None)
+        if overlaps:
+            self._overlaps[key] = overlaps
+
+    def add_items(self, items: Iterable[dict], device: str = '') -> None:
+        # Items of find_media_files or iter_media_files
+        with self._lock:
+            for item in items:
+                start, end = item.get('StartTime'), item.get('EndTime')
+                if item.get('Channel') is not None and start and end:
+                    self._add((device, int(item['Channel'])),
+                              to_epoch(start), to_epoch(end), item.get('FilePath'))
+
+    def add_table(self, table: MediaFileTable, device: str = '') -> None:
+        # Rows of a MediaFileTable, read from its columns
+        with self._lock:
+            for channel, start, end, path in zip(
+                    table.channel, table.start, table.end, table.path):
+                if channel != -1 and start != -1 and end != -1:
+                    self._add((device, channel), start, end, path)
+
+    def keys(self, device: str = None, channels: Iterable[int] = None) -> List[Key]:
+        with self._lock:
+            return self._keys(device, channels)
+
+    def _keys(self, device: Optional[str], channels: Optional[Iterable[int]]) -> List[Key]:
+        if device is not None and channels is not None:
+            # Channels without any recording included
+            return [(device, channel) for channel in channels]
+        channels = None if channels is None else set(channels)
+        return sorted(key for key in self._coverage
+                      if (device is None or key[0] == device)
+                      and (channels is None or key[1] in channels))
+
+    def intervals(self, device: str, channel: int) -> List[Interval]:
+        with self._lock:
+            return list(self._coverage.get((device, channel), ()))
+
+    def covered(
+        self, start: Time, end: Time, device: str = None,
+        channels: Iterable[int] = None
+    ) -> List[Key]:
+        # Device channels with continuous footage from start to end
+        start, end = to_epoch(start), to_epoch(end)
+        with self._lock:
+            return [key for key in self._keys(device, channels)
+                    if key in self._coverage
+                    and self._coverage[key].covers(start, end)]
+
+    def gaps(
+        self, start: Time, end: Time, device: str = None,
+        channels: Iterable[int] = None
+    ) -> Dict[Key, List[Interval]]:
+        # Missing footage between start and end, for the device channels
+        # with any
+        start, end = to_epoch(start), to_epoch(end)
+        gaps = {}
+        with self._lock:
+            for key in self._keys(device, channels):
+                coverage = self._coverage.get(key)
+                if coverage is None:
+                    found = [Interval(start, end)]
+                else:
+                    found = coverage.gaps(start, end)
+                if found:
+                    gaps[key] = found
+        return gaps
+
+    def coverage(
+        self, start: Time, end: Time, device: str = None,
+        channels: Iterable[int] = None
+    ) -> Dict[Key, float]:
+        # Recorded fraction of start to end per device channel
+        start, end = to_epoch(start), to_epoch(end)
+        span = max(end - start, 1)
+        with self._lock:
+            return {key: (self._coverage[key].covered_seconds(start, end) / span
+                          if key in self._coverage else 0.0)
+                    for key in self._keys(device, channels)}
+
+    def overlaps(
+        self, start: Time = None, end: Time = None, device: str = None,
+        channels: Iterable[int] = None
+    ) -> Dict[Key, List[Interval]]:
+        # Time recorded by more than one file, for the device channels
+        # with any
+        start = -2 ** 63 if start is None else to_epoch(start)
+        end = 2 ** 63 - 1 if end is None else to_epoch(end)
+        found = {}
+        with self._lock:
+            for key in self._keys(device, channels):
+                overlaps = self._overlaps.get(key)
+                clipped = overlaps.intersection(start, end) if overlaps else []
+                if clipped:
+                    found[key] = clipped
+        return found
+
+    def prune(self, before: Time) -> None:
+        before = to_epoch(before)
+        with self._lock:
+            for intervals in (self._coverage, self._overlaps, self._files):
+                for key, interval_set in list(intervals.items()):
+                    interval_set.prune(before)
+                    if not interval_set:
+                        del intervals[key]
+
+    def __len__(self) -> int:
+        return len(self._coverage)
+
+    def __repr__(self) -> str:
+        return f'Timeline({len(self)} channels)'
@@ -29,6 +29,9 @@ setup(
         'requests',
         'urllib3',
     ],
+    extras_require={
+        'async': ['aiohttp'],
+    },
     classifiers=[
         'Environment :: Web Environment',
         'Intended Audience :: Developers',
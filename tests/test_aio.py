@@ -0,0 +1,182 @@
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
+from pyintelbras.exceptions import IntelbrasAPIException
+from pyintelbras.metrics import RequestEvent, ParseEvent
+from pyintelbras.retry import RetryPolicy
+
+try:
+    import aiohttp
+    from pyintelbras.aio import AsyncIntelbrasAPI
+except ImportError:
+    aiohttp = None
+
+
+def mock_response(text='', status=200, headers=None):
+    response = MagicMock()
+    response.status = status
+    response.headers = headers or {}
+    response.text = AsyncMock(return_value=text)
+    return response
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class TestAsyncIntelbrasAPI(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.api = AsyncIntelbrasAPI(server='http://localhost',
+                                     user='user', password='pass')
+
+    async def asyncTearDown(self):
+        await self.api.close()
+
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_request_url_mounting(self, mock_send):
+        mock_send.return_value = mock_response()
+        await self.api.configManager(action='getConfig', name='ChannelTitle')
+        self.assertEqual(self.api.last_request_url,
+                         'http://localhost/cgi-bin/configManager.cgi?action=getConfig&name=ChannelTitle')
+
+        await self.api.api.LogicDeviceManager.getCameraState.post(
+            body={'uniqueChannels': [-1]})
+        self.assertEqual(mock_send.call_args.args[0], 'POST')
+        self.assertEqual(self.api.last_request_url,
+                         'http://localhost/cgi-bin/api/LogicDeviceManager/getCameraState.cgi')
+
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_digest_challenge(self, mock_send):
+        challenge = mock_response(status=401, headers={
+            'WWW-Authenticate': 'Digest realm="r", qop="auth", nonce="abc"'})
+        mock_send.side_effect = [challenge, mock_response(),
+                                 mock_response()]
+
+        response = await self.api.configManager(action='getConfig')
+        self.assertEqual(response.status, 200)
+        self.assertNotIn('Authorization', mock_send.call_args_list[0].args[2])
+        self.assertIn('nonce="abc"',
+                      mock_send.call_args_list[1].args[2]['Authorization'])
+
+        # The nonce is reused without a new challenge
+        await self.api.configManager(action='getConfig')
+        self.assertEqual(mock_send.call_count, 3)
+        self.assertIn('nc=00000002',
+                      mock_send.call_args_list[2].args[2]['Authorization'])
+
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_api_version(self, mock_send):
+        mock_send.return_value = mock_response('version=2.84')
+        version = await self.api.api_version
+        self.assertEqual(version['version'], 2.84)
+
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_channels(self, mock_send):
+        mock_send.return_value = mock_response(
+            'table.ChannelTitle[0].Name=Lab01')
+        channels = await self.api.channels
+        self.assertEqual(channels[0]['Name'], 'Lab01')
+
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_find_media_files(self, mock_send):
+        mock_send.return_value = mock_response(
+            'result=1\nfound=1\nitems[0].Channel=1')
+        params = {'condition.Channel': 1}
+        result = await self.api.find_media_files(params)
+        self.assertEqual(result['found'], 1)
+        self.assertEqual(params, {'condition.Channel': 1})
+
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_iter_media_files(self, mock_send):
+        mock_send.side_effect = [
+            mock_response('result=1'), mock_response('OK'),
+            mock_response('found=2\nitems[0].Channel=1\nitems[1].Channel=2'),
+            mock_response('found=1\nitems[0].Channel=3'),
+            mock_response('OK'), mock_response('OK')]
+        items = [i async for i in self.api.iter_media_files({}, batch_size=2)]
+        self.assertEqual([i['Channel'] for i in items], [1, 2, 3])
+        self.assertIn('action=destroy', mock_send.call_args.args[1])
+
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_find_media_table(self, mock_send):
+        mock_send.side_effect = [
+            mock_response('result=1'), mock_response('OK'),
+            mock_response('found=2\nitems[0].Channel=1\nitems[1].Channel=2'),
+            mock_response('found=0'),
+            mock_response('OK'), mock_response('OK')]
+        table = await self.api.find_media_table({}, batch_size=2)
+        self.assertEqual(list(table.channel), [1, 2])
+        self.assertIn('action=destroy', mock_send.call_args.args[1])
+
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_find_media_files_failed(self, mock_send):
+        mock_send.return_value = mock_response('Error')
+        with self.assertRaises(IntelbrasAPIException):
+            await self.api.find_media_files({})
+
+    def test_client_timeout(self):
+        timeout = AsyncIntelbrasAPI._client_timeout((3, 10))
+        self.assertEqual(timeout.sock_connect, 3)
+        self.assertEqual(timeout.sock_read, 10)
+        self.assertEqual(AsyncIntelbrasAPI._client_timeout(5).total, 5)
+
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_get_configs(self, mock_send):
+        mock_send.side_effect = [
+            mock_response('table.ChannelTitle[0].Name=Canal1\n'
+                          'table.Network.Hostname=NVR'),
+            mock_response('Error\nBad Request!', status=400)]
+        configs = await self.api.get_configs(['ChannelTitle', 'Network', 'Encode'])
+        self.assertEqual(configs, {'ChannelTitle': [{'Name': 'Canal1'}],
+                                   'Network': {'Hostname': 'NVR'},
+                                   'Encode': None})
+        self.assertIn('name=Encode', self.api.last_request_url)
+
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_sync_config(self, mock_send):
+        mock_send.side_effect = [
+            mock_response('table.Network.Hostname=NVR\ntable.Network.eth0.MTU=1500'),
+            mock_response('OK')]
+        changes = await self.api.sync_config(
+            {'Network': {'Hostname': 'NVR2', 'eth0': {'MTU': 1500}}})
+        self.assertEqual(changes, {'Network.Hostname': 'NVR2'})
+        self.assertEqual(
+            self.api.last_request_url,
+            'http://localhost/cgi-bin/configManager.cgi?action=setConfig&Network.Hostname=NVR2')
+
+    @patch('pyintelbras.aio.asyncio.sleep', new_callable=AsyncMock)
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_retry(self, mock_send, mock_sleep):
+        self.api.retry = RetryPolicy(attempts=3)
+        mock_send.side_effect = [
+            aiohttp.ClientConnectionError(), mock_response(status=503),
+            mock_response('table.ChannelTitle[0].Name=Lab01')]
+        self.assertEqual(await self.api.channels, [{'Name': 'Lab01'}])
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual(mock_send.call_args.args[4], (10, 30))
+
+        # Writes are never retried
+        mock_send.side_effect = [mock_response(status=503)]
+        response = await self.api.configManager(action='setConfig')
+        self.assertEqual(response.status, 503)
+
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_hooks(self, mock_send):
+        events = []
+        self.api.hooks = [events.append]
+        mock_send.return_value = mock_response('table.ChannelTitle[0].Name=Lab01')
+        await self.api.channels
+
+        request, parse = events
+        self.assertIsInstance(request, RequestEvent)
+        self.assertEqual((request.host, request.endpoint, request.status),
+                         ('localhost:80', 'configManager.getConfig', 200))
+        self.assertIsInstance(parse, ParseEvent)
+
+    def test_downloads(self):
+        # Only the sync client downloads files
+        with self.assertRaisesRegex(IntelbrasAPIException, 'use IntelbrasAPI'):
+            self.api.download_media_file('/mnt/dvr/file.dav', '/tmp/file.dav')
+        with self.assertRaisesRegex(IntelbrasAPIException, 'use IntelbrasAPI'):
+            self.api.download_clip(1, '2024-08-28 10:00:00', '2024-08-28 10:15:00', '/tmp/clip.dav')
+
+
+if __name__ == '__main__':
+    unittest.main()
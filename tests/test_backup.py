@@ -0,0 +1,121 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from urllib.parse import urlparse, parse_qsl
+
+from pyintelbras import IntelbrasAPI
+from pyintelbras.backup import ConfigBackup, _parse_dump
+from pyintelbras.metrics import ParseEvent
+
+CONFIGS = {
+    'ChannelTitle': b'table.ChannelTitle[0].Name=Entrada\r\ntable.ChannelTitle[1].Name=Garagem\r\n',
+    'NTP': b'table.NTP.Enable=true\r\ntable.NTP.Address=pool.ntp.org\r\n',
+    'General': b'table.General.MachineName=NVR\r\n',
+}
+
+
+def exit_parse(raw, names):
+    # A parse worker killed, e.g. by the OOM killer
+    os._exit(1)
+
+
+def device_request(all_supported=True, fail=False):
+    # Session.request of a device answering configManager getConfig
+
+    def request(**kwargs):
+        if fail:
+            raise OSError('unreachable')
+        name = dict(parse_qsl(urlparse(kwargs['url']).query))['name']
+        if name == 'All':
+            body = b''.join(CONFIGS.values()) if all_supported else b'Error\r\nBad Request!\r\n'
+        else:
+            body = CONFIGS.get(name, b'Error\r\nBad Request!\r\n')
+        return MagicMock(status_code=200 if body[:5] != b'Error' else 400,
+                         content=body, text=body.decode(), headers={})
+    return request
+
+
+class TestConfigBackup(unittest.TestCase):
+
+    def test_parse_dump(self):
+        payload, names, _ = _parse_dump(b''.join(CONFIGS.values()), None)
+        self.assertEqual(json.loads(payload)['NTP'],
+                         {'Enable': True, 'Address': 'pool.ntp.org'})
+        self.assertEqual(names, 3)
+        payload, names, _ = _parse_dump(CONFIGS['NTP'], ['NTP', 'Encode'])
+        self.assertEqual(json.loads(payload)['Encode'], None)
+        self.assertEqual(names, 1)
+
+    def run_backup(self, requests, **kwargs):
+        devices = [IntelbrasAPI(f'http://10.0.0.{i}', 'admin', 'admin')
+                   for i in range(len(requests))]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'backup', 'configs.jsonl')
+            with patch('pyintelbras.api.requests.Session.request') as mock_request:
+                mock_request.side_effect = lambda **kw: requests[
+                    devices.index(next(d for d in devices if kw['url'].startswith(d.server)))](**kw)
+                backup = ConfigBackup(devices, path, **kwargs)
+                results = {r.device.server: r for r in backup.run()}
+            with open(path) as f:
+                lines = {line['device']: line for line in map(json.loads, f)}
+        return backup, results, lines
+
+    def test_run(self):
+        for processes in (0, 1):
+            backup, results, lines = self.run_backup(
+                [device_request(), device_request(all_supported=False),
+                 device_request(fail=True)],
+                processes=processes)
+            self.assertEqual(backup.stats['saved'], 1)
+            self.assertEqual(backup.stats['failed'], 2)
+            self.assertEqual(lines['http://10.0.0.0']['config']['ChannelTitle'],
+                             [{'Name': 'Entrada'}, {'Name': 'Garagem'}])
+            self.assertEqual(results['http://10.0.0.0'].names, 3)
+            # Without name=All, names are required
+            self.assertIn('not supported', str(results['http://10.0.0.1'].error))
+            self.assertFalse(results['http://10.0.0.2'].ok)
+            self.assertEqual(set(lines), {'http://10.0.0.0'})
+
+    def test_names(self):
+        backup, results, lines = self.run_backup(
+            [device_request(), device_request(all_supported=False)],
+            names=['NTP', 'General', 'Encode'], processes=0)
+        self.assertEqual(backup.stats['saved'], 2)
+        for device in ('http://10.0.0.0', 'http://10.0.0.1'):
+            self.assertEqual(lines[device]['config'], {
+                'NTP': {'Enable': True, 'Address': 'pool.ntp.org'},
+                'General': {'MachineName': 'NVR'}, 'Encode': None})
+            self.assertEqual(results[device].names, 2)
+        self.assertFalse(results['http://10.0.0.1'].device._config_all)
+
+    def test_broken_pool(self):
+        # Devices fetched after the pool broke fail instead of hanging run
+        with patch('pyintelbras.backup._parse_dump', exit_parse):
+            backup, results, lines = self.run_backup(
+                [device_request() for _ in range(4)], processes=1, max_workers=1)
+        self.assertEqual(backup.stats['failed'], 4)
+        self.assertEqual(lines, {})
+        self.assertTrue(all('BrokenProcessPool' in repr(r.error.error) for r in results.values()))
+
+    def test_lost(self):
+        # A fetcher finishing without a result does not hang run
+        with patch('pyintelbras.backup.ConfigBackup._backup', lambda *args: None):
+            backup, results, lines = self.run_backup([device_request()], processes=0)
+        self.assertIn('lost', str(results['http://10.0.0.0'].error))
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_parse_event(self, mock_request):
+        mock_request.side_effect = device_request()
+        hook = MagicMock()
+        device = IntelbrasAPI('http://10.0.0.1', 'admin', 'admin', hooks=[hook])
+        with tempfile.TemporaryDirectory() as tmp:
+            list(ConfigBackup(device, os.path.join(tmp, 'b.jsonl'), processes=0).run())
+        events = [c.args[0] for c in hook.call_args_list if isinstance(c.args[0], ParseEvent)]
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].size, sum(map(len, CONFIGS.values())))
+
+
+if __name__ == '__main__':
+    unittest.main()
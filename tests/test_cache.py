@@ -0,0 +1,111 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from pyintelbras import IntelbrasAPI
+from pyintelbras.cache import ResponseCache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_lru(self):
+        cache = ResponseCache(maxsize=2)
+        cache.set('a', 1, ttl=10)
+        cache.set('b', 2, ttl=10)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3, ttl=10)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats, {'hits': 3, 'misses': 1, 'size': 2,
+                                       'maxsize': 2})
+
+    @patch('pyintelbras.cache.time.monotonic')
+    def test_ttl(self, mock_monotonic):
+        cache = ResponseCache(ttl=10, ttls={'magicBox': 60,
+                                            'configManager.getConfig': 0})
+        self.assertEqual(cache.ttl_for('configManager', 'getCaps'), 10)
+        self.assertEqual(cache.ttl_for('magicBox', 'getSystemInfo'), 60)
+        self.assertEqual(cache.ttl_for('configManager', 'getConfig'), 0)
+
+        mock_monotonic.return_value = 100
+        cache.set('a', 1, ttl=10)
+        cache.set('b', 2, ttl=0)
+        self.assertEqual(len(cache), 1)
+        mock_monotonic.return_value = 109
+        self.assertEqual(cache.get('a'), 1)
+        mock_monotonic.return_value = 110
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_actions(self):
+        self.assertTrue(ResponseCache.cacheable('GET', 'getConfig'))
+        self.assertFalse(ResponseCache.cacheable('POST', 'getConfig'))
+        self.assertFalse(ResponseCache.cacheable('GET', 'findNextFile'))
+        self.assertTrue(ResponseCache.invalidates('setConfig'))
+        self.assertFalse(ResponseCache.invalidates('findFile'))
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_api(self, mock_request):
+        mock_request.return_value = MagicMock(
+            status_code=200, text='table.ChannelTitle[0].Name=Lab01',
+            content=b'table.ChannelTitle[0].Name=Lab01')
+        cache = ResponseCache()
+        api = IntelbrasAPI('http://localhost', cache=cache)
+
+        self.assertEqual(api.channels, api.channels)
+        self.assertEqual(mock_request.call_count, 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # Different params are different entries
+        api.configManager(action='getConfig', name='Encode')
+        self.assertEqual(mock_request.call_count, 2)
+
+        # Writes always go through and invalidate the endpoint
+        api.configManager(action='setConfig', **{'ChannelTitle[0].Name': 'X'})
+        api.configManager(action='setConfig', **{'ChannelTitle[0].Name': 'X'})
+        self.assertEqual(mock_request.call_count, 4)
+        self.assertEqual(len(cache), 0)
+        api.channels
+        self.assertEqual(mock_request.call_count, 5)
+
+        # Errors and streamed responses are not cached
+        mock_request.return_value = MagicMock(status_code=500)
+        api.magicBox(action='getSystemInfo')
+        api.magicBox(action='getSystemInfo')
+        api.configManager(action='getConfig', name='ChannelTitle', stream=True)
+        self.assertEqual(mock_request.call_count, 8)
+        # Nor errors answered with 200
+        mock_request.return_value = MagicMock(
+            status_code=200, text='Error\r\nBad Request!', content=b'Error\r\nBad Request!')
+        api.configManager(action='getConfig', name='Unknown')
+        api.configManager(action='getConfig', name='Unknown')
+        self.assertEqual(mock_request.call_count, 10)
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_shared(self, mock_request):
+        # One cache shared by the clients of many devices
+        def request(**kwargs):
+            name = 'Lab01' if '10.0.0.1' in kwargs['url'] else 'Lab02'
+            body = f'table.ChannelTitle[0].Name={name}'
+            return MagicMock(status_code=200, text=body, content=body.encode())
+        mock_request.side_effect = request
+        cache = ResponseCache()
+        first = IntelbrasAPI('http://10.0.0.1', cache=cache)
+        second = IntelbrasAPI('http://10.0.0.2', cache=cache)
+        self.assertEqual(first.channels, [{'Name': 'Lab01'}])
+        self.assertEqual(second.channels, [{'Name': 'Lab02'}])
+        self.assertEqual(first.channels, [{'Name': 'Lab01'}])
+        self.assertEqual(mock_request.call_count, 2)
+        # Other users may see other configs
+        self.assertEqual(IntelbrasAPI('http://10.0.0.1', 'guest', 'x', cache=cache).channels,
+                         [{'Name': 'Lab01'}])
+        self.assertEqual(mock_request.call_count, 3)
+
+        # Writes invalidate the endpoint of their device only
+        second.configManager(action='setConfig', **{'ChannelTitle[0].Name': 'X'})
+        self.assertEqual(len(cache), 2)
+        first.channels
+        self.assertEqual(mock_request.call_count, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import asyncio
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+from pyintelbras import IntelbrasAPI
+from pyintelbras.events import (
+    MultipartParser, EventStream, parse_event_body, aiter_events,
+    multiplex_events)
+from pyintelbras.exceptions import IntelbrasAPIException
+
+try:
+    import aiohttp
+    from pyintelbras.aio import AsyncIntelbrasAPI
+except ImportError:
+    aiohttp = None
+
+
+def part(body: bytes, length: bool = True) -> bytes:
+    headers = b'--myboundary\r\nContent-Type: text/plain\r\n'
+    if length:
+        headers += b'Content-Length: %d\r\n' % len(body)
+    return headers + b'\r\n' + body + b'\r\n'
+
+
+STREAM = (part(b'Code=VideoMotion;action=Start;index=0')
+          + part(b'Heartbeat')
+          + part(b'Code=VideoLoss;action=Stop;index=3', length=False)
+          + b'--myboundary\r\n')
+
+
+class TestMultipartParser(unittest.TestCase):
+
+    def test_feed_byte_by_byte(self):
+        parser = MultipartParser()
+        parts = []
+        for i in range(len(STREAM)):
+            parts += parser.feed(STREAM[i:i + 1])
+        self.assertEqual(parts, [b'Code=VideoMotion;action=Start;index=0',
+                                 b'Heartbeat',
+                                 b'Code=VideoLoss;action=Stop;index=3'])
+
+    def test_max_part_size(self):
+        parser = MultipartParser(max_part_size=64)
+        with self.assertRaises(IntelbrasAPIException):
+            parser.feed(b'--myboundary\r\nContent-Length: 1000\r\n\r\n'
+                        + b'x' * 100)
+        # Garbage without delimiter is not accumulated
+        parser.feed(b'x' * 1000)
+        self.assertLessEqual(len(parser._buffer), len(parser.delimiter))
+
+    def test_parse_event_body(self):
+        self.assertEqual(parse_event_body(b'Heartbeat'), [])
+        events = parse_event_body(
+            b'Code=AlarmLocal;action=Start;index=1;data={\n"Name": "A1"\n}\r\n'
+            b'Code=VideoLoss;action=Stop;index=2')
+        self.assertEqual(events, [
+            {'Code': 'AlarmLocal', 'action': 'Start', 'index': 1,
+             'data': {'Name': 'A1'}},
+            {'Code': 'VideoLoss', 'action': 'Stop', 'index': 2}])
+
+
+class TestEventStream(unittest.TestCase):
+
+    def _response(self, data: bytes, status_code: int = 200):
+        chunks = iter([data[i:i + 7] for i in range(0, len(data), 7)])
+        response = MagicMock()
+        response.status_code = status_code
+        response.headers = {
+            'Content-Type': 'multipart/x-mixed-replace; boundary=myboundary'}
+        response.raw.read1.side_effect = lambda n: next(chunks, b'')
+        return response
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_events_and_reconnect(self, mock_request):
+        mock_request.side_effect = [
+            self._response(STREAM), self._response(b'', status_code=500),
+            self._response(STREAM)]
+        api = IntelbrasAPI('http://localhost', 'user', 'pass')
+        stream = EventStream(api, codes=['VideoMotion', 'VideoLoss'],
+                             backoff=0.001)
+        events = []
+        for event in stream:
+            events.append(event)
+            if len(events) == 4:
+                stream.close()
+        self.assertEqual([e['Code'] for e in events],
+                         ['VideoMotion', 'VideoLoss'] * 2)
+        self.assertEqual(mock_request.call_count, 3)
+        self.assertTrue(mock_request.call_args.kwargs['stream'])
+        self.assertEqual(mock_request.call_args.kwargs['timeout'], (10.0, 15))
+        self.assertEqual(api.last_request_url,
+                         'http://localhost/cgi-bin/eventManager.cgi?action=attach'
+                         '&codes=%5BVideoMotion%2CVideoLoss%5D&heartbeat=5')
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_no_reconnect(self, mock_request):
+        mock_request.return_value = self._response(b'', status_code=401)
+        stream = EventStream(IntelbrasAPI('http://localhost'), reconnect=False)
+        with self.assertRaises(IntelbrasAPIException):
+            list(stream)
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_run_callback(self, mock_request):
+        mock_request.return_value = self._response(STREAM)
+        stream = EventStream(IntelbrasAPI('http://localhost'), reconnect=False)
+        callback = MagicMock()
+        stream.run(callback)
+        self.assertEqual(callback.call_count, 2)
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class TestAsyncEvents(unittest.IsolatedAsyncioTestCase):
+
+    def _response(self):
+        async def iter_any():
+            for i in range(0, len(STREAM), 11):
+                yield STREAM[i:i + 11]
+        response = MagicMock()
+        response.status = 200
+        response.headers = {
+            'Content-Type': 'multipart/x-mixed-replace; boundary=myboundary'}
+        response.content.iter_any = iter_any
+        return response
+
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_aiter_events(self, mock_send):
+        mock_send.side_effect = lambda *args: self._response()
+        api = AsyncIntelbrasAPI('http://localhost')
+        events = [e async for e in aiter_events(api, reconnect=False)]
+        self.assertEqual([e['index'] for e in events], [0, 3])
+        self.assertTrue(mock_send.call_args.args[5])
+
+        apis = [AsyncIntelbrasAPI('http://localhost') for _ in range(3)]
+        merged = [pair async for pair in multiplex_events(
+            apis, reconnect=False)]
+        self.assertEqual(len(merged), 6)
+        self.assertEqual({id(api) for api, _ in merged},
+                         {id(api) for api in apis})
+
+    @patch('pyintelbras.aio.AsyncIntelbrasAPI._send', new_callable=AsyncMock)
+    async def test_multiplex_close_full_queue(self, mock_send):
+        # A consumer leaving early while the readers wait on a full queue
+        mock_send.side_effect = lambda *args: self._response()
+        apis = [AsyncIntelbrasAPI('http://localhost') for _ in range(3)]
+        merged = multiplex_events(apis, max_queued=2)
+        await merged.__anext__()
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(merged.aclose(), timeout=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
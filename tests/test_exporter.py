@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+from urllib.parse import urlparse, parse_qsl, unquote
+from pyintelbras import IntelbrasAPI
+from pyintelbras.exporter import RecordingExporter, recording_query, _HashingFile
+
+FILES = {'/mnt/dvr/0/a.dav': b'a' * 10, '/mnt/dvr/0/b.dav': b'b' * 20,
+         '/mnt/dvr/0/c.dav': b'c' * 30}
+
+
+def fake_device(files, fail=(), cut=()):
+    # Fake mediaFileFind and RPC_Loadfile endpoints serving files, with
+    # Range support. Paths in fail answer 500, paths in cut end after the
+    # first 5 bytes.
+    requests = []
+
+    def request(method, url, headers=None, **kwargs):
+        url = urlparse(url)
+        response = MagicMock()
+        if url.path.endswith('mediaFileFind.cgi'):
+            action = dict(parse_qsl(url.query))['action']
+            if action == 'factory.create':
+                response.text = 'result=7'
+            elif action == 'findNextFile':
+                paths = sorted(files) if not requests.count('findNextFile') else []
+                response.text = f'found={len(paths)}\n' + '\n'.join(
+                    f'items[{i}].FilePath={p}\nitems[{i}].Length={len(files[p])}'
+                    for i, p in enumerate(paths))
+            else:
+                response.text = 'OK'
+            requests.append(action)
+            return response
+
+        path = unquote(url.path)[len('/cgi-bin/RPC_Loadfile'):-len('.cgi')]
+        requests.append((path, (headers or {}).get('Range')))
+        if path in fail:
+            response.status_code = 500
+            return response
+        start = int((headers or {}).get('Range', 'bytes=0-')[6:-1])
+        data = files[path][start:]
+        response.status_code = 206 if start else 200
+        response.headers = {'Content-Length': str(len(data))}
+        response.iter_content.return_value = iter(
+            [data[:5]] if path in cut else [data[:5], data[5:]])
+        return response
+    return request, requests
+
+
+class TestRecordingExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = self.tmp.name
+        self.api = IntelbrasAPI('10.0.0.1', 'user', 'pass')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def manifest(self):
+        with open(os.path.join(self.dest, 'manifest.jsonl')) as f:
+            return [json.loads(line) for line in f]
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_export_and_skip(self, mock_request):
+        mock_request.side_effect, requests = fake_device(FILES)
+        exporter = RecordingExporter(self.api, self.dest, per_device=2)
+        results = list(exporter.export(recording_query(
+            1, datetime(2024, 8, 27), '2024-8-28 00:00:00', Types=['dav'])))
+        self.assertEqual(sorted(r.status for r in results), ['exported'] * 3)
+        self.assertEqual(exporter.stats, {
+            'exported': 3, 'skipped': 0, 'failed': 0, 'bytes': 60})
+
+        for path, data in FILES.items():
+            file = os.path.join(self.dest, '10.0.0.1', *path.strip('/').split('/'))
+            with open(file, 'rb') as f:
+                self.assertEqual(f.read(), data)
+        manifest = {e['path']: e for e in self.manifest()}
+        self.assertEqual(manifest['/mnt/dvr/0/b.dav']['size'], 20)
+        self.assertEqual(manifest['/mnt/dvr/0/b.dav']['sha256'],
+                         hashlib.sha256(FILES['/mnt/dvr/0/b.dav']).hexdigest())
+        self.assertEqual(manifest['/mnt/dvr/0/b.dav']['file'],
+                         os.path.join('10.0.0.1', 'mnt', 'dvr', '0', 'b.dav'))
+
+        # A second run downloads nothing
+        mock_request.side_effect, requests = fake_device(FILES)
+        exporter = RecordingExporter(self.api, self.dest)
+        results = list(exporter.export({}))
+        self.assertEqual([r.status for r in results], ['skipped'] * 3)
+        self.assertFalse([r for r in requests if isinstance(r, tuple)])
+        self.assertEqual(len(self.manifest()), 3)
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_resume_and_failures(self, mock_request):
+        part = os.path.join(self.dest, '10.0.0.1', 'mnt', 'dvr', '0', 'c.dav.part')
+        os.makedirs(os.path.dirname(part))
+        with open(part, 'wb') as f:
+            f.write(b'c' * 12)
+
+        mock_request.side_effect, requests = fake_device(
+            FILES, fail={'/mnt/dvr/0/a.dav'})
+        exporter = RecordingExporter(self.api, self.dest)
+        results = {r.item['FilePath']: r for r in exporter.export({})}
+        self.assertEqual(results['/mnt/dvr/0/a.dav'].status, 'failed')
+        self.assertIsNotNone(results['/mnt/dvr/0/a.dav'].error)
+        self.assertEqual(results['/mnt/dvr/0/c.dav'].size, 30)
+        self.assertEqual(results['/mnt/dvr/0/c.dav'].checksum,
+                         hashlib.sha256(b'c' * 30).hexdigest())
+        self.assertIn(('/mnt/dvr/0/c.dav', 'bytes=12-'), requests)
+        self.assertFalse(os.path.exists(part))
+        self.assertEqual(exporter.stats['failed'], 1)
+        self.assertEqual({e['path'] for e in self.manifest()},
+                         {'/mnt/dvr/0/b.dav', '/mnt/dvr/0/c.dav'})
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_truncated(self, mock_request):
+        # Fewer bytes than the reported Length fail, the .part is resumed
+        part = os.path.join(self.dest, '10.0.0.1', 'mnt', 'dvr', '0', 'b.dav.part')
+        mock_request.side_effect, requests = fake_device(FILES, cut={'/mnt/dvr/0/b.dav'})
+        exporter = RecordingExporter(self.api, self.dest)
+        results = {r.item['FilePath']: r for r in exporter.export({})}
+        self.assertEqual(results['/mnt/dvr/0/b.dav'].status, 'failed')
+        self.assertIn('reported 20', str(results['/mnt/dvr/0/b.dav'].error))
+        self.assertEqual(exporter.stats['failed'], 1)
+        self.assertEqual(os.path.getsize(part), 5)
+        self.assertFalse(os.path.exists(part[:-len('.part')]))
+        self.assertNotIn('/mnt/dvr/0/b.dav', {e['path'] for e in self.manifest()})
+
+        mock_request.side_effect, requests = fake_device(FILES)
+        exporter = RecordingExporter(self.api, self.dest)
+        results = {r.item['FilePath']: r for r in exporter.export({})}
+        self.assertEqual(results['/mnt/dvr/0/b.dav'].status, 'exported')
+        self.assertIn(('/mnt/dvr/0/b.dav', 'bytes=5-'), requests)
+
+        # More bytes than reported, the .part is dropped
+        listing = fake_device({'/mnt/dvr/0/d.dav': b'd' * 8})[0]
+        serve = fake_device({'/mnt/dvr/0/d.dav': b'd' * 10})[0]
+        mock_request.side_effect = lambda method, url, **kwargs: (
+            listing if 'mediaFileFind' in url else serve)(method, url, **kwargs)
+        results = list(RecordingExporter(self.api, self.dest).export({}))
+        self.assertEqual([r.status for r in results], ['failed'])
+        self.assertFalse(os.path.exists(os.path.join(
+            self.dest, '10.0.0.1', 'mnt', 'dvr', '0', 'd.dav.part')))
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_per_device_limit(self, mock_request):
+        import threading
+        import time
+        running, peak = [0], [0]
+        lock = threading.Lock()
+        request, _ = fake_device({f'/f{i}.dav': b'x' * 10 for i in range(8)})
+
+        def slow_request(method, url, **kwargs):
+            if 'RPC_Loadfile' not in url:
+                return request(method, url, **kwargs)
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return request(method, url, **kwargs)
+        mock_request.side_effect = slow_request
+
+        exporter = RecordingExporter(self.api, self.dest, max_workers=8, per_device=3)
+        results = list(exporter.export({}))
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertLessEqual(peak[0], 3)
+
+    def test_hashing_file_restart(self):
+        path = os.path.join(self.dest, 'file.part')
+        with open(path, 'wb') as f:
+            f.write(b'old')
+        api = IntelbrasAPI('10.0.0.1')
+        response = MagicMock(status_code=200, headers={'Content-Length': '3'})
+        response.iter_content.return_value = iter([b'new'])
+        with _HashingFile(path, 'sha256', 2) as f, \
+                patch.object(IntelbrasAPI, 'RPC_Loadfile', create=True,
+                             return_value=response):
+            self.assertEqual(f.size, 3)
+            self.assertEqual(api.download_media_file('x.dav', f, offset=f.size), 3)
+            self.assertEqual(f.hash.hexdigest(), hashlib.sha256(b'new').hexdigest())
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'new')
+
+    def test_recording_query(self):
+        self.assertEqual(
+            recording_query(2, datetime(2024, 8, 27, 12), '2024-8-28 12:00:00',
+                            Types=['dav', 'jpg'], VideoStream='Main'),
+            {'condition.Channel': 2,
+             'condition.StartTime': '2024-08-27 12:00:00',
+             'condition.EndTime': '2024-8-28 12:00:00',
+             'condition.Types[0]': 'dav', 'condition.Types[1]': 'jpg',
+             'condition.VideoStream': 'Main'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from pyintelbras import IntelbrasAPI, DeviceFleet
+from pyintelbras.exceptions import IntelbrasAPIException
+
+
+class TestDeviceFleet(unittest.TestCase):
+
+    def setUp(self):
+        self.fleet = DeviceFleet(
+            ['10.0.0.1', {'server': '10.0.0.2', 'user': 'other'},
+             IntelbrasAPI('10.0.0.3')],
+            user='user', password='pass', max_workers=4)
+
+    def tearDown(self):
+        self.fleet.close()
+
+    def test_devices(self):
+        self.assertEqual(len(self.fleet), 3)
+        servers = [d.server for d in self.fleet]
+        self.assertEqual(servers, ['http://10.0.0.1', 'http://10.0.0.2',
+                                   'http://10.0.0.3'])
+        self.assertEqual(self.fleet.devices[0].user, 'user')
+        self.assertEqual(self.fleet.devices[1].user, 'other')
+        self.assertEqual(self.fleet.devices[2].user, '')
+
+    def test_close(self):
+        # Only the clients the fleet built are closed
+        with patch.object(IntelbrasAPI, 'close', autospec=True) as mock_close:
+            self.fleet.close()
+        self.assertEqual([c.args[0] for c in mock_close.call_args_list],
+                         self.fleet.devices[:2])
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_method_chain(self, mock_request):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_request.return_value = mock_response
+
+        results = list(self.fleet.configManager(
+            action='getConfig', name='ChannelTitle'))
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual({r.device.last_request_url for r in results}, {
+            f'http://10.0.0.{i}/cgi-bin/configManager.cgi?action=getConfig&name=ChannelTitle'
+            for i in (1, 2, 3)})
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_errors_do_not_abort(self, mock_request):
+        def request(method, url, **kwargs):
+            if '10.0.0.2' in url:
+                raise ConnectionError('unreachable')
+            return MagicMock(status_code=200)
+        mock_request.side_effect = request
+
+        results = {r.device.server: r for r in self.fleet.magicBox(
+            action='getSystemInfo')}
+        self.assertTrue(results['http://10.0.0.1'].ok)
+        self.assertTrue(results['http://10.0.0.3'].ok)
+        error = results['http://10.0.0.2'].error
+        self.assertIsInstance(error, IntelbrasAPIException)
+        self.assertIsInstance(error.error, ConnectionError)
+
+    def test_completion_order_and_timeout(self):
+        delays = {'http://10.0.0.1': 0.2, 'http://10.0.0.2': 0.0,
+                  'http://10.0.0.3': 5}
+
+        def func(device):
+            time.sleep(delays[device.server])
+            return device.server
+
+        start = time.monotonic()
+        results = list(self.fleet.map(func, timeout=0.5))
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertEqual([r.result for r in results[:2]],
+                         ['http://10.0.0.2', 'http://10.0.0.1'])
+        self.assertFalse(results[2].ok)
+        self.assertIsInstance(results[2].error.error, TimeoutError)
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_timeout_passed_to_requests(self, mock_request):
+        fleet = DeviceFleet(['10.0.0.1'], timeout=3)
+        list(fleet.configManager(action='getConfig', name='ChannelTitle'))
+        self.assertEqual(mock_request.call_args.kwargs['timeout'], 3)
+        fleet.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
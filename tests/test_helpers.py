@@ -1,5 +1,8 @@
 import unittest
-from pyintelbras.helpers import parse_response
+from datetime import datetime
+from pyintelbras.helpers import (
+    parse_response, parse_response_lines, iter_response_items, convert_value,
+    parse_configs, flatten_response, diff_config, format_value, LazyDict)
 from pyintelbras.exceptions import IntelbrasAPIException
 
 
@@ -23,11 +26,171 @@ class TestHelpers(unittest.TestCase):
         self.assertEqual(parsed['caps']['PacketLengthRange'][0], 1)
         self.assertEqual(parsed['caps']['PacketLengthRange'][1], 60)
 
+    def test_parse_response_paths(self):
+        response = """
+                   table.Record[0].TimeSection[0][1]=1 00:00:00-24:00:00
+                   table.Record[1].Stream=0
+                   table.Record[1].Format=dav
+                   table.Network.eth0.MTU=1500
+                   items[2].Flags[1]=Event
+                   Error
+                   """
+        parsed = parse_response(response)
+        records = parsed['table']['Record']
+        self.assertEqual(records[0]['TimeSection[0][1]'], '1 00:00:00-24:00:00')
+        self.assertEqual(records[1], {'Stream': 0, 'Format': 'dav'})
+        self.assertEqual(parsed['table']['Network']['eth0']['MTU'], 1500)
+        self.assertEqual(parsed['items'], [{}, {}, {'Flags': [None, 'Event']}])
+        self.assertIsNone(parsed['Error'])
+
+    def test_convert_value(self):
+        self.assertIsNone(convert_value('null'))
+        self.assertIsNone(convert_value('None'))
+        self.assertIs(convert_value('TRUE'), True)
+        self.assertIs(convert_value('false'), False)
+        self.assertEqual(convert_value('-12'), -12)
+        self.assertEqual(convert_value('1_000'), 1000)
+        self.assertEqual(convert_value('15.000000'), 15.0)
+        self.assertEqual(convert_value('1e3'), 1000.0)
+        self.assertEqual(convert_value('2024-8-28 2:40:49'),
+                         datetime(2024, 8, 28, 2, 40, 49))
+        self.assertEqual(convert_value('2024-02-30 00:00:00'),
+                         '2024-02-30 00:00:00')
+        self.assertEqual(convert_value('G.711A'), 'G.711A')
+        self.assertEqual(convert_value('192.168.1.108'), '192.168.1.108')
+        self.assertEqual(convert_value(''), '')
+
+    def test_parse_response_conflict(self):
+        with self.assertRaises(IntelbrasAPIException):
+            parse_response('a.b=1\na.b.c=2')
+
+    def test_parse_response_schema(self):
+        response = """
+                   items[0].Channel=1
+                   items[0].StartTime=2024-8-28 02:40:49
+                   items[0].Cluster=null
+                   items[0].Length=3276800
+                   """
+        parsed = parse_response(
+            response, schema={'Channel': str, 'StartTime': datetime,
+                              'Cluster': int})
+        item = parsed['items'][0]
+        self.assertEqual(item['Channel'], '1')
+        self.assertEqual(item['StartTime'], datetime(2024, 8, 28, 2, 40, 49))
+        self.assertIsNone(item['Cluster'])
+        self.assertEqual(item['Length'], 3276800)
+
+        with self.assertRaises(IntelbrasAPIException):
+            parse_response('items[0].StartTime=now',
+                           schema={'StartTime': datetime})
+
+    def test_parse_response_lazy(self):
+        response = """
+                   caps.MaxPreRecordTime=30
+                   caps.PacketLengthRange[0]=1
+                   caps.PacketLengthRange[1]=60
+                   caps.SupportHoliday=true
+                   caps.SupportPacketType[0]=Time
+                   caps.Date=2024-8-28 02:40:49
+                   """
+        parsed = parse_response(response, lazy=True)
+        self.assertIsInstance(parsed, LazyDict)
+        caps = parsed['caps']
+        # Values are kept raw until read
+        self.assertEqual(caps._data['MaxPreRecordTime'], '30')
+        self.assertEqual(caps['MaxPreRecordTime'], 30)
+        self.assertEqual(caps._data['MaxPreRecordTime'], 30)
+        self.assertEqual(caps['PacketLengthRange'][1], 60)
+        self.assertEqual(caps['PacketLengthRange'], [1, 60])
+        self.assertEqual(caps.get('Missing', 'default'), 'default')
+        self.assertEqual(parsed.to_dict(), parse_response(response))
+        self.assertEqual(parsed, parse_response(response))
+
+        typed = parse_response(response, lazy=True,
+                               schema={'MaxPreRecordTime': str})
+        self.assertEqual(typed['caps']['MaxPreRecordTime'], '30')
+
+    def test_parse_response_lines(self):
+        lines = iter([b'caps.MaxPreRecordTime=30', b'',
+                      b'caps.PacketLengthRange[0]=1\r',
+                      'caps.PacketLengthRange[1]=60'])
+        parsed = parse_response_lines(lines)
+        self.assertEqual(parsed, {'caps': {'MaxPreRecordTime': 30,
+                                           'PacketLengthRange': [1, 60]}})
+        self.assertEqual(parse_response(b'found=1\r\nitems[0].Channel=1'),
+                         {'found': 1, 'items': [{'Channel': 1}]})
+
+    def test_iter_response_items(self):
+        lines = [b'found=2', b'items[0].StartTime=2024-8-28 02:40:49',
+                 b'items[0].Channel=1', b'OK']
+        items = iter_response_items(iter(lines))
+        self.assertEqual(next(items), ('found', 2))
+        self.assertEqual(next(items), ('items[0].StartTime',
+                                       datetime(2024, 8, 28, 2, 40, 49)))
+        self.assertEqual(list(items), [('items[0].Channel', 1), ('OK', None)])
+
+        typed = list(iter_response_items(lines, schema={'Channel': str}))
+        self.assertEqual(typed[2], ('items[0].Channel', '1'))
+        raw = list(iter_response_items(lines, raw=True))
+        self.assertEqual(raw[0], ('found', '2'))
+
+        with self.assertRaises(IntelbrasAPIException):
+            list(iter_response_items(None))
+
     def test_parse_response_invalid(self):
         response = None
         with self.assertRaises(IntelbrasAPIException):
             parse_response(response)
 
+    def test_parse_configs(self):
+        response = ('table.ChannelTitle[0].Name=Canal1\r\n'
+                    'table.ChannelTitleExtra.Enable=true\r\n'
+                    'table.Network.Hostname=NVR\r\n'
+                    'table.Network.eth0.MTU=1500\r\n'
+                    'table.Locales=pt-BR\r\n')
+        self.assertEqual(
+            parse_configs(response, ['ChannelTitle', 'Network', 'Locales', 'Encode']),
+            {'ChannelTitle': [{'Name': 'Canal1'}],
+             'Network': {'Hostname': 'NVR', 'eth0': {'MTU': 1500}},
+             'Locales': 'pt-BR', 'Encode': None})
+
+    def test_flatten_response(self):
+        response = ('table.Encode[0].MainFormat[0].Video.FPS=15.000000\r\n'
+                    'table.Encode[0].MainFormat[0].AudioEnable=false\r\n'
+                    'table.Record[0].TimeSection[0][1]=1 00:00:00-23:59:59\r\n'
+                    'table.ChannelTitle[1].Name=Lab02\r\n'
+                    'items[0].Flags[0]=Event\r\n'
+                    'items[0].StartTime=2024-08-28 02:40:49\r\n')
+        flat = flatten_response(parse_response(response))
+        self.assertEqual(flat, {
+            'table.Encode[0].MainFormat[0].Video.FPS': 15.0,
+            'table.Encode[0].MainFormat[0].AudioEnable': False,
+            'table.Record[0].TimeSection[0][1]': '1 00:00:00-23:59:59',
+            'table.ChannelTitle[1].Name': 'Lab02',
+            'items[0].Flags[0]': 'Event',
+            'items[0].StartTime': datetime(2024, 8, 28, 2, 40, 49)})
+        # Back to the raw form parses to the same result
+        raw = '\n'.join(f'{k}={format_value(v)}' for k, v in flat.items())
+        self.assertEqual(parse_response(raw), parse_response(response))
+        self.assertEqual(flatten_response(parse_response(response, lazy=True)), flat)
+
+    def test_diff_config(self):
+        current = {'Encode': [{'Video': {'FPS': 15.0, 'GOP': 30}, 'AudioEnable': False}],
+                   'ChannelTitle': [{'Name': 'Lab01'}, {'Name': 'Lab02'}]}
+        desired = {'Encode': [{'Video': {'FPS': '15.000000', 'GOP': 60},
+                               'AudioEnable': 0}],
+                   'ChannelTitle': [None, {'Name': 'Lab02'}],
+                   'Network.Hostname': 'NVR'}
+        self.assertEqual(diff_config(current, desired), {
+            'Encode[0].Video.GOP': 60, 'Encode[0].AudioEnable': 0,
+            'Network.Hostname': 'NVR'})
+        self.assertEqual(diff_config(current, current), {})
+        # Compared converted, returned as given
+        self.assertEqual(diff_config(current, {'ChannelTitle': [{'Name': '007'}],
+                                               'Encode[0].Video.GOP': '060'}),
+                         {'ChannelTitle[0].Name': '007', 'Encode[0].Video.GOP': '060'})
+        self.assertEqual(diff_config(current, {'Encode[0].Video.FPS': '15.000'}), {})
+
 
 if __name__ == '__main__':
     unittest.main()
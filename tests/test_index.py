@@ -0,0 +1,117 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from pyintelbras import IntelbrasAPI
+from pyintelbras.index import RecordingIndex
+from pyintelbras.media import MediaFileTable
+
+START = datetime(2024, 8, 1)
+
+
+def recordings(hours):
+    # One file per hour on channels 0 and 1 (condition.Channel 1 and 2)
+    return [{'Channel': channel, 'StartTime': START + timedelta(hours=h),
+             'EndTime': START + timedelta(hours=h + 1, seconds=-1),
+             'FilePath': f'/mnt/dvr/{channel}/{h}.dav', 'Length': 100, 'Type': 'dav'}
+            for channel in (0, 1) for h in range(hours)]
+
+
+class TestRecordingIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.api = IntelbrasAPI('10.0.0.1', 'user', 'pass')
+        self.index = RecordingIndex(history=timedelta(days=1), overlap=3600)
+        self.items = recordings(24)
+        self.queries = []
+
+        def find_media_table(params, batch_size=100):
+            self.queries.append((params['condition.Channel'],
+                                 params['condition.StartTime'],
+                                 params['condition.EndTime']))
+            start = datetime.strptime(params['condition.StartTime'], '%Y-%m-%d %H:%M:%S')
+            end = datetime.strptime(params['condition.EndTime'], '%Y-%m-%d %H:%M:%S')
+            return MediaFileTable.from_items(
+                i for i in self.items
+                if i['Channel'] == params['condition.Channel'] - 1
+                and i['EndTime'] > start and i['StartTime'] < end)
+        patcher = patch.object(IntelbrasAPI, 'find_media_table', create=True,
+                               side_effect=find_media_table)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.index.close)
+
+    def test_incremental_sync(self):
+        until = START + timedelta(hours=12)
+        self.assertEqual(self.index.sync(self.api, [1, 2], until=until), 24)
+        self.assertEqual(self.queries[0], (1, '2024-07-31 12:00:00', '2024-08-01 12:00:00'))
+        self.assertEqual(len(self.index), 24)
+
+        # Only the last overlap hour and what came after it are requested
+        self.queries.clear()
+        self.assertEqual(self.index.sync(
+            self.api, [1], until=START + timedelta(hours=14)), 3)
+        self.assertEqual(self.queries, [(1, '2024-08-01 11:00:00', '2024-08-01 14:00:00')])
+        self.assertEqual(len(self.index), 26)
+
+    def test_sync_replaces_window(self):
+        self.index.sync(self.api, [1], until=START + timedelta(hours=2))
+        # The file being recorded was renamed when it closed
+        self.items = [i for i in self.items if i['FilePath'] != '/mnt/dvr/0/1.dav']
+        self.items.append({'Channel': 0, 'StartTime': START + timedelta(hours=1),
+                           'EndTime': START + timedelta(hours=1, minutes=30),
+                           'FilePath': '/mnt/dvr/0/1-closed.dav'})
+        self.index.sync(self.api, [1], until=START + timedelta(hours=2))
+        paths = [f.path for f in self.index.query('http://10.0.0.1', 1, START, START + timedelta(hours=2))]
+        self.assertEqual(paths, ['/mnt/dvr/0/0.dav', '/mnt/dvr/0/1-closed.dav'])
+
+    def test_query_local_and_stale(self):
+        with patch('pyintelbras.index.datetime') as mock_datetime:
+            mock_datetime.now.return_value = START + timedelta(hours=24)
+            self.index.sync(self.api, [2])
+            self.queries.clear()
+
+            files = self.index.query(self.api, 2, START + timedelta(hours=5, minutes=30),
+                                     START + timedelta(hours=7))
+            self.assertEqual([f.path for f in files],
+                             ['/mnt/dvr/1/5.dav', '/mnt/dvr/1/6.dav'])
+            # Numbered as the device items
+            self.assertEqual(files[0].channel, 1)
+            self.assertEqual(self.queries, [])
+
+            # Past the last sync, once it is older than max_age
+            files = self.index.query(self.api, 2, START + timedelta(hours=23),
+                                     START + timedelta(hours=25), max_age=0)
+            self.assertEqual(len(self.queries), 1)
+            self.assertEqual(len(files), 1)
+
+            # Older than the first sync, only the missing window is fetched
+            self.queries.clear()
+            self.index.query(self.api, 2, START - timedelta(hours=3), START)
+            self.assertEqual(self.queries, [(2, '2024-07-31 21:00:00', '2024-08-01 00:00:00')])
+
+            # Never synced
+            self.queries.clear()
+            self.index.query(self.api, [1], START, START + timedelta(hours=1))
+            self.assertEqual([q[0] for q in self.queries], [1])
+
+    def test_add_and_prune(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'index.db')
+            with RecordingIndex(path) as index:
+                items = recordings(3)
+                items.append({'StartTime': START, 'EndTime': START + timedelta(hours=1),
+                              'FilePath': '/mnt/dvr/unknown.dav'})
+                self.assertEqual(index.add(self.api, items), 6)
+            with RecordingIndex(path) as index:
+                self.assertEqual(len(index), 6)
+                files = index.query(self.api.server, [1, 2], START, START + timedelta(hours=1))
+                self.assertEqual(sorted((f.channel, f.path) for f in files),
+                                 [(0, '/mnt/dvr/0/0.dav'), (1, '/mnt/dvr/1/0.dav')])
+                self.assertEqual(index.prune(START + timedelta(hours=2)), 4)
+                self.assertEqual(len(index), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
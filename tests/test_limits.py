@@ -0,0 +1,112 @@
+import asyncio
+import unittest
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from pyintelbras import IntelbrasAPI
+from pyintelbras.exceptions import IntelbrasAPIException
+from pyintelbras.limits import RateLimiter
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    @patch('pyintelbras.limits.time.monotonic')
+    def test_token_bucket(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        limiter = RateLimiter(rate=2, max_in_flight=10, max_rate=2)
+        limiter.acquire('a').release(200)
+        limiter.acquire('a').release(200)
+        with self.assertRaises(IntelbrasAPIException):
+            limiter.acquire('a', timeout=0)
+        # Hosts have their own bucket
+        limiter.acquire('b').release(200)
+
+        mock_monotonic.return_value = 100.5
+        limiter.acquire('a').release(200)
+        self.assertEqual(limiter.stats('a')['requests'], 3)
+
+    def test_in_flight(self):
+        limiter = RateLimiter(rate=50, max_in_flight=2)
+        first = limiter.acquire('a')
+        limiter.acquire('a')
+        with self.assertRaises(IntelbrasAPIException):
+            limiter.acquire('a', timeout=0)
+        first.release(200)
+        limiter.acquire('a', timeout=5)
+        self.assertEqual(limiter.stats('a')['in_flight'], 2)
+
+    @patch('pyintelbras.limits.time.monotonic')
+    def test_adaptive(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        limiter = RateLimiter(rate=8, max_in_flight=8, target_latency=1)
+        first, second = limiter.acquire('a'), limiter.acquire('a')
+        first.release(503)
+        self.assertEqual(limiter.stats('a')['in_flight_limit'], 4)
+        self.assertEqual(limiter.stats('a')['rate'], 8)
+        self.assertEqual(limiter.stats('a')['errors'], 1)
+
+        # Errors of requests already sent do not halve it again
+        second.release(error=True)
+        self.assertEqual(limiter.stats('a')['in_flight_limit'], 4)
+        self.assertEqual(limiter.stats('a')['errors'], 2)
+
+        # Slow answers count as overload, the rate goes down once the cap
+        # is at min_in_flight
+        for second in (110, 120, 130):
+            mock_monotonic.return_value = second
+            permit = limiter.acquire('a')
+            mock_monotonic.return_value = second + 2
+            permit.release(200)
+        self.assertEqual(limiter.stats('a')['in_flight_limit'], 1)
+        self.assertEqual(limiter.stats('a')['rate'], 4)
+
+        # Successes raise both back
+        for second in range(140, 160):
+            mock_monotonic.return_value = second
+            limiter.acquire('a').release(200)
+        self.assertGreater(limiter.stats('a')['rate'], 5)
+        self.assertGreaterEqual(limiter.stats('a')['in_flight_limit'], 5)
+
+    @patch('pyintelbras.limits.time.monotonic')
+    def test_retry_after(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        limiter = RateLimiter(rate=50, max_rate=50)
+        limiter.acquire('a').release(503, retry_after=30)
+        mock_monotonic.return_value = 120
+        with self.assertRaises(IntelbrasAPIException):
+            limiter.acquire('a', timeout=0)
+        mock_monotonic.return_value = 131
+        limiter.acquire('a')
+
+    def test_acquire_async(self):
+        limiter = RateLimiter(rate=50, max_in_flight=1)
+
+        async def run():
+            first = await limiter.acquire_async('a')
+            asyncio.get_running_loop().call_later(0.02, first.release, 200)
+            return await limiter.acquire_async('a', timeout=5)
+
+        asyncio.run(run())
+        self.assertEqual(limiter.stats('a')['requests'], 2)
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_api(self, mock_request):
+        mock_request.return_value = MagicMock(status_code=503, headers={})
+        limiter = RateLimiter(rate=10, max_in_flight=4)
+        a = IntelbrasAPI('http://10.0.0.1', 'admin', 'admin', limiter=limiter)
+        b = IntelbrasAPI('http://10.0.0.1:80/', 'viewer', 'viewer', limiter=limiter)
+
+        a.configManager(action='getConfig', name='ChannelTitle')
+        mock_request.side_effect = requests.ConnectionError
+        with self.assertRaises(requests.ConnectionError):
+            b.configManager(action='getConfig', name='ChannelTitle')
+
+        # Both clients share the state of the host
+        stats = limiter.stats('10.0.0.1:80')
+        self.assertEqual((stats['requests'], stats['errors'], stats['in_flight']),
+                         (2, 2, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
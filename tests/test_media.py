@@ -0,0 +1,101 @@
+import io
+import json
+import unittest
+from datetime import datetime
+from pyintelbras.helpers import parse_response
+from pyintelbras.media import MediaFileTable, to_epoch, from_epoch
+from pyintelbras.exceptions import IntelbrasAPIException
+
+RESPONSE = '''found=3
+items[0].Channel=0
+items[0].StartTime=2024-08-28 02:40:49
+items[0].EndTime=2024-08-28 02:41:00
+items[0].FilePath=/mnt/dvr/2024-08-28/0/dav/02/02.40.49-02.41.00[R][0@0][0].dav
+items[0].Length=3276800
+items[0].Type=dav
+items[0].VideoStream=Main
+items[0].Events[0]=FaceRecognition
+items[0].Flags[0]=Event
+items[1].Channel=1
+items[1].StartTime=2024-08-28 03:00:00
+items[1].EndTime=2024-08-28 04:00:00
+items[1].FilePath=/mnt/dvr/2024-08-28/1/dav/03/03.00.00-04.00.00[R][0@0][0].dav
+items[1].Length=1024
+items[1].Type=dav
+items[1].VideoStream=Main
+items[2].Channel=0
+items[2].StartTime=2024-08-28 05:00:00
+items[2].EndTime=2024-08-28 05:30:00
+items[2].FilePath=/mnt/dvr/2024-08-28/0/jpg/05.00.00.jpg
+items[2].Type=jpg
+'''
+
+
+class TestMediaFileTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = MediaFileTable()
+        self.assertEqual(self.table.extend_response(RESPONSE), 3)
+
+    def test_same_as_parse_response(self):
+        items = parse_response(RESPONSE)['items']
+        for item in items:
+            item.pop('Flags', None)
+        self.assertEqual([f.to_dict() for f in self.table], items)
+        self.assertEqual(list(MediaFileTable.from_items(items)), list(self.table))
+
+    def test_columns(self):
+        self.assertEqual(len(self.table), 3)
+        self.assertEqual(list(self.table.channel), [0, 1, 0])
+        self.assertEqual(self.table.start[1], to_epoch(datetime(2024, 8, 28, 3)))
+        self.assertIs(self.table.stream[0], self.table.stream[1])
+        self.assertEqual(self.table.total_length(), 3276800 + 1024)
+        self.assertIsNone(self.table[2].length)
+        self.assertEqual(self.table[0].events, ('FaceRecognition',))
+        self.assertEqual(self.table[1].start_time, datetime(2024, 8, 28, 3))
+
+    def test_filter(self):
+        night = self.table.filter(start='2024-08-28 02:50:00',
+                                  end=datetime(2024, 8, 28, 5))
+        self.assertEqual([f.channel for f in night], [1])
+        self.assertEqual(self.table.indexes(channels=[0]), [0, 2])
+        self.assertEqual(
+            self.table.indexes(start=datetime(2024, 8, 28, 2, 40, 59), channels={0}), [0, 2])
+        self.assertEqual(len(self.table.filter(end=to_epoch(datetime(2024, 8, 28)))), 0)
+
+        # Without an end, from the start on
+        self.table.append({'Channel': 2, 'StartTime': datetime(2024, 8, 28, 6),
+                           'FilePath': '/mnt/dvr/2024-08-28/2/dav/06/06.00.00.dav'})
+        self.assertEqual(self.table.indexes(), [0, 1, 2, 3])
+        self.assertEqual(self.table.indexes(start=datetime(2024, 8, 29)), [3])
+        self.assertEqual(self.table.indexes(end=datetime(2024, 8, 28, 6), channels=[2]), [])
+
+    def test_export(self):
+        f = io.StringIO()
+        self.table.to_csv(f)
+        lines = f.getvalue().splitlines()
+        self.assertEqual(lines[0], 'Channel,StartTime,EndTime,Length,FilePath,Type,VideoStream,Events')
+        self.assertEqual(
+            lines[1], '0,2024-08-28 02:40:49,2024-08-28 02:41:00,3276800,'
+            '/mnt/dvr/2024-08-28/0/dav/02/02.40.49-02.41.00[R][0@0][0].dav,dav,Main,FaceRecognition')
+        self.assertEqual(lines[3], '0,2024-08-28 05:00:00,2024-08-28 05:30:00,,'
+                         '/mnt/dvr/2024-08-28/0/jpg/05.00.00.jpg,jpg,,')
+
+        f = io.StringIO()
+        self.table.take([2]).to_jsonl(f)
+        self.assertEqual(json.loads(f.getvalue()), {
+            'Channel': 0, 'StartTime': '2024-08-28 05:00:00',
+            'EndTime': '2024-08-28 05:30:00',
+            'FilePath': '/mnt/dvr/2024-08-28/0/jpg/05.00.00.jpg', 'Type': 'jpg',
+            'Events': []})
+
+    def test_epoch(self):
+        value = datetime(2024, 2, 29, 23, 59, 59)
+        self.assertEqual(from_epoch(to_epoch(value)), value)
+        self.assertEqual(to_epoch('2024-2-29 23:59:59'), to_epoch(value))
+        with self.assertRaises(IntelbrasAPIException):
+            MediaFileTable().extend_response('items[0].StartTime=yesterday')
+
+
+if __name__ == '__main__':
+    unittest.main()
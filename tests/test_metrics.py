@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from pyintelbras import IntelbrasAPI
+from pyintelbras.metrics import (
+    Histogram, Metrics, RequestEvent, ParseEvent, endpoint_label)
+
+
+def event(endpoint='configManager.getConfig', elapsed=0.02, host='10.0.0.1:80', **kwargs):
+    return RequestEvent(host, endpoint, 'GET', kwargs.pop('status', 200),
+                        elapsed, **kwargs)
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_quantile(self):
+        histogram = Histogram(buckets=(0.1, 0.2, 0.4))
+        self.assertIsNone(histogram.quantile(0.5))
+        for value in (0.05, 0.1, 0.15, 0.3, 1.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [2, 1, 1, 1])
+        self.assertAlmostEqual(histogram.quantile(0.5), 0.15)
+        self.assertEqual(histogram.quantile(0.99), 0.4)
+        self.assertAlmostEqual(histogram.mean, 0.32)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_endpoint_label(self):
+        self.assertEqual(endpoint_label('configManager', {'action': 'getConfig'}),
+                         'configManager.getConfig')
+        self.assertEqual(endpoint_label('RPC_Loadfile', {}), 'RPC_Loadfile')
+
+    def test_aggregate(self):
+        metrics = Metrics()
+        metrics(event(elapsed=0.02, ttfb=0.015, bytes_received=100))
+        metrics(event(elapsed=3.0, ttfb=2.9, retries=1, challenges=1))
+        metrics(event(status=None, error=requests.Timeout()))
+        metrics(event(cached=True))
+        metrics(ParseEvent('10.0.0.1:80', 'configManager.getConfig', 0.004, 100))
+        metrics(event('mediaFileFind.findNextFile', host='10.0.0.2:80'))
+
+        slowest = metrics.summary()[0]
+        self.assertEqual(
+            {k: slowest[k] for k in ('host', 'endpoint', 'requests', 'errors',
+                                     'retries', 'challenges', 'cached', 'bytes')},
+            {'host': '10.0.0.1:80', 'endpoint': 'configManager.getConfig',
+             'requests': 3, 'errors': 1, 'retries': 1, 'challenges': 1,
+             'cached': 1, 'bytes': 100})
+        self.assertAlmostEqual(slowest['parse'], 0.004)
+        self.assertGreater(slowest['p99'], 2.5)
+
+        text = metrics.prometheus()
+        self.assertIn('# TYPE pyintelbras_request_duration_seconds histogram', text)
+        self.assertIn('pyintelbras_request_duration_seconds_bucket{host="10.0.0.1:80",'
+                      'endpoint="configManager.getConfig",le="0.025"} 2', text)
+        self.assertIn('pyintelbras_request_duration_seconds_count{host="10.0.0.1:80",'
+                      'endpoint="configManager.getConfig"} 3', text)
+        self.assertIn('pyintelbras_request_phase_seconds_count{host="10.0.0.1:80",'
+                      'endpoint="configManager.getConfig",phase="parse"} 1', text)
+        self.assertIn('pyintelbras_requests_total{host="10.0.0.1:80",'
+                      'endpoint="configManager.getConfig",status="200"} 2', text)
+
+        metrics.reset()
+        self.assertEqual(metrics.summary(), [])
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_api_hooks(self, mock_request):
+        body = 'table.ChannelTitle[0].Name=Lab01'
+        mock_request.return_value = MagicMock(
+            status_code=200, headers={}, text=body, content=body.encode(),
+            history=[])
+        events = []
+
+        def failing_hook(event):
+            raise ValueError
+
+        api = IntelbrasAPI('http://10.0.0.1', 'admin', 'admin',
+                           hooks=[events.append, failing_hook])
+        self.assertEqual(api.channels, [{'Name': 'Lab01'}])
+        # Streamed to time the body apart
+        self.assertTrue(mock_request.call_args.kwargs['stream'])
+
+        request, parse = events
+        self.assertEqual((request.host, request.endpoint, request.status,
+                          request.bytes_received, request.error),
+                         ('10.0.0.1:80', 'configManager.getConfig', 200, len(body), None))
+        self.assertIsInstance(parse, ParseEvent)
+        self.assertEqual(parse.size, len(body))
+
+        mock_request.side_effect = requests.ConnectionError
+        with self.assertRaises(requests.ConnectionError):
+            api.configManager(action='getConfig', name='ChannelTitle')
+        self.assertIsInstance(events[-1].error, requests.ConnectionError)
+        self.assertIsNone(events[-1].status)
+
+
+if __name__ == '__main__':
+    unittest.main()
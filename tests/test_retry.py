@@ -0,0 +1,146 @@
+import itertools
+import unittest
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from pyintelbras import IntelbrasAPI
+from pyintelbras.exceptions import CircuitOpenError, DeadlineExceeded
+from pyintelbras.retry import (
+    RetryPolicy, CircuitBreaker, budget_timeout, deadline, remaining)
+
+
+def ok(text=''):
+    return MagicMock(status_code=200, headers={}, text=text)
+
+
+class TestDeadline(unittest.TestCase):
+
+    @patch('pyintelbras.retry.time.monotonic')
+    def test_budget(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        self.assertIsNone(remaining())
+        self.assertEqual(budget_timeout((10, 30)), (10, 30))
+        with deadline(20):
+            # Nested deadlines only shorten it
+            with deadline(60):
+                self.assertEqual(remaining(), 20)
+            with deadline(None):
+                self.assertIsNone(remaining())
+            mock_monotonic.return_value = 105
+            self.assertEqual(budget_timeout((10, 30)), (10, 15))
+            self.assertEqual(budget_timeout((10, None)), (10, 15))
+            self.assertEqual(budget_timeout(None), 15)
+            mock_monotonic.return_value = 120
+            with self.assertRaises(DeadlineExceeded):
+                budget_timeout(5)
+        self.assertIsNone(remaining())
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_find_media_files(self, mock_request):
+        mock_request.side_effect = [
+            ok('result=1234'), ok('OK'), ok('OK'), ok('OK')]
+        api = IntelbrasAPI('http://localhost', 'admin', 'admin')
+
+        # One second per monotonic call
+        with patch('pyintelbras.retry.time.monotonic', side_effect=itertools.count()):
+            with self.assertRaises(DeadlineExceeded):
+                api.find_media_files({'condition.Channel': 1}, deadline=2.5)
+
+        # findNextFile is past the deadline, the finder is still released
+        actions = [c.kwargs['url'].split('action=')[1].split('&')[0]
+                   for c in mock_request.call_args_list]
+        self.assertEqual(actions, ['factory.create', 'findFile', 'close', 'destroy'])
+        self.assertEqual(mock_request.call_args_list[0].kwargs['timeout'], (1.5, 1.5))
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_retryable(self):
+        retry = RetryPolicy(actions=['factory.create'])
+        self.assertTrue(retry.retryable('GET', 'getConfig'))
+        self.assertTrue(retry.retryable('GET', 'findNextFile'))
+        self.assertTrue(retry.retryable('GET', 'factory.create'))
+        self.assertFalse(retry.retryable('GET', 'setConfig'))
+        self.assertFalse(retry.retryable('POST', 'getConfig'))
+
+    @patch('pyintelbras.retry.random.uniform', side_effect=lambda low, high: high)
+    def test_delay(self, mock_uniform):
+        retry = RetryPolicy(backoff=0.5, max_backoff=3)
+        self.assertEqual([retry.delay(n) for n in range(4)], [0.5, 1, 2, 3])
+
+    @patch('pyintelbras.api.time.sleep')
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_api(self, mock_request, mock_sleep):
+        api = IntelbrasAPI('http://localhost', 'admin', 'admin',
+                           retry=RetryPolicy(attempts=3))
+        unavailable = MagicMock(status_code=503, headers={})
+        mock_request.side_effect = [requests.ConnectionError, unavailable, ok()]
+        response = api.configManager(action='getConfig', name='ChannelTitle')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_sleep.call_count, 2)
+        unavailable.close.assert_called_once()
+        self.assertEqual(mock_request.call_args.kwargs['timeout'], (10, 30))
+
+        # Attempts exhausted
+        mock_request.side_effect = [requests.Timeout] * 3
+        with self.assertRaises(requests.Timeout):
+            api.configManager(action='getConfig', name='ChannelTitle')
+
+        # Writes are never retried
+        mock_request.reset_mock()
+        mock_request.side_effect = [requests.ConnectionError]
+        with self.assertRaises(requests.ConnectionError):
+            api.configManager(action='setConfig', **{'ChannelTitle[0].Name': 'Lab'})
+        self.assertEqual(mock_request.call_count, 1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    @patch('pyintelbras.retry.time.monotonic')
+    def test_states(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record('a', failed=True)
+        breaker.record('a', failed=False)
+        breaker.record('a', failed=True)
+        self.assertEqual(breaker.state('a'), 'closed')
+        breaker.record('a', failed=True)
+        self.assertEqual(breaker.state('a'), 'open')
+        with self.assertRaises(CircuitOpenError):
+            breaker.before('a')
+        breaker.before('b')
+
+        # One probe at a time once reset_timeout passed
+        mock_monotonic.return_value = 131
+        self.assertEqual(breaker.state('a'), 'half-open')
+        breaker.before('a')
+        with self.assertRaises(CircuitOpenError):
+            breaker.before('a')
+        breaker.record('a', failed=True)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before('a')
+
+        mock_monotonic.return_value = 162
+        breaker.before('a')
+        breaker.record('a', failed=False)
+        self.assertEqual(breaker.state('a'), 'closed')
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_api(self, mock_request):
+        breaker = CircuitBreaker(failure_threshold=2)
+        api = IntelbrasAPI('http://10.0.0.1', 'admin', 'admin', breaker=breaker)
+        mock_request.side_effect = requests.ConnectTimeout
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectTimeout):
+                api.configManager(action='getConfig', name='ChannelTitle')
+
+        # Fails fast, without a request
+        with self.assertRaises(CircuitOpenError):
+            api.configManager(action='getConfig', name='ChannelTitle')
+        self.assertEqual(mock_request.call_count, 2)
+        self.assertEqual(breaker.state('10.0.0.1:80'), 'open')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import queue
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from pyintelbras import IntelbrasAPI
+from pyintelbras.snapshots import (
+    SnapshotPipeline, DirectorySink, QueueSink, RingBufferSink)
+
+
+def snapshot_response(data=b'\xff\xd8jpeg', status_code=200):
+    return MagicMock(status_code=status_code, content=data, reason='OK')
+
+
+class TestSnapshotPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.devices = [IntelbrasAPI('10.0.0.1', 'user', 'pass'),
+                        IntelbrasAPI('10.0.0.2', 'user', 'pass')]
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_capture_and_dedup(self, mock_request):
+        frames = {}
+
+        def request(method, url, **kwargs):
+            return snapshot_response(frames.get(url, b'frame'))
+        mock_request.side_effect = request
+
+        sink = RingBufferSink(size=2)
+        with SnapshotPipeline(self.devices, sink, channels=[1, 2],
+                              max_workers=4) as pipeline:
+            changed = pipeline.capture()
+            self.assertEqual(len(changed), 4)
+            self.assertEqual(
+                {(s.device.server, s.channel) for s in changed},
+                {(d.server, c) for d in self.devices for c in (1, 2)})
+            urls = {call.kwargs['url'] for call in mock_request.call_args_list}
+            self.assertIn(
+                'http://10.0.0.1/cgi-bin/snapshot.cgi?channel=2&type=0', urls)
+
+            # Only the frame that changed reaches the sink
+            frames['http://10.0.0.2/cgi-bin/snapshot.cgi?channel=1&type=0'] = b'new'
+            changed = pipeline.capture()
+            self.assertEqual([(s.device, s.channel) for s in changed],
+                             [(self.devices[1], 1)])
+            self.assertEqual(pipeline.stats,
+                             {'captured': 5, 'unchanged': 3, 'errors': 0})
+            self.assertEqual(sink.latest(self.devices[1], 1).data, b'new')
+            self.assertEqual(len(sink.buffers[(self.devices[1].server, 1)]), 2)
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_errors_and_channel_lookup(self, mock_request):
+        def request(method, url, **kwargs):
+            if 'configManager' in url:
+                return MagicMock(status_code=200, text='\n'.join(
+                    f'table.ChannelTitle[{i}].Name=Canal{i}' for i in range(3)))
+            if '10.0.0.2' in url:
+                return snapshot_response(status_code=500)
+            return snapshot_response()
+        mock_request.side_effect = request
+
+        sink = QueueSink(queue.Queue(maxsize=2))
+        with SnapshotPipeline(self.devices, sink) as pipeline:
+            pipeline.capture()
+        self.assertEqual(pipeline.stats,
+                         {'captured': 3, 'unchanged': 0, 'errors': 3})
+        self.assertEqual(sink.queue.qsize(), 2)
+        self.assertEqual(sink.dropped, 1)
+
+    @patch('pyintelbras.api.requests.Session.request')
+    def test_sink_error(self, mock_request):
+        mock_request.return_value = snapshot_response(b'frame')
+        delivered = []
+
+        def sink(snapshot):
+            if not delivered:
+                delivered.append(None)
+                raise OSError('disk full')
+            delivered.append(snapshot)
+
+        with SnapshotPipeline(self.devices[0], sink, channels=[1]) as pipeline:
+            self.assertEqual(pipeline.capture(), [])
+            self.assertEqual(pipeline.stats,
+                             {'captured': 0, 'unchanged': 0, 'errors': 1})
+            # The same frame is delivered on the next round
+            changed = pipeline.capture()
+            self.assertEqual([s.data for s in changed], [b'frame'])
+            self.assertEqual(delivered[1:], changed)
+            self.assertEqual(pipeline.stats,
+                             {'captured': 1, 'unchanged': 0, 'errors': 1})
+
+    def test_directory_sink(self):
+        with tempfile.TemporaryDirectory() as dest:
+            api = IntelbrasAPI('10.0.0.1:8080')
+            pipeline = SnapshotPipeline(
+                api, DirectorySink(dest, latest_only=True), channels=[1])
+            with patch.object(IntelbrasAPI, 'do_request',
+                              return_value=snapshot_response(b'one')):
+                pipeline.capture()
+            path = os.path.join(dest, '10.0.0.1_8080', '1.jpg')
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'one')
+            self.assertEqual(os.listdir(os.path.dirname(path)), ['1.jpg'])
+            pipeline.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
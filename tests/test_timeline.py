@@ -0,0 +1,143 @@
+import unittest
+from datetime import datetime
+
+from pyintelbras.media import MediaFileTable, to_epoch
+from pyintelbras.timeline import Interval, IntervalSet, Timeline
+
+
+def t(hour, minute=0, second=0):
+    return to_epoch(datetime(2024, 8, 28, hour, minute, second))
+
+
+def item(channel, start, end):
+    return {'Channel': channel, 'StartTime': datetime(2024, 8, 28, *start),
+            'EndTime': datetime(2024, 8, 28, *end), 'FilePath': f'{channel}{start}.dav'}
+
+
+class TestIntervalSet(unittest.TestCase):
+
+    def test_add(self):
+        intervals = IntervalSet(tolerance=1)
+        self.assertEqual(intervals.add(30, 40), [])
+        self.assertEqual(intervals.add(10, 19), [])
+        # Adjacent within tolerance
+        self.assertEqual(intervals.add(20, 25), [])
+        self.assertEqual(list(intervals), [(10, 25), (30, 40)])
+        # Overlaps both, bridging the gap
+        self.assertEqual(intervals.add(22, 35), [(22, 25), (30, 35)])
+        self.assertEqual(list(intervals), [(10, 40)])
+        self.assertEqual(intervals.add(50, 60), [])
+        self.assertEqual(intervals.add(0, 5), [])
+        self.assertEqual(list(intervals), [(0, 5), (10, 40), (50, 60)])
+        self.assertEqual(intervals.add(9, 8), [])
+        self.assertEqual(len(intervals), 3)
+
+    def test_queries(self):
+        intervals = IntervalSet()
+        for start, end in ((0, 10), (20, 30), (40, 50)):
+            intervals.add(start, end)
+        self.assertTrue(intervals.covers(20, 30))
+        self.assertTrue(intervals.covers(22, 28))
+        self.assertFalse(intervals.covers(5, 25))
+        self.assertFalse(intervals.covers(-5, 5))
+        self.assertEqual(intervals.intersection(5, 45), [(5, 10), (20, 30), (40, 45)])
+        self.assertEqual(intervals.gaps(5, 45), [(10, 20), (30, 40)])
+        self.assertEqual(intervals.gaps(-10, 60), [(-10, 0), (10, 20), (30, 40), (50, 60)])
+        self.assertEqual(intervals.gaps(22, 28), [])
+        self.assertEqual(intervals.covered_seconds(5, 45), 20)
+
+        intervals.prune(25)
+        self.assertEqual(list(intervals), [(25, 30), (40, 50)])
+
+
+class TestTimeline(unittest.TestCase):
+
+    def setUp(self):
+        self.timeline = Timeline()
+        # Channel 0 recorded continuously in files of 30 minutes, channel 1
+        # stopped from 10:00 to 10:30, channel 2 has a file recorded twice
+        self.timeline.add_items([
+            item(0, (9, 0, 0), (9, 29, 59)), item(0, (9, 30, 0), (9, 59, 59)),
+            item(0, (10, 0, 0), (10, 29, 59)), item(0, (10, 30, 0), (11, 0, 0)),
+            item(1, (9, 0, 0), (9, 59, 59)), item(1, (10, 30, 0), (11, 0, 0)),
+            item(2, (9, 0, 0), (10, 0, 0)), item(2, (9, 30, 0), (11, 0, 0)),
+        ], device='nvr')
+
+    def test_covered(self):
+        self.assertEqual(self.timeline.covered(t(9), t(11)), [('nvr', 0), ('nvr', 2)])
+        self.assertEqual(self.timeline.covered('2024-08-28 09:10:00', t(9, 50)),
+                         [('nvr', 0), ('nvr', 1), ('nvr', 2)])
+        self.assertEqual(self.timeline.covered(t(9), t(11), channels=[1, 2]), [('nvr', 2)])
+        self.assertEqual(self.timeline.covered(t(9), t(11), device='dvr'), [])
+        self.assertEqual(self.timeline.intervals('nvr', 0), [(t(9), t(11))])
+
+    def test_gaps(self):
+        gaps = self.timeline.gaps(t(8), t(11))
+        self.assertEqual(gaps, {
+            ('nvr', 0): [(t(8), t(9))],
+            ('nvr', 1): [(t(8), t(9)), (t(9, 59, 59), t(10, 30))],
+            ('nvr', 2): [(t(8), t(9))],
+        })
+        self.assertEqual(gaps['nvr', 1][1].start_time, datetime(2024, 8, 28, 9, 59, 59))
+        self.assertEqual(self.timeline.gaps(t(9), t(11), channels=[0]), {})
+        # Known device, channel without recordings
+        self.assertEqual(self.timeline.gaps(t(9), t(11), device='nvr', channels=[3]),
+                         {('nvr', 3): [Interval(t(9), t(11))]})
+
+    def test_coverage(self):
+        coverage = self.timeline.coverage(t(9), t(11), device='nvr', channels=[0, 1, 3])
+        self.assertEqual(coverage[('nvr', 0)], 1.0)
+        self.assertAlmostEqual(coverage[('nvr', 1)], 0.75, places=3)
+        self.assertEqual(coverage[('nvr', 3)], 0.0)
+
+    def test_overlaps(self):
+        self.assertEqual(self.timeline.overlaps(), {('nvr', 2): [(t(9, 30), t(10))]})
+        self.assertEqual(self.timeline.overlaps(t(9, 45), t(11)),
+                         {('nvr', 2): [(t(9, 45), t(10))]})
+        self.assertEqual(self.timeline.overlaps(t(10), t(11)), {})
+
+    def test_add_again(self):
+        # A re-sync of the same listing is not recorded twice
+        table = MediaFileTable.from_items([
+            item(0, (9, 0, 0), (9, 29, 59)), item(0, (9, 30, 0), (9, 59, 59))])
+        timeline = Timeline()
+        timeline.add_table(table, device='nvr')
+        timeline.add_table(table, device='nvr')
+        timeline.add_items([{'Channel': 1, 'StartTime': datetime(2024, 8, 28, 9),
+                             'EndTime': datetime(2024, 8, 28, 10)}] * 2, device='nvr')
+        self.assertEqual(timeline.overlaps(), {})
+        self.assertEqual(timeline.intervals('nvr', 0), [(t(9), t(9, 59, 59))])
+
+        # Nor a file bridging the tolerance between two others
+        timeline.add('nvr', 0, t(9, 29, 59), t(9, 30), file='bridge.dav')
+        self.assertEqual(timeline.overlaps(), {})
+
+    def test_replace(self):
+        # A recording still in progress grows, then is cut short
+        timeline = Timeline()
+        timeline.add('nvr', 0, t(9), t(9, 10), file='a.dav')
+        timeline.add('nvr', 0, t(9), t(9, 20), file='a.dav')
+        self.assertEqual(timeline.intervals('nvr', 0), [(t(9), t(9, 20))])
+        self.assertEqual(timeline.overlaps(), {})
+        timeline.add('nvr', 0, t(9, 15), t(9, 30), file='b.dav')
+        self.assertEqual(timeline.overlaps(), {('nvr', 0): [(t(9, 15), t(9, 20))]})
+        timeline.add('nvr', 0, t(9), t(9, 5), file='a.dav')
+        self.assertEqual(timeline.intervals('nvr', 0), [(t(9), t(9, 5)), (t(9, 15), t(9, 30))])
+        self.assertEqual(timeline.overlaps(), {})
+
+    def test_add_table(self):
+        # Batches arrive one after another
+        timeline = Timeline()
+        for batch in ([item(5, (9, 0, 0), (9, 29, 59))], [item(5, (9, 30, 0), (10, 0, 0))]):
+            timeline.add_table(MediaFileTable.from_items(batch), device='dvr')
+        timeline.add_table(MediaFileTable.from_items([{'Channel': 5, 'FilePath': 'x'}]), 'dvr')
+        self.assertEqual(timeline.covered(t(9), t(10)), [('dvr', 5)])
+
+        timeline.prune(t(9, 45))
+        self.assertEqual(timeline.intervals('dvr', 5), [(t(9, 45), t(10))])
+        timeline.prune(t(12))
+        self.assertEqual(len(timeline), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()